@@ -1,241 +1,5431 @@
 import sys
 import os
+import re
+import time
+_IMPORT_STARTED = time.perf_counter()    # 启动时间基准的起点（见 bench_startup）
+import bisect
+import shlex
+import json
+import mmap
+import struct
+import sqlite3
+import pickle
+import hashlib
+import threading
+import queue
+import fnmatch
+import heapq
+import operator
+import io
+import errno
+import random
+import math
 import ctypes
 import psutil
 import subprocess
+import signal
+import traceback
+import getpass
+import urllib.parse
+from array import array
+from itertools import accumulate, compress, islice, repeat
+from stat import S_ISDIR, S_ISREG
 from ctypes import wintypes
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                                QHBoxLayout, QTreeView, QTableView, QSplitter,
                                QPushButton, QComboBox, QLabel, QProgressBar, 
                                QMessageBox, QMenu, QAbstractItemView,
                                QFrame, QGridLayout, QHeaderView, QStyle,
-                               QStyleFactory, QStyledItemDelegate, QCheckBox)
+                               QStyleFactory, QStyledItemDelegate, QCheckBox,
+                               QLineEdit, QTabWidget, QToolTip, QInputDialog,
+                               QProgressDialog, QPlainTextEdit)
 from PySide6.QtCore import (Qt, QThread, Signal, QModelIndex, QDir, 
-                           QSortFilterProxyModel, QPoint, QTimer, QSize,
-                           QItemSelectionModel, QAbstractTableModel)
+                           QPoint, QPointF, QTimer, QSize, QRect, QRectF, QStandardPaths, QSettings,
+                           QItemSelectionModel, QAbstractTableModel, QObject, QCoreApplication,
+                           QPersistentModelIndex)
+from PySide6.QtNetwork import QLocalServer, QLocalSocket
 from PySide6.QtGui import (QStandardItemModel, QStandardItem, QAction, 
                           QFont, QColor, QBrush, QIcon, QPalette, QFontMetrics,
-                          QPainter)
+                          QPainter, QImage, QPen, QPixmap)
+
+# 扫描结果中的项目类型
+TYPE_FILE = 0
+TYPE_FOLDER = 1
+
+# 冷数据年龄阈值（天）：统计超过该天数未修改且未访问的字节数
+AGE_BUCKET_DAYS = (30, 90, 365)
+
+# 大小着色阈值（字节）：超过 10GB、1GB、100MB 分别为第 0、1、2 级，其余为第 3 级
+SIZE_STYLE_THRESHOLDS = (10 * 1024 ** 3, 1024 ** 3, 1024 ** 3 // 10)
+
+def size_style(size):
+    """大小对应的着色级别（0 为最大）"""
+    for level, threshold in enumerate(SIZE_STYLE_THRESHOLDS):
+        if size > threshold:
+            return level
+    return len(SIZE_STYLE_THRESHOLDS)
+
+class SizeFormatter:
+    """把字节数格式化为显示文本，全局共用一个实例 format_size
+
+    单位制 binary 为 1024 进位（显示为 KB/MB/GB/TB，与 Windows 资源管理器相同），decimal 为 1000 进位；
+    unit 为 None 时自动选择单位，否则固定使用该单位（加千位分隔符，便于纵向比较）。
+    扫描结果不保存显示文本，表格只对可见的单元格（以及导出的行）调用；
+    结果按字节数缓存（同样大小的文件很多），缓存满时清空。
+    """
+    UNITS = ("B", "KB", "MB", "GB", "TB")
+    DECIMALS = (0, 1, 1, 2, 2)      # 各单位显示的小数位数
+    BASES = {'binary': 1024, 'decimal': 1000}
+    CACHE_LIMIT = 65536
+    
+    def __init__(self, system='binary', unit=None):
+        self.configure(system, unit)
+    
+    def configure(self, system='binary', unit=None):
+        """切换单位制和固定单位（None 为自动），清空缓存"""
+        if system not in self.BASES:
+            raise ValueError(f"未知的单位制: {system}")
+        if unit is not None and unit not in self.UNITS:
+            raise ValueError(f"未知的单位: {unit}")
+        self.system = system
+        self.unit = unit
+        base = self.BASES[system]
+        self._divisors = tuple(base ** i for i in range(len(self.UNITS)))
+        self._fixed = None if unit is None else self.UNITS.index(unit)
+        self._cache = {}
+    
+    def __call__(self, size_bytes):
+        text = self._cache.get(size_bytes)
+        if text is None:
+            if len(self._cache) >= self.CACHE_LIMIT:
+                self._cache.clear()
+            text = self._cache[size_bytes] = self._format(int(size_bytes))
+        return text
+    
+    def _format(self, size):
+        sign = ''
+        if size < 0:
+            sign, size = '-', -size
+        i = self._fixed
+        if i is None:
+            i = max(0, bisect.bisect_right(self._divisors, size) - 1)
+        decimals = self.DECIMALS[i]
+        divisor = self._divisors[i]
+        # 按显示精度取整（与浮点数格式化一样，恰好一半时取偶数）
+        value, remainder = divmod(size * 10 ** decimals, divisor)
+        if remainder * 2 > divisor or (remainder * 2 == divisor and value & 1):
+            value += 1
+        whole, fraction = divmod(value, 10 ** decimals)
+        number = f"{whole}" if self._fixed is None else f"{whole:,}"
+        if decimals:
+            number += f".{fraction:0{decimals}d}"
+        return f"{sign}{number} {self.UNITS[i]}"
+    
+    def load_settings(self):
+        """按 QSettings 的 display/size_system（binary/decimal）和 display/size_unit（空为自动）设置"""
+        settings = QSettings()
+        try:
+            self.configure(settings.value("display/size_system", 'binary'),
+                           settings.value("display/size_unit", '') or None)
+        except ValueError:
+            self.configure()
+
+format_size = SizeFormatter()
+
+# 默认文件类别（类别名 -> 扩展名），可通过 QSettings 的 breakdown/categories 覆盖
+FILE_CATEGORIES = {
+    '日志': ('log', 'out', 'err', 'trace', 'etl'),
+    '备份': ('bak', 'old', 'backup', 'orig', 'swp', 'tmp'),
+    '媒体': ('mp4', 'mkv', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mp3', 'flac', 'wav',
+             'aac', 'ogg', 'm4a', 'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tif', 'tiff',
+             'heic', 'raw', 'psd'),
+    '压缩包': ('zip', 'rar', '7z', 'tar', 'gz', 'tgz', 'bz2', 'xz', 'zst', 'lz4', 'cab'),
+    '虚拟机镜像': ('vmdk', 'vhd', 'vhdx', 'vdi', 'qcow2', 'iso', 'img', 'ova', 'ovf', 'avhdx'),
+    '安装包': ('exe', 'msi', 'msix', 'appx', 'deb', 'rpm', 'dmg', 'pkg', 'apk'),
+    '文档': ('pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv', 'md'),
+    '数据库': ('db', 'sqlite', 'mdf', 'ldf', 'ibd', 'frm', 'dbf', 'bson'),
+}
+
+def load_file_categories():
+    """读取文件类别配置，返回 扩展名 -> 类别名 的映射"""
+    categories = QSettings().value("breakdown/categories")
+    if not isinstance(categories, dict) or not categories:
+        categories = FILE_CATEGORIES
+    ext_categories = {}
+    for category, exts in categories.items():
+        if isinstance(exts, str):
+            exts = exts.split(',')
+        for ext in exts:
+            ext_categories[ext.strip().lstrip('.').lower()] = category
+    return ext_categories
+
+def app_data_dir(*parts):
+    """应用数据目录（或其下的子目录），不存在时创建"""
+    base = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation) or os.path.expanduser('~')
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class TypeBreakdown:
+    """按扩展名和文件类别统计文件数量与大小
+
+    扫描时只按扩展名累加（每个文件一次字典查找），
+    类别统计在扫描结束后由扩展名统计汇总得到。
+    """
+    OTHER = '其他'
+    NO_EXT = '（无扩展名）'
+
+    def __init__(self, ext_categories=None):
+        self.ext_categories = ext_categories or {}
+        self.extensions = {}        # 扩展名 -> [文件数, 字节数]
+
+    def add(self, name, size, count=1):
+        """count 为该文件代表的文件数（估算扫描中一个样本代表多个文件）；返回扩展名（小写）"""
+        dot = name.rfind('.')
+        ext = name[dot + 1:].lower() if dot > 0 else ''
+        stat = self.extensions.get(ext)
+        if stat is None:
+            stat = self.extensions[ext] = [0, 0]
+        stat[0] += count
+        stat[1] += size
+        return ext
+
+    def by_extension(self):
+        """返回 [(扩展名, 文件数, 字节数)]，按字节数降序"""
+        rows = [(('.' + ext) if ext else self.NO_EXT, count, size)
+                for ext, (count, size) in self.extensions.items()]
+        rows.sort(key=lambda r: r[2], reverse=True)
+        return rows
+
+    def by_category(self):
+        """返回 [(类别, 文件数, 字节数)]，按字节数降序"""
+        totals = {}
+        for ext, (count, size) in self.extensions.items():
+            category = self.ext_categories.get(ext, self.OTHER)
+            total = totals.setdefault(category, [0, 0])
+            total[0] += count
+            total[1] += size
+        rows = [(category, count, size) for category, (count, size) in totals.items()]
+        rows.sort(key=lambda r: r[2], reverse=True)
+        return rows
+
+class CleanupDetector:
+    """清理候选检测器基类：按名称和目录结构识别可以回收空间的目录或文件
+
+    检测只使用扫描时已经列出的目录项（名称、大小、时间戳），不额外访问磁盘。
+    子类用类属性声明要检查的名称，扫描开始时由 CleanupCandidates 汇总成查找表，
+    每个目录和文件只需几次字典查找；新的检测器实例加入 CLEANUP_DETECTORS 即可生效。
+    """
+    key = ''
+    category = ''
+    advice = ''
+    dir_names = ()      # 目录名（小写），命中的目录整体为候选
+    dir_paths = ()      # (父目录名, 目录名)（小写），如 ('.cache', 'pip')
+    dir_prefixes = ()   # 目录名前缀（小写）
+    markers = {}        # 标记文件名（区分大小写）-> 同一目录下属于候选的子目录名（小写）；None 表示该目录本身
+    file_exts = ()      # 需要检查的文件扩展名（小写，'' 为无扩展名，'#' 为纯数字扩展名）
+
+    def match_file(self, name, ext, size, touched, scan_time):
+        """扩展名在 file_exts 中的文件是否为候选；touched 为修改和访问时间中较晚的一个"""
+        return True
+
+class PackageCacheDetector(CleanupDetector):
+    key = 'package_cache'
+    category = '包管理器缓存'
+    advice = '可用对应工具清理（npm cache clean、pip cache purge 等），需要时会重新下载'
+    dir_names = ('.npm', 'npm-cache', '.pnpm-store', '.yarn-cache', 'go-build')
+    dir_paths = (('.cache', 'pip'), ('.cache', 'yarn'), ('.cache', 'pypoetry'), ('pip', 'cache'),
+                 ('.m2', 'repository'), ('.gradle', 'caches'), ('.nuget', 'packages'),
+                 ('.cargo', 'registry'), ('apt', 'archives'), ('anaconda3', 'pkgs'),
+                 ('miniconda3', 'pkgs'), ('caches', 'homebrew'))
+
+class CacheDirTagDetector(CleanupDetector):
+    key = 'cache_dir'
+    category = '缓存目录'
+    advice = '目录带有 CACHEDIR.TAG 标记，内容可以重新生成'
+    markers = {'CACHEDIR.TAG': None}
+
+class NodeModulesDetector(CleanupDetector):
+    key = 'node_modules'
+    category = 'node_modules'
+    advice = '不再开发的项目可以删除，需要时 npm install 重新安装'
+    # 只认项目中的依赖目录（旁边有 package.json），不包括全局安装目录
+    markers = {'package.json': ('node_modules',)}
+
+class BuildOutputDetector(CleanupDetector):
+    key = 'build_output'
+    category = '构建输出'
+    advice = '编译或打包生成的文件，重新构建即可恢复'
+    dir_names = ('__pycache__', '.pytest_cache', '.mypy_cache', '.tox', '.next', '.nuxt',
+                 '.parcel-cache', '.turbo')
+    markers = {
+        'package.json': ('dist', 'build', 'out', '.angular'),
+        'Cargo.toml': ('target',),
+        'pom.xml': ('target',),
+        'build.gradle': ('build', '.gradle'),
+        'build.gradle.kts': ('build', '.gradle'),
+        'CMakeLists.txt': ('build', 'cmake-build-debug', 'cmake-build-release'),
+        'setup.py': ('build', 'dist'),
+        'pyproject.toml': ('build', 'dist'),
+        'go.mod': ('bin',),
+    }
+
+class CoreDumpDetector(CleanupDetector):
+    key = 'core_dump'
+    category = '核心转储'
+    advice = '程序崩溃时的内存转储，排查完问题后可以删除'
+    file_exts = ('', '#', 'core', 'dmp', 'mdmp', 'hprof')
+
+    def match_file(self, name, ext, size, touched, scan_time):
+        if ext == '':
+            return name == 'core'
+        if ext == '#':
+            return name.startswith('core.')
+        return True
+
+class OldLogDetector(CleanupDetector):
+    key = 'old_log'
+    category = '旧日志'
+    advice = '超过 30 天未修改或访问的日志，可以删除或压缩归档'
+    file_exts = ('log', '#', 'gz', 'bz2', 'xz', 'zst', 'zip', 'old')
+    MAX_AGE_DAYS = 30
+
+    def match_file(self, name, ext, size, touched, scan_time):
+        if touched >= scan_time - self.MAX_AGE_DAYS * 86400:
+            return False
+        # 轮转后的日志（app.log.1、app.log.2.gz 等）
+        return ext == 'log' or '.log.' in name.lower()
+
+class TrashDetector(CleanupDetector):
+    key = 'trash'
+    category = '回收站'
+    advice = '已删除但仍占用空间的文件，清空回收站即可释放'
+    dir_names = ('$recycle.bin', 'recycler', '.trash', '.trashes')
+    dir_paths = (('share', 'trash'),)
+    dir_prefixes = ('.trash-',)
+
+class TempDirDetector(CleanupDetector):
+    key = 'temp'
+    category = '临时文件'
+    advice = '临时目录，确认没有程序正在使用后可以清空'
+    dir_names = ('tmp', 'temp', '$windows.~bt', '$windows.~ws')
+
+# 默认启用的检测器，按顺序匹配（同一名称只归入第一个检测器）
+CLEANUP_DETECTORS = [
+    PackageCacheDetector(), CacheDirTagDetector(), NodeModulesDetector(), BuildOutputDetector(),
+    CoreDumpDetector(), OldLogDetector(), TrashDetector(), TempDirDetector(),
+]
+
+class CleanupCandidates:
+    """扫描时由各检测器识别的清理候选
+
+    目录候选在该目录汇总完成后记录整个子树的大小；文件候选按所在目录和类别合并为一条。
+    已是候选的目录内部不再检测，候选之间不会重复计算。
+    """
+    INSIDE = ''     # 遍历栈中位于候选目录内部的目录的标记
+
+    def __init__(self, detectors=None):
+        self.detectors = {}
+        self.dir_names = {}
+        self.dir_paths = {}         # 目录名 -> {父目录名: 检测器标识}
+        self.dir_prefixes = {}
+        self.markers = {}           # 标记文件名 -> [(检测器标识, 子目录名集合或 None)]
+        self.file_detectors = {}    # 扩展名 -> [检测器]
+        for detector in CLEANUP_DETECTORS if detectors is None else detectors:
+            key = detector.key
+            self.detectors[key] = detector
+            for name in detector.dir_names:
+                self.dir_names.setdefault(name, key)
+            for parent, name in detector.dir_paths:
+                self.dir_paths.setdefault(name, {}).setdefault(parent, key)
+            for prefix in detector.dir_prefixes:
+                self.dir_prefixes.setdefault(prefix, key)
+            for marker, children in detector.markers.items():
+                self.markers.setdefault(marker, []).append(
+                    (key, None if children is None else frozenset(children)))
+            for ext in detector.file_exts:
+                self.file_detectors.setdefault(ext, []).append(detector)
+        self._prefixes = tuple(self.dir_prefixes)
+        self.scan_time = time.time()
+        self.pending = {}           # 由父目录中的标记文件确定为候选、尚未打开的子目录：路径 -> 检测器标识
+        self.hits = []              # (检测器标识, 路径, 字节数, 文件数；目录候选为 None)
+
+    def match_dir(self, path, name):
+        """目录本身是否为候选，返回检测器标识或 None"""
+        key = self.pending.pop(path, None)
+        if key is not None:
+            return key
+        lower = name.lower()
+        key = self.dir_names.get(lower)
+        if key is None:
+            parents = self.dir_paths.get(lower)
+            if parents is not None:
+                key = parents.get(os.path.basename(os.path.dirname(path)).lower())
+            elif self._prefixes and lower.startswith(self._prefixes):
+                key = next(key for prefix, key in self.dir_prefixes.items() if lower.startswith(prefix))
+        return key
+
+    def close_dir(self, path, subdirs, markers, file_hits):
+        """处理完目录中的文件后调用：markers 为其中的标记文件名，file_hits 为 {检测器标识: [文件数, 字节数]}。
+        标记表明目录本身是候选时返回检测器标识（目录内的文件候选随之作废），否则返回 None"""
+        for marker in markers:
+            for key, children in self.markers[marker]:
+                if children is None:
+                    return key
+                for subdir in subdirs:
+                    if subdir[1].lower() in children:
+                        self.pending.setdefault(subdir[0], key)
+        if file_hits:
+            for key, (count, size) in file_hits.items():
+                self.hits.append((key, path, size, count))
+        return None
+
+    def add_dir(self, key, path, size):
+        if size > 0:
+            self.hits.append((key, path, size, None))
+
+    def merge(self, other):
+        self.hits.extend(other.hits)
+
+    def discard(self, paths):
+        """删除 paths 后去掉这些路径及其下的候选"""
+        removed = set(paths)
+        prefixes = tuple(os.path.join(path, '') for path in removed)
+        self.hits = [hit for hit in self.hits if hit[1] not in removed and not hit[1].startswith(prefixes)]
+
+    def state(self):
+        """断点中保存的状态"""
+        return {'hits': self.hits, 'pending': self.pending}
+
+    def restore(self, state):
+        self.hits = state['hits']
+        self.pending = state['pending']
+
+    def to_list(self):
+        return [list(hit) for hit in self.hits]
+
+    @classmethod
+    def from_list(cls, hits):
+        candidates = cls()
+        candidates.hits = [tuple(hit) for hit in hits]
+        return candidates
+
+    def describe(self, key):
+        """(类别, 建议)；未知的检测器（如服务端新增的）只显示标识"""
+        detector = self.detectors.get(key)
+        return (detector.category, detector.advice) if detector is not None else (key, '')
+
+    def recommendations(self):
+        """返回 [(类别, 路径, 字节数, 文件数, 建议)]，按可回收字节数降序"""
+        rows = []
+        for key, path, size, count in self.hits:
+            category, advice = self.describe(key)
+            rows.append((category, path, size, count, advice))
+        rows.sort(key=lambda r: r[2], reverse=True)
+        return rows
+
+    def by_category(self):
+        """返回 [(类别, 候选数, 字节数)]，按字节数降序"""
+        totals = {}
+        for key, _, size, _ in self.hits:
+            total = totals.setdefault(self.describe(key)[0], [0, 0])
+            total[0] += 1
+            total[1] += size
+        rows = [(category, count, size) for category, (count, size) in totals.items()]
+        rows.sort(key=lambda r: r[2], reverse=True)
+        return rows
+
+class _DirFrame:
+    """遍历栈中的一个目录"""
+    __slots__ = ('path', 'name', 'level', 'dir_id', 'subdirs', 'next_subdir', 'size', 'cold',
+                 'mtime', 'atime', 'cleanup')
+
+    def __init__(self, path, name, level, dir_id, mtime, atime):
+        self.path = path
+        self.name = name
+        self.level = level
+        self.dir_id = dir_id        # 目录编号（按打开顺序），用于记录结果的父目录
+        self.subdirs = []           # (路径, 名称, 修改时间, 访问时间)
+        self.next_subdir = 0
+        self.size = 0               # 已累计的文件及子目录大小
+        self.cold = [0] * len(AGE_BUCKET_DAYS)  # 超过各年龄阈值的字节数
+        self.mtime = mtime
+        self.atime = atime
+        self.cleanup = None         # 清理候选的检测器标识；位于候选目录内部为 CleanupCandidates.INSIDE
+
+class ScanCheckpoint:
+    """扫描断点：定期保存遍历栈和已扫描的结果，中断后可从断点继续
+
+    结果行只追加不修改，每次只把新增的行作为一个数据块追加到 rows 文件；
+    遍历栈、目录编号表等状态整体重写到 state 文件（先写临时文件再替换），
+    state 中记录 rows 文件的有效长度，崩溃时多写出的半个数据块会被忽略。
+    """
+    INTERVAL = 30               # 自动保存间隔（秒）
+    
+    def __init__(self, root, scan_files, scan_folders, directory=None):
+        key = f"{os.path.normcase(os.path.abspath(root))}|{int(scan_files)}|{int(scan_folders)}"
+        name = hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+        self.directory = os.path.join(directory or app_data_dir('checkpoints'), name)
+        self.state_file = os.path.join(self.directory, 'state.pickle')
+        self.rows_file = os.path.join(self.directory, 'rows.pickle')
+        self._saved_rows = 0        # 已写入 rows 文件的行数
+        self._rows_length = 0       # rows 文件的有效长度
+    
+    def exists(self):
+        return os.path.exists(self.state_file)
+    
+    def summary(self):
+        """断点概要 (保存时间, 已扫描项目数, 最后扫描的目录)，无法读取时返回 None"""
+        try:
+            state = self._read_state()
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+            return None
+        stack = state['stack']
+        return state['saved_at'], state['rows'], stack[-1].path if stack else ''
+    
+    def _read_state(self):
+        with open(self.state_file, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != 1:
+            raise KeyError('version')
+        return state
+    
+    def save(self, results, state):
+        """追加新增的结果行并重写遍历状态"""
+        os.makedirs(self.directory, exist_ok=True)
+        count = len(results)
+        with open(self.rows_file, 'ab' if self._rows_length else 'wb') as f:
+            f.truncate(self._rows_length)
+            if count > self._saved_rows:
+                pickle.dump(results.columns_since(self._saved_rows), f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            rows_length = f.tell()
+        
+        state = dict(state, version=1, rows=count, rows_length=rows_length,
+                     scan_time=results.scan_time, saved_at=time.time())
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.state_file)
+        self._saved_rows = count
+        self._rows_length = rows_length
+    
+    def load(self):
+        """读取断点，返回 (结果存储, 状态字典)"""
+        state = self._read_state()
+        results = ScanResultStore()
+        results.scan_time = state['scan_time']
+        with open(self.rows_file, 'rb') as f:
+            while f.tell() < state['rows_length']:
+                results.extend_columns(pickle.load(f))
+        if len(results) != state['rows']:
+            raise EOFError("断点数据不完整")
+        self._saved_rows = state['rows']
+        self._rows_length = state['rows_length']
+        return results, state
+    
+    def clear(self):
+        for file_path in (self.state_file, self.rows_file):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+        self._saved_rows = 0
+        self._rows_length = 0
+
+# 扫描优先级：名称 -> (显示名, nice 值, I/O 优先级, 每秒目录数上限, 每秒 stat 次数上限)
+SCAN_PRIORITIES = {
+    'normal': ('正常', 0, None, 0, 0),
+    'low': ('低优先级', 10, 'low', 2000, 20000),
+    'background': ('后台', 19, 'idle', 300, 3000),
+}
+
+def lower_thread_priority(nice, io_class):
+    """降低当前线程的 CPU 和 I/O 优先级（在扫描线程中调用），返回实际生效的设置说明"""
+    applied = []
+    if os.name == 'nt':
+        # 后台模式同时降低线程的 CPU、I/O 和内存优先级
+        THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+        THREAD_PRIORITY_LOWEST = -2
+        kernel32 = ctypes.windll.kernel32
+        thread = kernel32.GetCurrentThread()
+        if io_class and kernel32.SetThreadPriority(thread, THREAD_MODE_BACKGROUND_BEGIN):
+            applied.append("后台I/O")
+        elif nice and kernel32.SetThreadPriority(thread, THREAD_PRIORITY_LOWEST):
+            applied.append("低CPU")
+        return applied
+    
+    # Linux 上 nice 和 ionice 都按线程生效
+    tid = threading.get_native_id()
+    if nice:
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, nice)
+            applied.append(f"nice {nice}")
+        except (OSError, AttributeError):
+            pass
+    if io_class and hasattr(psutil, 'IOPRIO_CLASS_IDLE'):
+        try:
+            if io_class == 'idle':
+                psutil.Process(tid).ionice(psutil.IOPRIO_CLASS_IDLE)
+                applied.append("ionice idle")
+            else:
+                psutil.Process(tid).ionice(psutil.IOPRIO_CLASS_BE, 7)
+                applied.append("ionice be/7")
+        except (psutil.Error, OSError, ValueError):
+            pass
+    return applied
+
+class TokenBucket:
+    """令牌桶限速：平均速率不超过 rate，最多允许 0.1 秒的突发"""
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = 0.0
+        self._last = time.monotonic()
+    
+    def set_rate(self, rate):
+        self.rate = rate
+    
+    def take(self, count=1):
+        """取走 count 个令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        burst = self.rate * 0.1
+        self._tokens = min(burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= count
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+class IoPressureMonitor:
+    """估计系统 I/O 压力（0~1）：Linux 用 iowait 占比，其他系统用磁盘读写耗时占比"""
+    def __init__(self):
+        self._last = self._sample()
+    
+    @staticmethod
+    def _sample():
+        cpu = psutil.cpu_times()
+        if hasattr(cpu, 'iowait'):
+            return 'iowait', cpu.iowait, sum(cpu)
+        disk = psutil.disk_io_counters()
+        if disk is None:
+            return None
+        return 'disk', (disk.read_time + disk.write_time) / 1000, time.monotonic()
+    
+    def pressure(self):
+        current = self._sample()
+        last, self._last = self._last, current
+        if current is None or last is None:
+            return None
+        busy = current[1] - last[1]
+        total = current[2] - last[2]
+        if total <= 0:
+            return None
+        if current[0] == 'iowait':
+            # 以单个 CPU 为单位，避免多核机器上 iowait 被稀释
+            total /= psutil.cpu_count() or 1
+        return max(0.0, min(1.0, busy / total))
+
+class ScanThrottle:
+    """扫描限速：按每秒目录数和 stat 次数限速，I/O 压力升高时自动降速，压力下降后逐步恢复"""
+    ADJUST_INTERVAL = 1.0       # 调整和汇报间隔（秒）
+    HIGH_PRESSURE = 0.20        # 高于此 I/O 压力时减半速率
+    LOW_PRESSURE = 0.05         # 低于此 I/O 压力时逐步恢复
+    MIN_FACTOR = 0.05
+    
+    def __init__(self, priority, stop_event):
+        self.label, self.nice, self.io_class, self.dir_rate, self.stat_rate = SCAN_PRIORITIES[priority]
+        self.enabled = bool(self.dir_rate)
+        self._stop_event = stop_event
+        self._dirs = TokenBucket(self.dir_rate or 1)
+        self._stats = TokenBucket(self.stat_rate or 1)
+        self._monitor = IoPressureMonitor() if self.enabled else None
+        self.factor = 1.0
+        self.pressure = None
+        self.applied = []
+        self._window_start = time.monotonic()
+        self._window_dirs = 0
+        self._window_stats = 0
+        self.dirs_per_second = 0.0
+        self.stats_per_second = 0.0
+    
+    def apply_priority(self):
+        """在扫描线程开始时调用"""
+        self.applied = lower_thread_priority(self.nice, self.io_class) if self.enabled else []
+    
+    def directory_done(self, entries):
+        """列完一个目录（entries 为其中的项目数，每项约一次 stat）后调用，必要时等待"""
+        self._window_dirs += 1
+        self._window_stats += entries
+        if self.enabled:
+            delay = max(self._dirs.take(1), self._stats.take(entries))
+            if delay > 0:
+                # 等待期间取消扫描可立即返回
+                self._stop_event.wait(delay)
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.ADJUST_INTERVAL:
+            return False
+        self.dirs_per_second = self._window_dirs / elapsed
+        self.stats_per_second = self._window_stats / elapsed
+        self._window_start = now
+        self._window_dirs = self._window_stats = 0
+        if self.enabled:
+            self._adjust()
+        return True
+    
+    def _adjust(self):
+        self.pressure = self._monitor.pressure()
+        if self.pressure is None:
+            return
+        if self.pressure > self.HIGH_PRESSURE:
+            self.factor = max(self.MIN_FACTOR, self.factor * 0.5)
+        elif self.pressure < self.LOW_PRESSURE:
+            self.factor = min(1.0, self.factor * 1.25)
+        self._dirs.set_rate(self.dir_rate * self.factor)
+        self._stats.set_rate(self.stat_rate * self.factor)
+    
+    def describe(self):
+        """状态栏显示的限速说明"""
+        text = f"{self.label} · 目录 {self.dirs_per_second:,.0f}/s · stat {self.stats_per_second:,.0f}/s"
+        if not self.enabled:
+            return text
+        text += f"（上限 {self.dir_rate * self.factor:,.0f} / {self.stat_rate * self.factor:,.0f}"
+        if self.pressure is not None:
+            text += f"，I/O 压力 {self.pressure:.0%}"
+        text += "）"
+        if self.applied:
+            text += " · " + ", ".join(self.applied)
+        return text
+
+# ---------------- 扫描诊断 ----------------
+class ScanStats:
+    """扫描诊断数据：各阶段耗时、系统调用次数、按类型统计的错误和最慢的目录
+
+    列目录线程、扫描线程和界面线程都会写入，用一个锁保护（每个目录只加锁几次）。
+    可选地用 cProfile 分析扫描线程、用 tracemalloc 统计内存分配，报告以文本保存。
+    """
+    SLOWEST = 20            # 保留的最慢目录数
+    ERROR_SAMPLES = 5       # 每种错误保留的示例数
+    REPORT_LINES = 40       # cProfile / tracemalloc 报告保留的行数
+    
+    # 阶段名 -> 显示名（wait_listing/process/throttle/checkpoint/paused 合计约等于遍历耗时）
+    PHASES = {
+        'total': '总耗时',
+        'prepare': '准备（已用空间、根目录）',
+        'calibrate': '选择列目录方式（校准）',
+        'resume': '读取断点',
+        'wait_listing': '等待列目录结果',
+        'process': '处理列目录结果',
+        'throttle': '限速等待',
+        'checkpoint': '保存断点',
+        'paused': '暂停',
+        'probe': '随机下探',
+        'sort': '整理排序',
+        'index': '建立索引',
+        'compare': '对齐比较各根目录',
+        'listing_io': '列目录 I/O（各列目录线程累计）',
+        'gui_progress': '界面处理进度信号',
+        'gui_finish': '界面载入结果',
+    }
+    COUNTERS = {
+        'directories': '已列出目录',
+        'scandir': 'scandir 调用',
+        'stat': 'stat 调用',
+        'entries': '目录项',
+        'timeouts': '列目录超时',
+        'progress_signals': '发出的进度信号',
+        'gui_progress_calls': '界面收到的进度信号',
+    }
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.errors = {}            # 错误类型 -> [次数, [(路径, 说明)]]
+        self._slowest = []          # 最小堆 (耗时, 路径)
+        self.profile = None         # cProfile 报告
+        self.memory = None          # tracemalloc 报告
+        self.listers = {}           # 根目录 -> (使用的列目录方式, {方式: 校准时每个目录项的秒数})
+    
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+    
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+    
+    def record_listing(self, stat_calls, entries, errors):
+        """列目录线程中的一次 scandir：stat 次数、目录项数和被跳过的目录项错误 [(路径, 异常)]"""
+        with self._lock:
+            counters = self.counters
+            counters['scandir'] += 1
+            counters['stat'] += stat_calls
+            counters['entries'] += entries
+            for path, error in errors:
+                self._add_error(path, error)
+    
+    def error(self, path, error):
+        with self._lock:
+            self._add_error(path, error)
+    
+    def record_lister(self, root, name, timings):
+        with self._lock:
+            self.listers[root] = (name, dict(timings))
+    
+    def _add_error(self, path, error):
+        key = type(error).__name__
+        if isinstance(error, OSError) and error.errno is not None:
+            key += f" ({errno.errorcode.get(error.errno, error.errno)})"
+        record = self.errors.get(key)
+        if record is None:
+            record = self.errors[key] = [0, []]
+        record[0] += 1
+        if len(record[1]) < self.ERROR_SAMPLES:
+            record[1].append((path, getattr(error, 'strerror', None) or str(error)))
+    
+    def directory(self, path, seconds):
+        """一个目录在列目录线程中的实际执行耗时"""
+        with self._lock:
+            self.phases['listing_io'] += seconds
+            self.counters['directories'] += 1
+            slowest = self._slowest
+            if len(slowest) < self.SLOWEST:
+                heapq.heappush(slowest, (seconds, path))
+            elif seconds > slowest[0][0]:
+                heapq.heapreplace(slowest, (seconds, path))
+    
+    def slowest(self):
+        """最慢的目录 [(耗时, 路径)]，从慢到快"""
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
+    
+    def capture_profile(self, profiler, label=''):
+        import pstats
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.REPORT_LINES)
+        report = f"===== {label} =====\n{stream.getvalue()}" if label else stream.getvalue()
+        with self._lock:
+            self.profile = report if self.profile is None else self.profile + '\n' + report
+    
+    def capture_memory(self, snapshot, peak):
+        lines = [f"峰值 {peak / 1048576:.1f} MB，分配最多的代码行："]
+        lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:self.REPORT_LINES])
+        self.memory = '\n'.join(lines)
+    
+    def to_dict(self):
+        """可写入 JSON 的诊断数据"""
+        with self._lock:
+            return {
+                'phases': dict(self.phases),
+                'counters': dict(self.counters),
+                'errors': {key: {'count': count, 'samples': [list(sample) for sample in samples]}
+                           for key, (count, samples) in self.errors.items()},
+                'slowest': [{'path': path, 'seconds': seconds} for seconds, path in sorted(self._slowest, reverse=True)],
+                'profile': self.profile,
+                'memory': self.memory,
+                'listers': {root: {'name': name, 'timings': timings} for root, (name, timings) in self.listers.items()},
+            }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict 的结果重建（后台服务的扫描、导出的 JSON）"""
+        stats = cls()
+        stats.phases.update(data.get('phases') or {})
+        stats.counters.update(data.get('counters') or {})
+        stats.errors = {key: [record['count'], [tuple(sample) for sample in record['samples']]]
+                        for key, record in (data.get('errors') or {}).items()}
+        stats._slowest = [(item['seconds'], item['path']) for item in data.get('slowest') or ()]
+        heapq.heapify(stats._slowest)
+        stats.profile = data.get('profile')
+        stats.memory = data.get('memory')
+        stats.listers = {root: (item['name'], item['timings']) for root, item in (data.get('listers') or {}).items()}
+        return stats
+
+def run_instrumented(stats, body, profile=False, trace_memory=False, label=''):
+    """执行 body，总耗时记入 stats；可选对当前线程做 cProfile 分析、用 tracemalloc 统计内存分配"""
+    # 分析模块只在启用时导入，不拖慢程序启动
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    tracing = False
+    if trace_memory:
+        import tracemalloc
+        tracing = not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()       # 只分析当前线程
+    try:
+        body()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            stats.capture_profile(profiler, label)
+        if tracing:
+            stats.capture_memory(tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        stats.add_time('total', time.perf_counter() - start)
+
+# ---------------- 列目录（超时与自适应并发） ----------------
+def list_directory(path, stats=None):
+    """列出一个目录，返回 (子目录, 文件, 项目数)
+
+    子目录为 (路径, 名称, 修改时间, 访问时间)，文件为 (路径, 名称, 大小, 修改时间, 访问时间)。
+    只做 I/O，在列目录线程中执行；目录本身无法读取时抛出 OSError。
+    无法读取的目录项被跳过，stats（ScanStats）不为 None 时记录调用次数和跳过的原因。
+    """
+    subdirs = []
+    files = []
+    entries = 0
+    stat_calls = 0
+    errors = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                entries += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stat_calls += 1
+                        st = entry.stat(follow_symlinks=False)
+                        subdirs.append((entry.path, entry.name, st.st_mtime, st.st_atime))
+                    elif entry.is_file(follow_symlinks=False):
+                        stat_calls += 1
+                        st = entry.stat(follow_symlinks=False)
+                        files.append((entry.path, entry.name, st.st_size, st.st_mtime, st.st_atime))
+                except OSError as e:
+                    errors.append((entry.path, e))
+    finally:
+        if stats is not None:
+            stats.record_listing(stat_calls, entries, errors)
+    return subdirs, files, entries
+
+def list_directory_lstat(path, stats=None):
+    """列目录的另一种方式：os.scandir 只取名称，再对各目录项逐个调用 os.lstat
+
+    返回值和异常同 list_directory。列名称和取元数据分成两个紧凑的循环，不经过 DirEntry 的方法；
+    在 DirEntry.stat 需要单独系统调用的平台上可能更快（Windows 上 lstat 要打开文件，通常更慢）。
+    """
+    subdirs = []
+    files = []
+    names = []
+    stat_calls = 0
+    errors = []
+    try:
+        with os.scandir(path) as it:
+            names = [(entry.path, entry.name) for entry in it]
+        lstat = os.lstat
+        for entry_path, name in names:
+            stat_calls += 1
+            try:
+                st = lstat(entry_path)
+            except OSError as e:
+                errors.append((entry_path, e))
+                continue
+            mode = st.st_mode
+            if S_ISDIR(mode):
+                subdirs.append((entry_path, name, st.st_mtime, st.st_atime))
+            elif S_ISREG(mode):
+                files.append((entry_path, name, st.st_size, st.st_mtime, st.st_atime))
+    finally:
+        if stats is not None:
+            stats.record_listing(stat_calls, len(names), errors)
+    return subdirs, files, len(names)
+
+# getdents64 / statx（Linux，glibc 2.30 起提供这两个函数）
+_STATX_MASK = 0x1 | 0x2 | 0x20 | 0x40 | 0x200  # STATX_TYPE | MODE | ATIME | MTIME | SIZE
+_STATX_FLAGS = 0x100 | 0x4000                   # AT_SYMLINK_NOFOLLOW | AT_STATX_DONT_SYNC
+_STATX_FIELDS = struct.Struct('=28xH10xQ16xqI36xqI')   # stx_mode, stx_size, stx_atime, stx_mtime（秒, 纳秒）
+_DIRENT_HEADER = struct.Struct('=QqHB')          # d_ino, d_off, d_reclen, d_type，之后是以 0 结尾的名称
+_DT_UNKNOWN, _DT_DIR, _DT_REG = 0, 4, 8
+_linux_calls = None
+_linux_buffers = threading.local()
+
+def _load_linux_calls():
+    """加载 libc 的 getdents64 和 statx，不可用时返回 None"""
+    global _linux_calls
+    if _linux_calls is None:
+        calls = False
+        if sys.platform.startswith('linux'):
+            try:
+                libc = ctypes.CDLL(None, use_errno=True)
+                getdents, statx = libc.getdents64, libc.statx
+            except (OSError, AttributeError):
+                pass
+            else:
+                getdents.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t)
+                getdents.restype = ctypes.c_ssize_t
+                statx.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_uint, ctypes.c_void_p)
+                statx.restype = ctypes.c_int
+                calls = (getdents, statx)
+        _linux_calls = calls
+    return _linux_calls or None
+
+def list_directory_statx(path, stats=None):
+    """列目录的 Linux 专用方式：getdents64 读目录项，statx 相对目录句柄只取需要的字段
+
+    返回值和异常同 list_directory。按 d_type 跳过符号链接等特殊文件，不为它们调用 statx；
+    AT_STATX_DONT_SYNC 允许网络文件系统直接使用缓存的属性。
+    """
+    getdents, statx = _load_linux_calls()
+    buffers = _linux_buffers
+    dirent_buffer = getattr(buffers, 'dirents', None)
+    if dirent_buffer is None:
+        dirent_buffer = buffers.dirents = ctypes.create_string_buffer(64 * 1024)
+        buffers.statx = ctypes.create_string_buffer(256)
+    statx_buffer = buffers.statx
+    unpack_header = _DIRENT_HEADER.unpack_from
+    unpack_statx = _STATX_FIELDS.unpack_from
+    prefix = path if path.endswith(os.sep) else path + os.sep
+    subdirs = []
+    files = []
+    entries = 0
+    stat_calls = 0
+    errors = []
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+    try:
+        while True:
+            length = getdents(fd, dirent_buffer, len(dirent_buffer))
+            if length <= 0:
+                if length < 0:
+                    code = ctypes.get_errno()
+                    raise OSError(code, os.strerror(code), path)
+                break
+            data = ctypes.string_at(dirent_buffer, length)
+            offset = 0
+            while offset < length:
+                _, _, record_length, d_type = unpack_header(data, offset)
+                name = data[offset + 19:data.index(b'\0', offset + 19)]     # 名称之后的填充字节不一定是 0
+                offset += record_length
+                if name == b'.' or name == b'..':
+                    continue
+                entries += 1
+                if d_type != _DT_DIR and d_type != _DT_REG and d_type != _DT_UNKNOWN:
+                    continue
+                stat_calls += 1
+                if statx(fd, name, _STATX_FLAGS, _STATX_MASK, statx_buffer):
+                    code = ctypes.get_errno()
+                    errors.append((prefix + os.fsdecode(name), OSError(code, os.strerror(code))))
+                    continue
+                mode, size, atime, atime_ns, mtime, mtime_ns = unpack_statx(statx_buffer)
+                if S_ISDIR(mode):
+                    name = os.fsdecode(name)
+                    subdirs.append((prefix + name, name, mtime + mtime_ns * 1e-9, atime + atime_ns * 1e-9))
+                elif S_ISREG(mode):
+                    name = os.fsdecode(name)
+                    files.append((prefix + name, name, size, mtime + mtime_ns * 1e-9, atime + atime_ns * 1e-9))
+    finally:
+        os.close(fd)
+        if stats is not None:
+            stats.record_listing(stat_calls, entries, errors)
+    return subdirs, files, entries
+
+# 可选的列目录方式：名称 -> (说明, 函数, 是否可用)
+LISTING_BACKENDS = {
+    'scandir': ("os.scandir + DirEntry.stat", list_directory, lambda: True),
+    'lstat': ("os.scandir 列名称后批量 os.lstat", list_directory_lstat, lambda: True),
+    'statx': ("getdents64 + statx（ctypes，Linux）", list_directory_statx, lambda: _load_linux_calls() is not None),
+}
+LISTER_CALIBRATION_DIRS = 64          # 校准最多使用的目录数
+LISTER_CALIBRATION_ENTRIES = 4000     # 校准样本的目录项数达到此值即停止收集
+LISTER_CALIBRATION_MIN_ENTRIES = 200  # 样本少于此值时差别不可靠，直接使用默认方式
+LISTER_CALIBRATION_MARGIN = 0.9       # 其他方式至少快 10% 才替换 scandir，避免校准噪声来回切换
+_lister_choices = {}                # 设备号 -> (名称, 各方式每个目录项的耗时)
+_lister_lock = threading.Lock()
+
+def available_listers():
+    """当前平台可用的列目录方式名称"""
+    return [name for name, (_, _, available) in LISTING_BACKENDS.items() if available()]
+
+def lister_sample(root, max_dirs=LISTER_CALIBRATION_DIRS, max_entries=LISTER_CALIBRATION_ENTRIES):
+    """用默认方式广度优先收集 root 下的一批目录，返回 (目录列表, 目录项总数)；同时预热了目录缓存"""
+    sample = []
+    entries = 0
+    pending = [root]
+    for path in pending:        # 循环中追加的子目录排在后面
+        if len(sample) >= max_dirs or entries >= max_entries:
+            break
+        try:
+            subdirs, _, count = list_directory(path)
+        except OSError:
+            continue
+        sample.append(path)
+        entries += count
+        pending.extend(subdir[0] for subdir in subdirs)
+    return sample, entries
+
+def time_listers(sample, entries, rounds=3):
+    """用各列目录方式轮流列出 sample 中的目录，返回 {名称: 每个目录项的秒数}
+
+    每轮按不同顺序执行各方式，取各自最好的一轮，各方式在相同的缓存状态下比较。
+    """
+    names = available_listers()
+    best = {}
+    for round_ in range(rounds):
+        shift = round_ % len(names)
+        for name in names[shift:] + names[:shift]:
+            lister = LISTING_BACKENDS[name][1]
+            start = time.perf_counter()
+            for path in sample:
+                try:
+                    lister(path)
+                except OSError:
+                    pass
+            elapsed = time.perf_counter() - start
+            best[name] = min(best.get(name, elapsed), elapsed)
+    return {name: seconds / max(entries, 1) for name, seconds in best.items()}
+
+def calibrate_listers(root):
+    """在 root 下取一小批目录比较各列目录方式，返回 {名称: 每个目录项的秒数}；样本太少时返回空 dict"""
+    sample, entries = lister_sample(root)
+    if entries < LISTER_CALIBRATION_MIN_ENTRIES:
+        return {}
+    return time_listers(sample, entries)
+
+def pick_lister(timings):
+    """按校准结果选择列目录方式：其他方式明显快于 scandir 时才选用，否则保持 scandir"""
+    if not timings:
+        return 'scandir'
+    fastest = min(timings, key=timings.get)
+    return fastest if timings[fastest] < timings['scandir'] * LISTER_CALIBRATION_MARGIN else 'scandir'
+
+def select_lister(root):
+    """选择 root 所在文件系统上最快的列目录方式，返回 (名称, 函数, {名称: 每个目录项的秒数})
+
+    QSettings 的 scan/lister 项可指定 LISTING_BACKENDS 中的名称，默认 auto：每个设备首次扫描时
+    校准一次，结果在本进程内缓存。可能卡在挂起的网络路径上，扫描线程在列目录线程池中调用。
+    """
+    setting = QSettings().value("scan/lister", "auto")
+    if setting in LISTING_BACKENDS and LISTING_BACKENDS[setting][2]():
+        return setting, LISTING_BACKENDS[setting][1], {}
+    device = os.stat(root).st_dev
+    with _lister_lock:
+        choice = _lister_choices.get(device)
+    if choice is None:
+        timings = calibrate_listers(root)
+        choice = (pick_lister(timings), timings)
+        with _lister_lock:
+            _lister_choices[device] = choice
+    name, timings = choice
+    return name, LISTING_BACKENDS[name][1], timings
+
+def _used_bytes(root):
+    """分区根目录的已用空间，其他路径返回 0"""
+    return psutil.disk_usage(root).used if os.path.ismount(root) else 0
+
+def list_disk_partitions():
+    """可扫描的磁盘分区 [(挂载点, 图标)]，按挂载点排序；只读分区表，不查询各分区的用量"""
+    disks = []
+    for part in psutil.disk_partitions():
+        if os.name == 'nt':  # Windows
+            if 'cdrom' in part.opts or not part.mountpoint:
+                continue
+            if 'fixed' in part.opts:
+                icon = "💾"
+            elif 'removable' in part.opts:
+                icon = "💿"
+            else:
+                icon = "📀"
+        else:  # Linux/macOS：只列出实际的磁盘分区
+            if part.fstype in ('squashfs', 'iso9660', 'udf') or \
+                    part.mountpoint.startswith(('/proc', '/sys', '/dev', '/run', '/snap')):
+                continue
+            icon = "💾"
+        disks.append((part.mountpoint, icon))
+    disks.sort()
+    return disks
+
+def list_subfolders(path):
+    """列出 path 下的子文件夹 [(名称, 路径)]（跳过 $ 和 . 开头的），按名称排序；只列一次目录"""
+    folders = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.startswith(('$', '.')):
+                continue
+            try:
+                if entry.is_dir():
+                    folders.append((entry.name, entry.path))
+            except OSError:
+                continue
+    folders.sort(key=lambda folder: folder[0].lower())
+    return folders
+
+class FakeSlowLister:
+    """测试用的慢文件系统：按路径通配符给列目录加上延迟，延迟为 inf 时永远挂起
+
+    规则写法为 "通配符=秒;通配符=秒"，例如 "*/nfs/*=0.05;*/hung=inf"；
+    设置环境变量 BIGFILEFINDER_FAKE_SLOW 后界面中的扫描也会使用它。
+    """
+    ENV = 'BIGFILEFINDER_FAKE_SLOW'
+    
+    def __init__(self, rules, lister=list_directory):
+        self.rules = [(os.path.normcase(pattern), delay) for pattern, delay in rules]
+        self.lister = lister
+    
+    @classmethod
+    def from_spec(cls, spec, lister=list_directory):
+        rules = []
+        for part in spec.split(';'):
+            pattern, sep, delay = part.strip().rpartition('=')
+            if sep and pattern:
+                rules.append((pattern, float(delay)))
+        return cls(rules, lister)
+    
+    @classmethod
+    def from_environment(cls, lister=list_directory):
+        spec = os.environ.get(cls.ENV)
+        return cls.from_spec(spec, lister) if spec else None
+    
+    def __call__(self, path, *args):
+        normalized = os.path.normcase(path)
+        for pattern, delay in self.rules:
+            if fnmatch.fnmatchcase(normalized, pattern):
+                if delay == float('inf'):
+                    threading.Event().wait()    # 模拟挂起的网络共享
+                time.sleep(delay)
+                break
+        return self.lister(path, *args)
+
+class _ListingTask:
+    """提交给列目录线程的一次调用"""
+    __slots__ = ('func', 'args', 'done', 'started', 'elapsed', 'result', 'error',
+                 'finished', 'abandoned')
+    
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.done = threading.Event()
+        self.started = None         # 开始执行的时间（monotonic），排队中为 None
+        self.elapsed = 0.0
+        self.result = None
+        self.error = None
+        self.finished = False
+        self.abandoned = False
+
+class DirectoryListingPool:
+    """列目录线程池，并发数按列目录耗时自适应
+
+    列目录可能卡在挂起的网络路径上且无法中断，因此使用守护线程：超时放弃的任务继续占着
+    它的线程，池另开线程补上（有上限），卡住的线程也不会阻止程序退出。
+    本地磁盘列目录很快，线程切换反而是开销，并发数逐步降到 1；网络文件系统延迟高，
+    并发数逐步加倍，让多个目录的请求同时在途。
+    """
+    MAX_THREADS = 64
+    ADJUST_EVERY = 64           # 每完成多少次列目录调整一次并发数
+    FAST_LATENCY = 0.0005       # 平均耗时低于此值时并发数减半
+    SLOW_LATENCY = 0.005        # 平均耗时高于此值时并发数加倍
+    
+    def __init__(self, concurrency=4, max_concurrency=32, initializer=None):
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self._initializer = initializer     # 每个线程开始时调用（如降低线程优先级）
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._threads = 0
+        self._stuck = 0
+        self._closed = False
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._ensure_workers()
+    
+    def submit(self, func, *args):
+        task = _ListingTask(func, args)
+        self._queue.put(task)
+        return task
+    
+    def abandon(self, task):
+        """放弃超时仍在执行的任务并另开线程顶替；任务恰好已完成时返回 False"""
+        with self._lock:
+            if task.finished:
+                return False
+            task.abandoned = True
+            self._stuck += 1
+        self._ensure_workers()
+        return True
+    
+    def exhausted(self):
+        """线程已达上限且全部卡住，排队的任务不会再被执行"""
+        with self._lock:
+            return self._stuck >= self.MAX_THREADS
+    
+    def record(self, elapsed):
+        """记录一次列目录耗时（由扫描线程调用），定期调整并发数"""
+        self._latency_sum += elapsed
+        self._latency_count += 1
+        if self._latency_count < self.ADJUST_EVERY:
+            return
+        mean = self._latency_sum / self._latency_count
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        if mean > self.SLOW_LATENCY:
+            self.concurrency = min(self.max_concurrency, self.concurrency * 2)
+            self._ensure_workers()
+        elif mean < self.FAST_LATENCY:
+            self.concurrency = max(1, self.concurrency // 2)
+    
+    def shutdown(self):
+        """丢弃尚未开始的任务并让空闲线程退出，不等待卡住的线程"""
+        with self._lock:
+            self._closed = True
+            threads = self._threads
+        for _ in range(threads):
+            self._queue.put(None)
+    
+    def _ensure_workers(self):
+        with self._lock:
+            while (self._threads - self._stuck < self.concurrency
+                   and self._threads < self.MAX_THREADS and not self._closed):
+                self._threads += 1
+                threading.Thread(target=self._worker, name='directory-listing', daemon=True).start()
+    
+    def _worker(self):
+        if self._initializer is not None:
+            self._initializer()
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            if not self._closed:
+                task.started = time.monotonic()
+                try:
+                    task.result = task.func(*task.args)
+                except Exception as e:
+                    task.error = e
+                task.elapsed = time.monotonic() - task.started
+            with self._lock:
+                task.finished = True
+                if task.abandoned:
+                    self._stuck -= 1
+            task.done.set()
+
+class BackgroundCalls(QObject):
+    """在守护线程中执行可能卡住的调用（查询分区用量、列目录），结果回到界面线程中处理
+
+    挂起的网络路径上 disk_usage / os.scandir 可能长时间不返回，界面线程不直接调用它们。
+    超过 timeout 秒仍未返回的调用被放弃，回调收到 TimeoutError；卡住的线程由 DirectoryListingPool
+    另开线程顶替，也不会阻止程序退出。
+    """
+    POLL_INTERVAL = 20          # 检查调用是否完成的间隔（毫秒）
+    
+    def __init__(self, timeout=3.0, parent=None):
+        super().__init__(parent)
+        self.timeout = timeout
+        self.pool = DirectoryListingPool(concurrency=8, max_concurrency=8)
+        self._calls = []            # (任务, 回调)
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.POLL_INTERVAL)
+        self._timer.timeout.connect(self._poll)
+    
+    def call(self, callback, func, *args):
+        """在后台执行 func(*args)，完成后在界面线程中调用 callback(结果, 异常)"""
+        self._calls.append((self.pool.submit(func, *args), callback))
+        if not self._timer.isActive():
+            self._timer.start()
+    
+    def _poll(self):
+        now = time.monotonic()
+        pool = self.pool
+        pending = []
+        done = []
+        for task, callback in self._calls:
+            if task.done.is_set():
+                done.append((callback, task.result, task.error))
+            elif ((task.started is not None and now - task.started > self.timeout)
+                    or (task.started is None and pool.exhausted())) and pool.abandon(task):
+                done.append((callback, None, TimeoutError(f"{self.timeout:g} 秒内没有响应")))
+            else:
+                pending.append((task, callback))
+        self._calls = pending
+        if not pending:
+            self._timer.stop()
+        for callback, result, error in done:
+            callback(result, error)
 
 class FolderSizeScanner(QThread):
-    """快速扫描文件夹大小的线程"""
-    progress = Signal(str, int, int)  # 当前扫描路径，当前数量，总数量估算
-    finished = Signal(list)           # 扫描完成
+    """快速扫描文件夹大小的线程
+
+    只遍历一次目录树：每个目录用 os.scandir 列出一次，文件大小在列目录时累加，
+    子目录完成后把大小汇总到父目录（后序汇总），同时统计扩展名分布，
+    并利用同一次 stat 得到的时间戳累计各年龄阈值的冷数据字节数。
+    列目录交给 DirectoryListingPool 并提前提交接下来的子目录；扫描线程只按深度优先顺序
+    处理结果，因此结果与顺序扫描一致。超过 dir_timeout 秒仍未列完的目录被跳过并记入 slow_dirs。
+    """
+    progress = Signal(str, int, int)  # 当前扫描路径，已扫描项目数，完成百分比（未知时为-1）
+    finished = Signal(object)         # 扫描完成（ScanResultStore）
     error = Signal(str)               # 错误信号
+    checkpoint_saved = Signal(int)    # 断点已保存（已扫描项目数）
+    throttle_status = Signal(str)     # 当前扫描速率和限速说明（约每秒一次）
+    slow_directory = Signal(str, float, bool)  # 慢目录：路径，耗时（秒），是否因超时被跳过
+    stopped = Signal()                # 取消后扫描线程即将退出（断点已保存）
+    diagnostics = Signal(object)      # 扫描线程退出前的诊断数据（ScanStats），在 finished/stopped 之后
+    
+    PROGRESS_INTERVAL = 0.1           # 进度信号最小间隔（秒）
+    WAIT_SLICE = 0.05                 # 等待列目录结果时检查取消和超时的间隔（秒）
+    SLOW_THRESHOLD = 2.0              # 列目录超过此秒数记为慢目录
+    _CANCELLED = object()
+    
+    def __init__(self, root_path, scan_files=False, scan_folders=True, ext_categories=None,
+                 checkpoint=None, resume=False, priority='normal', dir_timeout=10.0, lister=None,
+                 exclude=()):
+        super().__init__()
+        self.root_path = root_path
+        self._cancelled = False
+        self._stop_event = threading.Event()    # 取消时置位，用于打断限速等待
+        self._running = threading.Event()   # 清除表示暂停
+        self._running.set()
+        self.throttle = ScanThrottle(priority, self._stop_event)
+        self.dir_timeout = dir_timeout      # 单个目录的列目录超时（秒）
+        self.lister = lister                # 可替换为 FakeSlowLister 等；None 为扫描开始时自动选择（select_lister）
+        self.pool = None
+        self._pending = {}                  # 已提前提交的列目录任务：路径 -> _ListingTask
+        self.slow_dirs = []                 # (路径, 耗时秒, 是否超时跳过)
+        # 不进入的目录（规范化路径），多根目录扫描时用于跳过由其他扫描负责的挂载点
+        self.exclude = frozenset(os.path.normcase(path) for path in exclude)
+        self.prepare_results = True         # 完成后构建搜索索引和排序（合并扫描时由合并后的结果构建）
+        self.stats = ScanStats()            # 各阶段耗时、调用次数、错误和最慢目录
+        self.profile = False                # 是否用 cProfile 分析扫描线程
+        self.trace_memory = False           # 是否用 tracemalloc 统计内存分配
+        self.checkpoint = checkpoint        # ScanCheckpoint，None 表示不保存断点
+        self.resume = resume                # 是否从断点继续
+        self.scan_files = scan_files
+        self.scan_folders = scan_folders
+        self.search_index = None      # 扫描线程中构建的搜索索引
+        self.breakdown = TypeBreakdown(ext_categories)
+        self.cleanup = CleanupCandidates()  # 清理候选，在列目录的同时检测
+        # 年龄阈值对应的时间点，在 run 开始时确定
+        self._age_cutoffs = ()
+        self._dir_rows = array('i')   # 目录编号 -> 结果行号（未记录为 -1）
+
+    def cancel(self):
+        self._cancelled = True
+        self._stop_event.set()
+        self._running.set()         # 暂停中也要能退出
+    
+    def pause(self):
+        self._running.clear()
+    
+    def resume_scan(self):
+        self._running.set()
+    
+    def is_paused(self):
+        return not self._running.is_set()
+    
+    def _save_checkpoint(self, results, stack, scanned_bytes):
+        """保存断点（遍历栈为空表示遍历已完成）；写入失败不影响扫描本身"""
+        if self.checkpoint is None:
+            return
+        start = time.perf_counter()
+        try:
+            self.checkpoint.save(results, {
+                'stack': stack,
+                'dir_rows': self._dir_rows,
+                'extensions': self.breakdown.extensions,
+                'cleanup': self.cleanup.state(),
+                'scanned_bytes': scanned_bytes,
+            })
+        except (OSError, pickle.PicklingError) as e:
+            self.stats.error(self.checkpoint.directory, e)
+            return
+        finally:
+            self.stats.add_time('checkpoint', time.perf_counter() - start)
+        self.checkpoint_saved.emit(len(results))
+    
+    def run(self):
+        run_instrumented(self.stats, self._scan, self.profile, self.trace_memory, self.root_path)
+        self.diagnostics.emit(self.stats)
+        
+    def _scan(self):
+        stats = self.stats
+        phase_start = time.perf_counter()
+        try:
+            root = self.root_path
+            self.throttle.apply_priority()
+            # 限速扫描时不放大并发，避免同时压上过多 I/O
+            self.pool = DirectoryListingPool(
+                max_concurrency=2 if self.throttle.enabled else 32,
+                initializer=self.throttle.apply_priority if self.throttle.enabled else None)
+            
+            # 扫描整个分区时可按已用空间估算进度（挂起的网络路径上同样受超时限制）
+            expected_bytes = self._wait(self.pool.submit(_used_bytes, root), root, record=False)
+            if expected_bytes is self._CANCELLED:
+                return
+            expected_bytes = expected_bytes or 0
+            
+            if self.lister is None:
+                # 按文件系统选择最快的列目录方式；校准超时或出错时使用默认方式
+                calibrate_start = time.perf_counter()
+                choice = self._wait(self.pool.submit(select_lister, root), root, record=False)
+                if choice is self._CANCELLED:
+                    return
+                name, self.lister, timings = choice or ('scandir', list_directory, {})
+                stats.record_lister(root, name, timings)
+                calibrated = time.perf_counter() - calibrate_start
+                stats.add_time('calibrate', calibrated)
+                phase_start += calibrated   # 不重复计入准备阶段
+            
+            if self.resume and self.checkpoint is not None:
+                # 从断点恢复遍历栈、目录编号表和已有结果，扫描时间沿用原来的
+                try:
+                    results, state = self.checkpoint.load()
+                except (OSError, pickle.UnpicklingError, EOFError, KeyError) as e:
+                    self.error.emit(f"无法读取扫描断点: {e}")
+                    return
+                stack = state['stack']
+                self._dir_rows = state['dir_rows']
+                self.breakdown.extensions = state['extensions']
+                if 'cleanup' in state:
+                    self.cleanup.restore(state['cleanup'])
+                for frame in stack:
+                    if not hasattr(frame, 'cleanup'):  # 旧版断点中的目录不检测清理候选
+                        frame.cleanup = CleanupCandidates.INSIDE
+                scanned_bytes = state['scanned_bytes']
+                self._age_cutoffs = tuple(results.scan_time - days * 86400 for days in AGE_BUCKET_DAYS)
+                self.cleanup.scan_time = results.scan_time
+                stats.add_time('resume', time.perf_counter() - phase_start)
+            else:
+                results = ScanResultStore()
+                results.scan_time = time.time()
+                self._age_cutoffs = tuple(results.scan_time - days * 86400 for days in AGE_BUCKET_DAYS)
+                self.cleanup.scan_time = results.scan_time
+                if self.checkpoint is not None:
+                    self.checkpoint.clear()
+                try:
+                    st = self._wait(self.pool.submit(os.stat, root), root, record=False, raise_os_error=True)
+                except OSError as e:
+                    self.error.emit(f"无法访问 {root}: {e}")
+                    return
+                if st is self._CANCELLED:
+                    return
+                if st is None:
+                    self.error.emit(f"访问 {root} 超时")
+                    return
+                listing = self._list(root)
+                if listing is self._CANCELLED:
+                    return
+                if listing is None:
+                    self.error.emit(f"无法读取目录: {root}")
+                    return
+                root_name = os.path.splitdrive(root)[0] + '根目录'
+                root_frame = self._open_dir(root, root_name, 0, st.st_mtime, st.st_atime, results, listing)
+                stack = [root_frame]
+                scanned_bytes = root_frame.size
+                stats.add_time('prepare', time.perf_counter() - phase_start)
+            last_progress = 0.0
+            last_checkpoint = time.monotonic()
+            
+            while stack:
+                if self._cancelled:
+                    # 停止或关闭窗口时保存断点，下次可继续
+                    self._save_checkpoint(results, stack, scanned_bytes)
+                    return
+                if not self._running.is_set():
+                    self._save_checkpoint(results, stack, scanned_bytes)
+                    paused_at = time.perf_counter()
+                    self._running.wait()
+                    stats.add_time('paused', time.perf_counter() - paused_at)
+                    last_checkpoint = time.monotonic()
+                    continue
+                frame = stack[-1]
+                
+                if frame.next_subdir < len(frame.subdirs):
+                    # 进入下一个子目录，同时提前提交之后要列的目录
+                    self._prefetch(frame)
+                    path, name, mtime, atime = frame.subdirs[frame.next_subdir]
+                    listing = self._list(path)
+                    if listing is self._CANCELLED:
+                        continue    # 该目录尚未处理，断点中保留
+                    frame.next_subdir += 1
+                    if listing is not None:
+                        child = self._open_dir(path, name, frame.level + 1, mtime, atime, results, listing,
+                                               frame.cleanup)
+                        stack.append(child)
+                        scanned_bytes += child.size
+                    
+                    now = time.monotonic()
+                    if now - last_progress >= self.PROGRESS_INTERVAL:
+                        last_progress = now
+                        percent = min(99, scanned_bytes * 100 // expected_bytes) if expected_bytes else -1
+                        self.progress.emit(path, len(results), percent)
+                        stats.count('progress_signals')
+                        if now - last_checkpoint >= ScanCheckpoint.INTERVAL:
+                            self._save_checkpoint(results, stack, scanned_bytes)
+                            last_checkpoint = time.monotonic()
+                    continue
+                
+                # 所有子目录已完成，汇总到父目录
+                stack.pop()
+                parent_id = -1
+                if stack:
+                    parent = stack[-1]
+                    parent_id = parent.dir_id
+                    parent.size += frame.size
+                    parent_cold = parent.cold
+                    for i, cold in enumerate(frame.cold):
+                        parent_cold[i] += cold
+                if frame.cleanup:
+                    self.cleanup.add_dir(frame.cleanup, frame.path, frame.size)
+                if self.scan_folders:
+                    self._dir_rows[frame.dir_id] = len(results)
+                    results.append(TYPE_FOLDER, frame.path, frame.name, frame.size, frame.level,
+                                   frame.mtime, frame.atime, frame.cold, parent_id)
+            
+            # 已有断点的长时间扫描在整理结果前再保存一次，整理期间被停止也不必重新遍历
+            if self.checkpoint is not None and self.checkpoint.exists():
+                self._save_checkpoint(results, stack, scanned_bytes)
+            
+            # 父目录编号转换为行号，然后按大小排序
+            phase_start = time.perf_counter()
+            results.resolve_parents(self._dir_rows)
+            results.sort_by_size()
+            stats.add_time('sort', time.perf_counter() - phase_start)
+
+            # 在扫描线程中构建搜索索引和各列排序排列，避免占用界面线程
+            if not self._cancelled and self.prepare_results:
+                phase_start = time.perf_counter()
+                self.search_index = SearchIndex(results)
+                results.prepare_sort_orders()
+                results.prepare_extensions()
+                stats.add_time('index', time.perf_counter() - phase_start)
+
+            if not self._cancelled:
+                if self.checkpoint is not None:
+                    self.checkpoint.clear()
+                self.finished.emit(results)
+                
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+            self._pending.clear()
+            if self._cancelled:
+                self.stopped.emit()
+    
+    def _prefetch(self, frame):
+        """把栈顶目录接下来的子目录提前提交给列目录线程，在途任务数不超过当前并发数"""
+        pending = self._pending
+        limit = self.pool.concurrency
+        subdirs = frame.subdirs
+        for i in range(frame.next_subdir, min(len(subdirs), frame.next_subdir + limit)):
+            if len(pending) >= limit:
+                break
+            path = subdirs[i][0]
+            if path not in pending:
+                pending[path] = self._submit_listing(path)
+    
+    def _submit_listing(self, path):
+        return self.pool.submit(self.lister, path, self.stats)
+    
+    def _list(self, path):
+        """取得目录的列表结果；无法读取或超时返回 None，扫描被取消返回 _CANCELLED"""
+        task = self._pending.pop(path, None)
+        if task is None:
+            task = self._submit_listing(path)
+        listing = self._wait(task, path)
+        if listing is self._CANCELLED:
+            self._pending[path] = task
+        return listing
+    
+    def _wait(self, task, path, record=True, raise_os_error=False):
+        """分段等待任务完成，期间响应取消；执行超过 dir_timeout 秒的任务被放弃并记为超时跳过"""
+        pool = self.pool
+        stats = self.stats
+        wait_start = time.perf_counter()
+        try:
+            while not task.done.wait(self.WAIT_SLICE):
+                if self._cancelled:
+                    return self._CANCELLED
+                started = task.started
+                if ((started is not None and time.monotonic() - started > self.dir_timeout)
+                        or (started is None and pool.exhausted())):
+                    if pool.abandon(task):
+                        if record:
+                            stats.count('timeouts')
+                            self.slow_dirs.append((path, self.dir_timeout, True))
+                            self.slow_directory.emit(path, self.dir_timeout, True)
+                        return None
+                    task.done.wait()
+                    break
+        finally:
+            if record:
+                stats.add_time('wait_listing', time.perf_counter() - wait_start)
+        if record:
+            pool.record(task.elapsed)
+            stats.directory(path, task.elapsed)
+            if task.elapsed >= self.SLOW_THRESHOLD:
+                self.slow_dirs.append((path, task.elapsed, False))
+                self.slow_directory.emit(path, task.elapsed, False)
+        if task.error is not None:
+            if isinstance(task.error, OSError) and not raise_os_error:
+                stats.error(path, task.error)     # 无法读取的目录被跳过，按错误类型计数
+                return None
+            raise task.error
+        return task.result
+    
+    def _open_dir(self, path, name, level, mtime, atime, results, listing, parent_cleanup=None):
+        """处理一个目录的列表结果：累加文件大小，记录子目录，检测清理候选"""
+        start = time.perf_counter()
+        frame = _DirFrame(path, name, level, len(self._dir_rows), mtime, atime)
+        self._dir_rows.append(-1)
+        subdirs, files, entries = listing
+        if self.exclude:
+            normcase = os.path.normcase
+            subdirs = [subdir for subdir in subdirs if normcase(subdir[0]) not in self.exclude]
+        frame.subdirs = subdirs
+        breakdown = self.breakdown
+        scan_files = self.scan_files
+        cold = frame.cold
+        # 候选目录内部不再检测；否则先按目录名判断，再在处理文件时顺带查找标记文件和候选文件
+        cleanup = self.cleanup
+        if parent_cleanup is not None:
+            frame.cleanup = CleanupCandidates.INSIDE
+        else:
+            frame.cleanup = cleanup.match_dir(path, name)
+        detect = frame.cleanup is None
+        marker_names = cleanup.markers
+        file_detectors = cleanup.file_detectors
+        scan_time = cleanup.scan_time
+        markers = []
+        file_hits = {}
+        # 按三个阈值展开比较，避免每个文件一次内层循环
+        cutoff_30, cutoff_90, cutoff_365 = self._age_cutoffs
+        files_size = 0
+        for file_path, file_name, size, file_mtime, file_atime in files:
+            files_size += size
+            ext = breakdown.add(file_name, size)
+            # 最后一次修改或访问时间决定冷数据年龄
+            touched = file_mtime if file_mtime > file_atime else file_atime
+            file_cold = None
+            if touched < cutoff_30:
+                cold[0] += size
+                if touched < cutoff_90:
+                    cold[1] += size
+                    if touched < cutoff_365:
+                        cold[2] += size
+                        file_cold = (size, size, size)
+                    else:
+                        file_cold = (size, size, 0)
+                else:
+                    file_cold = (size, 0, 0)
+            if detect:
+                if file_name in marker_names:
+                    markers.append(file_name)
+                detectors = file_detectors.get(ext)
+                if detectors is None and ext.isdigit():
+                    ext = '#'
+                    detectors = file_detectors.get(ext)
+                if detectors is not None:
+                    for detector in detectors:
+                        if detector.match_file(file_name, ext, size, touched, scan_time):
+                            hit = file_hits.get(detector.key)
+                            if hit is None:
+                                hit = file_hits[detector.key] = [0, 0]
+                            hit[0] += 1
+                            hit[1] += size
+                            break
+            if scan_files:
+                results.append(TYPE_FILE, file_path, file_name, size, level + 1,
+                               file_mtime, file_atime, file_cold,
+                               frame.dir_id)
+        if detect:
+            frame.cleanup = cleanup.close_dir(path, subdirs, markers, file_hits)
+        frame.size = files_size
+        throttle_start = time.perf_counter()
+        if self.throttle.directory_done(entries):
+            self.throttle_status.emit(self.throttle.describe())
+        end = time.perf_counter()
+        self.stats.add_time('process', throttle_start - start)
+        self.stats.add_time('throttle', end - throttle_start)
+        return frame
+
+class EstimateScanner(FolderSizeScanner):
+    """限时估算扫描（只统计文件夹）
+
+    先按广度优先列目录，文件很多的目录只对随机抽取的部分文件 stat，用样本均值推算文件总大小；
+    列目录用掉一部分时间后，对尚未列到的目录（前沿）做随机下探（Knuth 估计）：从随机的前沿目录出发，
+    每层随机进入一个子目录，以沿途子目录数的连乘作为权重累加各层的文件大小，得到该前沿目录子树大小的无偏估计。
+    下探结果按已列出的祖先目录分别统计，每个文件夹的大小 = 已列出部分 + 其下前沿目录数 × 下探均值，
+    并给出 95% 置信区间。下探期间定期发出 estimate_updated，结果随时间逐步细化，直到时间用完或被停止。
+    """
+    estimate_updated = Signal(object)   # 逐步细化的中间结果（ScanResultStore）
+    
+    EXACT_LIMIT = 1000          # 文件数不超过此值的目录对全部文件 stat
+    SAMPLE_SIZE = 200           # 文件更多时随机抽样的文件数
+    ENUMERATE_SHARE = 0.6       # 用于广度优先列目录的时间比例，其余用于随机下探
+    REFRESH_INTERVAL = 3.0      # 中间结果刷新间隔（秒）
+    PROBE_CACHE = 200000        # 随机下探缓存的目录列表数上限
+    MAX_PROBE_DEPTH = 256
+    Z95 = 1.96
+    
+    @classmethod
+    def _t95(cls, df):
+        """自由度为 df 的 t 分布 97.5% 分位数（Cornish-Fisher 展开近似），样本少时区间更宽"""
+        if df <= 0:
+            return cls.Z95 * 2
+        z = cls.Z95
+        return z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df * df)
+    
+    def __init__(self, root_path, budget, ext_categories=None, priority='normal',
+                 dir_timeout=10.0, lister=None):
+        super().__init__(root_path, False, True, ext_categories, priority=priority,
+                         dir_timeout=dir_timeout)
+        self.budget = budget                # 时间预算（秒）
+        self.lister = lister or self._sample_directory
+        self._rng = random.Random()
+        # 已列出的目录，按广度优先顺序编号
+        self._paths = []
+        self._names = []
+        self._levels = array('i')
+        self._mtimes = array('d')
+        self._atimes = array('d')
+        self._parents = array('i')
+        self._own = array('d')              # 目录中文件的字节数（估计）
+        self._own_var = array('d')          # 抽样估计的方差
+        self._own_cold = tuple(array('d') for _ in AGE_BUCKET_DAYS)
+        # 各已列出目录之下的前沿目录数和随机下探统计（次数、和、平方和）
+        self._frontier_count = array('i')
+        self._probe_n = array('i')
+        self._probe_sum = array('d')
+        self._probe_sq = array('d')
+    
+    def _sample_directory(self, path, stats=None):
+        """列目录并对文件大小抽样（在列目录线程中执行）
+
+        返回 (子目录, 文件字节数估计, 估计方差, 各阈值冷数据字节数估计, [(文件名, 大小, 代表文件数)])，
+        子目录为 (路径, 名称, 修改时间, 访问时间)。stats 的用法同 list_directory。
+        """
+        subdirs = []
+        files = []
+        entries = 0
+        stat_calls = 0
+        errors = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    entries += 1
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stat_calls += 1
+                            st = entry.stat(follow_symlinks=False)
+                            subdirs.append((entry.path, entry.name, st.st_mtime, st.st_atime))
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append(entry)
+                    except OSError as e:
+                        errors.append((entry.path, e))
+            count = len(files)
+            sampled = count > self.EXACT_LIMIT
+            if sampled:
+                files = self._rng.sample(files, self.SAMPLE_SIZE)
+            sizes = []
+            samples = []
+            cold = [0] * len(AGE_BUCKET_DAYS)
+            for entry in files:
+                stat_calls += 1
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    errors.append((entry.path, e))
+                    continue
+                size = st.st_size
+                sizes.append(size)
+                samples.append((entry.name, size))
+                touched = st.st_mtime if st.st_mtime > st.st_atime else st.st_atime
+                for i, cutoff in enumerate(self._age_cutoffs):
+                    if touched < cutoff:
+                        cold[i] += size
+            if not sampled or not sizes:
+                return subdirs, float(sum(sizes)), 0.0, cold, [(name, size, 1) for name, size in samples]
+            # 简单随机抽样（不放回）：总数 = 文件数 × 样本均值，方差含有限总体校正
+            k = len(sizes)
+            scale = count / k
+            mean = sum(sizes) / k
+            variance = 0.0
+            if k > 1:
+                s2 = sum((x - mean) ** 2 for x in sizes) / (k - 1)
+                variance = count * count * s2 / k * (1 - k / count)
+            return (subdirs, mean * count, variance, [c * scale for c in cold],
+                    [(name, size * scale, scale) for name, size in samples])
+        finally:
+            if stats is not None:
+                stats.record_listing(stat_calls, entries, errors)
+    
+    def _scan(self):
+        stats = self.stats
+        try:
+            root = self.root_path
+            self.throttle.apply_priority()
+            self.pool = DirectoryListingPool(
+                max_concurrency=2 if self.throttle.enabled else 32,
+                initializer=self.throttle.apply_priority if self.throttle.enabled else None)
+            start = time.monotonic()
+            deadline = start + self.budget
+            enumerate_until = start + self.budget * self.ENUMERATE_SHARE
+            scan_time = time.time()
+            self._age_cutoffs = tuple(scan_time - days * 86400 for days in AGE_BUCKET_DAYS)
+            
+            try:
+                st = self._wait(self.pool.submit(os.stat, root), root, record=False, raise_os_error=True)
+            except OSError as e:
+                self.error.emit(f"无法访问 {root}: {e}")
+                return
+            if st is self._CANCELLED:
+                return
+            if st is None:
+                self.error.emit(f"访问 {root} 超时")
+                return
+            
+            # 广度优先列目录：队列元素为 (路径, 名称, 层级, 修改时间, 访问时间, 父目录编号)
+            pending = [(root, os.path.splitdrive(root)[0] + '根目录', 0, st.st_mtime, st.st_atime, -1)]
+            head = 0
+            last_progress = 0.0
+            while head < len(pending):
+                now = time.monotonic()
+                if self._cancelled:
+                    return
+                if not self._running.is_set():
+                    self._running.wait()
+                    paused = time.monotonic() - now
+                    stats.add_time('paused', paused)
+                    deadline += paused
+                    enumerate_until += paused
+                    continue
+                if now >= enumerate_until and self._paths:
+                    break
+                for i in range(head, min(len(pending), head + self.pool.concurrency)):
+                    path = pending[i][0]
+                    if path not in self._pending:
+                        self._pending[path] = self._submit_listing(path)
+                item = pending[head]
+                listing = self._list(item[0])
+                if listing is self._CANCELLED:
+                    continue
+                head += 1
+                if listing is None:
+                    if not self._paths:
+                        self.error.emit(f"无法读取目录: {root}")
+                        return
+                    continue
+                index = self._add_directory(item, listing)
+                level = item[2] + 1
+                pending.extend((path, name, level, mtime, atime, index)
+                               for path, name, mtime, atime in listing[0])
+                if now - last_progress >= self.PROGRESS_INTERVAL:
+                    last_progress = now
+                    self.progress.emit(item[0], len(self._paths),
+                                       min(99, int((now - start) * 100 / self.budget)))
+                    stats.count('progress_signals')
+            
+            # 时间到时仍在队列中的目录即为前沿，用随机下探估计
+            frontier = pending[head:]
+            del pending
+            self._pending.clear()
+            for item in frontier:
+                parent = item[5]
+                while parent >= 0:
+                    self._frontier_count[parent] += 1
+                    parent = self._parents[parent]
+            if frontier:
+                probe_start = time.perf_counter()
+                self.estimate_updated.emit(self._build_store(scan_time))
+                cache = {}
+                last_refresh = time.monotonic()
+                while True:
+                    now = time.monotonic()
+                    if self._cancelled:
+                        return
+                    if not self._running.is_set():
+                        self._running.wait()
+                        paused = time.monotonic() - now
+                        stats.add_time('paused', paused)
+                        probe_start += paused
+                        deadline += paused
+                        continue
+                    if now >= deadline:
+                        break
+                    item = frontier[self._rng.randrange(len(frontier))]
+                    value = self._probe(item[0], cache)
+                    if value is None:
+                        continue
+                    parent = item[5]
+                    while parent >= 0:
+                        self._probe_n[parent] += 1
+                        self._probe_sum[parent] += value
+                        self._probe_sq[parent] += value * value
+                        parent = self._parents[parent]
+                    if now - last_progress >= self.PROGRESS_INTERVAL:
+                        last_progress = now
+                        self.progress.emit(item[0], len(self._paths),
+                                           min(99, int((now - start) * 100 / self.budget)))
+                        stats.count('progress_signals')
+                    if now - last_refresh >= self.REFRESH_INTERVAL:
+                        last_refresh = now
+                        self.estimate_updated.emit(self._build_store(scan_time))
+                stats.add_time('probe', time.perf_counter() - probe_start)
+            
+            phase_start = time.perf_counter()
+            results = self._build_store(scan_time)
+            stats.add_time('sort', time.perf_counter() - phase_start)
+            phase_start = time.perf_counter()
+            self.search_index = SearchIndex(results)
+            results.prepare_sort_orders()
+            results.prepare_extensions()
+            stats.add_time('index', time.perf_counter() - phase_start)
+            if not self._cancelled:
+                self.finished.emit(results)
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+            self._pending.clear()
+            if self._cancelled:
+                self.stopped.emit()
+    
+    def _add_directory(self, item, listing):
+        """记录一个已列出的目录，返回其编号"""
+        start = time.perf_counter()
+        path, name, level, mtime, atime, parent = item
+        subdirs, size, variance, cold, samples = listing
+        self._paths.append(path)
+        self._names.append(name)
+        self._levels.append(level)
+        self._mtimes.append(mtime)
+        self._atimes.append(atime)
+        self._parents.append(parent)
+        self._own.append(size)
+        self._own_var.append(variance)
+        for column, value in zip(self._own_cold, cold):
+            column.append(value)
+        for counter in (self._frontier_count, self._probe_n):
+            counter.append(0)
+        for total in (self._probe_sum, self._probe_sq):
+            total.append(0.0)
+        breakdown = self.breakdown
+        for file_name, file_size, count in samples:
+            breakdown.add(file_name, round(file_size), round(count))
+        throttle_start = time.perf_counter()
+        if self.throttle.directory_done(len(subdirs) + len(samples)):
+            self.throttle_status.emit(self.throttle.describe())
+        end = time.perf_counter()
+        self.stats.add_time('process', throttle_start - start)
+        self.stats.add_time('throttle', end - throttle_start)
+        return len(self._paths) - 1
+    
+    def _probe(self, path, cache):
+        """从 path 随机下探到底，返回其子树大小的一次无偏估计；扫描被取消时返回 None"""
+        total = 0.0
+        weight = 1.0
+        for _ in range(self.MAX_PROBE_DEPTH):
+            listing = cache.get(path)
+            if listing is None:
+                listing = self._list(path)
+                if listing is self._CANCELLED:
+                    return None
+                if listing is None:
+                    break
+                listing = ([subdir[0] for subdir in listing[0]], listing[1])
+                if len(cache) < self.PROBE_CACHE:
+                    cache[path] = listing
+            children, own = listing
+            total += weight * own
+            if not children:
+                break
+            weight *= len(children)
+            path = children[self._rng.randrange(len(children))]
+        return total
+    
+    def _build_store(self, scan_time):
+        """由已列出部分和随机下探统计生成结果（按大小排序，带置信区间）"""
+        n = len(self._paths)
+        parents = self._parents
+        visited = array('d', self._own)
+        variance = array('d', self._own_var)
+        cold = tuple(array('d', column) for column in self._own_cold)
+        # 已列出部分自下而上汇总（广度优先编号中父目录总在子目录之前）
+        for i in range(n - 1, 0, -1):
+            p = parents[i]
+            visited[p] += visited[i]
+            variance[p] += variance[i]
+            for column in cold:
+                column[p] += column[i]
+        
+        # 根目录是所有前沿目录的祖先，其下探统计即全局统计
+        global_n = self._probe_n[0] if n else 0
+        global_mean = global_s2 = 0.0
+        if global_n:
+            global_mean = self._probe_sum[0] / global_n
+            if global_n > 1:
+                global_s2 = max(0.0, (self._probe_sq[0] - global_n * global_mean ** 2) / (global_n - 1))
+        
+        results = ScanResultStore()
+        results.scan_time = scan_time
+        errors = array('q')
+        for i in range(n):
+            size = visited[i]
+            var = variance[i]
+            frontier = self._frontier_count[i]
+            lower_bound_only = False
+            quantile = self.Z95
+            if frontier:
+                k = self._probe_n[i]
+                if k > 1:
+                    mean = self._probe_sum[i] / k
+                    s2 = max(0.0, (self._probe_sq[i] - k * mean ** 2) / (k - 1))
+                    size += frontier * mean
+                    var += frontier * frontier * s2 / k
+                    quantile = self._t95(k - 1)
+                elif global_n:
+                    # 下探不足两次的文件夹借用全局均值和方差，按单次抽取计
+                    size += frontier * (self._probe_sum[i] if k else global_mean)
+                    var += frontier * frontier * global_s2
+                    quantile = self._t95(global_n - 1)
+                else:
+                    lower_bound_only = True
+            error = -1 if lower_bound_only else round(quantile * math.sqrt(var))
+            if frontier and error == 0 and not lower_bound_only:
+                error = 1   # 含推算部分的值即使方差为 0 也标为估算
+            scale = size / visited[i] if visited[i] else 0.0
+            size = round(size)
+            errors.append(error)
+            results.append(TYPE_FOLDER, self._paths[i], self._names[i], size, self._levels[i],
+                           self._mtimes[i], self._atimes[i],
+                           tuple(min(size, round(column[i] * scale)) for column in cold),
+                           parents[i])
+        results.estimate_errors = errors
+        results.sort_by_size()
+        return results
+
+# ---------------- 多根目录并行扫描 ----------------
+class STORAGE_DEVICE_NUMBER(ctypes.Structure):
+    _fields_ = [
+        ("DeviceType", wintypes.DWORD),
+        ("DeviceNumber", wintypes.DWORD),
+        ("PartitionNumber", wintypes.DWORD)
+    ]
+
+def physical_device(device):
+    """分区所在物理磁盘的标识；无法确定时返回分区本身，即单独作为一块磁盘"""
+    if os.name == 'nt':
+        IOCTL_STORAGE_GET_DEVICE_NUMBER = 0x2D1080
+        OPEN_EXISTING = 3
+        FILE_SHARE_READ_WRITE = 0x3
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        handle = kernel32.CreateFileW(f"\\\\.\\{device[:2]}", 0, FILE_SHARE_READ_WRITE, None,
+                                      OPEN_EXISTING, 0, None)
+        if handle is None or handle == wintypes.HANDLE(-1).value:
+            return device
+        number = STORAGE_DEVICE_NUMBER()
+        returned = wintypes.DWORD()
+        try:
+            ok = kernel32.DeviceIoControl(wintypes.HANDLE(handle), IOCTL_STORAGE_GET_DEVICE_NUMBER, None, 0,
+                                          ctypes.byref(number), ctypes.sizeof(number),
+                                          ctypes.byref(returned), None)
+        finally:
+            kernel32.CloseHandle(wintypes.HANDLE(handle))
+        return f"PhysicalDrive{number.DeviceNumber}" if ok else device
+    
+    # Linux：分区的上一级是整块磁盘，device-mapper/RAID 设备取其下所有成员磁盘
+    if not device.startswith('/dev/'):
+        return device
+    name = os.path.basename(os.path.realpath(device))
+    block = os.path.join('/sys/class/block', name)
+    if not os.path.exists(block):
+        return device
+    try:
+        members = os.listdir(os.path.join(block, 'slaves'))
+    except OSError:
+        members = []
+    if members:
+        return '+'.join(sorted({physical_device('/dev/' + member) for member in members}))
+    if os.path.exists(os.path.join(block, 'partition')):
+        return os.path.basename(os.path.dirname(os.path.realpath(block)))
+    return name
+
+def group_roots_by_device(roots):
+    """按所在物理磁盘把根目录分组，返回 [(磁盘标识, [根目录...])]"""
+    normcase = os.path.normcase
+    partitions = sorted(((normcase(part.mountpoint), part.device) for part in psutil.disk_partitions(all=True)),
+                        key=lambda item: len(item[0]), reverse=True)
+    groups = {}
+    for root in roots:
+        key = normcase(os.path.abspath(root))
+        device = root       # 找不到所在分区时单独一组
+        for mountpoint, part_device in partitions:
+            if key == mountpoint or key.startswith(mountpoint.rstrip(os.sep) + os.sep):
+                device = physical_device(part_device)
+                break
+        groups.setdefault(device, []).append(root)
+    return list(groups.items())
+
+class MultiRootScanner(QThread):
+    """同时扫描多个根目录：每块物理磁盘一个线程，同一磁盘上的根目录依次扫描
+
+    不同磁盘之间没有 I/O 争用，总耗时约等于最慢的那块磁盘。各根目录由 FolderSizeScanner 扫描
+    （跳过其他根目录，避免挂载点重复统计），完成后合并为一个带 root_ids 列的 ScanResultStore。
+    信号和 pause/cancel 等方法与 FolderSizeScanner 一致。
+    """
+    progress = Signal(str, int, int)
+    finished = Signal(object)
+    error = Signal(str)
+    stopped = Signal()
+    slow_directory = Signal(str, float, bool)
+    throttle_status = Signal(str)
+    diagnostics = Signal(object)
+    
+    PROGRESS_INTERVAL = 0.1
+    
+    def __init__(self, roots, scan_files=False, scan_folders=True, ext_categories=None,
+                 priority='normal', dir_timeout=10.0, lister=None):
+        super().__init__()
+        self.roots = list(roots)
+        self.scan_files = scan_files
+        self.scan_folders = scan_folders
+        self.priority = priority
+        self.dir_timeout = dir_timeout
+        self.lister = lister
+        self.breakdown = TypeBreakdown(ext_categories)
+        self.cleanup = CleanupCandidates()
+        self.search_index = None
+        self.slow_dirs = []
+        self.groups = []                    # [(磁盘标识, [根目录...])]
+        self.errors = []                    # (根目录, 错误信息)
+        self.durations = {}                 # 根目录 -> 扫描耗时（秒）
+        self.stats = ScanStats()            # 各根目录的扫描共用，阶段耗时为各线程累计，总耗时为实际耗时
+        self.profile = False                # 各磁盘的扫描线程分别做 cProfile 分析
+        self.trace_memory = False
+        self._results = {}                  # 根目录 -> ScanResultStore
+        self._scanners = []
+        self._progress = {}                 # 根目录 -> (已扫描项目数, 百分比)
+        self._last_progress = 0.0
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._paused = False
+    
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            for scanner in self._scanners:
+                scanner.cancel()
+    
+    def pause(self):
+        with self._lock:
+            self._paused = True
+            for scanner in self._scanners:
+                scanner.pause()
+    
+    def resume_scan(self):
+        with self._lock:
+            self._paused = False
+            for scanner in self._scanners:
+                scanner.resume_scan()
+    
+    def is_paused(self):
+        return self._paused
+    
+    def run(self):
+        started = time.perf_counter()
+        run_instrumented(self.stats, self._scan, trace_memory=self.trace_memory)
+        self.stats.phases['total'] = time.perf_counter() - started
+        self.diagnostics.emit(self.stats)
+    
+    def _scan(self):
+        try:
+            self.groups = self._group_roots()
+            threads = [threading.Thread(target=self._scan_group, args=(roots,), daemon=True,
+                                        name=f'scan-{device}')
+                       for device, roots in self.groups]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if self._cancelled:
+                return
+            
+            roots = [root for root in self.roots if root in self._results]
+            if not roots:
+                self.error.emit("\n".join(f"{root}: {message}" for root, message in self.errors))
+                return
+            stores = [self._results.pop(root) for root in roots]
+            self._compare(stores, roots)
+            phase_start = time.perf_counter()
+            results = ScanResultStore.merge(stores, roots)
+            self.stats.add_time('sort', time.perf_counter() - phase_start)
+            phase_start = time.perf_counter()
+            self.search_index = SearchIndex(results)
+            results.prepare_sort_orders()
+            results.prepare_extensions()
+            self.stats.add_time('index', time.perf_counter() - phase_start)
+            if not self._cancelled:
+                self.finished.emit(results)
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            if self._cancelled:
+                self.stopped.emit()
+    
+    def _group_roots(self):
+        return group_roots_by_device(self.roots)
+    
+    def _compare(self, stores, roots):
+        """各根目录扫描完成、合并之前调用（供 FolderCompareScanner 比较）"""
+    
+    def _scan_group(self, roots):
+        """在一个线程中依次扫描同一块磁盘上的根目录"""
+        for root in roots:
+            scanner = None
+            try:
+                scanner = FolderSizeScanner(root, self.scan_files, self.scan_folders, self.breakdown.ext_categories,
+                                            priority=self.priority, dir_timeout=self.dir_timeout,
+                                            lister=self.lister,
+                                            exclude=[other for other in self.roots if other != root])
+                scanner.prepare_results = False
+                scanner.stats = self.stats
+                scanner.profile = self.profile
+                scanner.progress.connect(
+                    lambda path, count, percent, root=root: self._on_progress(root, path, count, percent),
+                    Qt.DirectConnection)
+                scanner.finished.connect(lambda results, root=root: self._results.__setitem__(root, results),
+                                         Qt.DirectConnection)
+                scanner.error.connect(lambda message, root=root: self.errors.append((root, message)),
+                                      Qt.DirectConnection)
+                scanner.slow_directory.connect(self.slow_directory.emit, Qt.DirectConnection)
+                scanner.throttle_status.connect(self.throttle_status.emit, Qt.DirectConnection)
+                with self._lock:
+                    if self._cancelled:
+                        return
+                    if self._paused:
+                        scanner.pause()
+                    self._scanners.append(scanner)
+                started = time.monotonic()
+                scanner.run()
+                with self._lock:
+                    self._scanners.remove(scanner)
+                    self.durations[root] = time.monotonic() - started
+                    self._progress[root] = (self._progress.get(root, (0, 0))[0], 100)
+                    self.slow_dirs.extend(scanner.slow_dirs)
+                    for ext, (count, size) in scanner.breakdown.extensions.items():
+                        stat = self.breakdown.extensions.setdefault(ext, [0, 0])
+                        stat[0] += count
+                        stat[1] += size
+                    self.cleanup.merge(scanner.cleanup)
+            except Exception as e:
+                # 构造扫描线程、合并统计出错时同样记入错误，线程不能带着异常退出
+                with self._lock:
+                    if scanner in self._scanners:
+                        self._scanners.remove(scanner)
+                self.errors.append((root, str(e)))
+    
+    def _on_progress(self, root, path, count, percent):
+        """汇总各根目录的进度：项目数相加，百分比取平均（有未知的即为未知）"""
+        with self._lock:
+            self._progress[root] = (count, percent)
+            now = time.monotonic()
+            if now - self._last_progress < self.PROGRESS_INTERVAL:
+                return
+            self._last_progress = now
+            states = [self._progress.get(other, (0, 0)) for other in self.roots]
+        total = sum(state[0] for state in states)
+        percents = [state[1] for state in states]
+        overall = -1 if min(percents) < 0 else sum(percents) // len(percents)
+        self.progress.emit(path, total, overall)
+
+def compare_roots(stores, roots, limit=10000):
+    """按相对路径对齐多个根目录的扫描结果，找出大小不同和只在部分根目录中存在的项目
+
+    每个根目录的相对路径建一个 路径 -> 行号 的字典，共有和缺失的路径用集合运算得到，
+    共有路径的大小按列对齐后比较，不逐项进入 Python 循环。某个根目录中缺失的文件夹只报告最上层的一项
+    （其下的项目同样缺失，不再逐个列出）。类型取第一个有该项的根目录。
+
+    返回 dict：roots、totals（各根目录总大小）、same（相同项数）、differs（大小不同的项数）、
+    count（不同和缺失的总项数）、missing（各根目录缺失的最上层项数）、
+    missing_bytes（各根目录缺失的字节数，按其他根目录中的最大值）、
+    entries（差值最大的 limit 项 (状态, 类型, 相对路径, 各根目录大小（缺失为 None）, 差值)，按差值降序；
+    状态为 'differs' 或 'missing'）。
+    """
+    sep = os.sep
+    count = len(stores)
+    rows = []
+    for store, root in zip(stores, roots):
+        prefix = root if root.endswith(sep) else root + sep
+        relative = map(operator.itemgetter(slice(len(prefix), None)), store.paths)
+        if os.name == 'nt':
+            relative = map(os.path.normcase, relative)
+        rows.append(dict(zip(relative, range(len(store)))))
+    # 共有路径保持第一个根目录的扫描顺序（深度优先），按列取大小时访问是连续的
+    common = list(rows[0])
+    for row in rows[1:]:
+        common = list(compress(common, map(row.__contains__, common)))
+    everywhere = set(rows[0]).union(*rows[1:])
+    sizes = [store.sizes for store in stores]
+    types = [store.types for store in stores]
+    totals = [column[row['']] if '' in row else sum(map(column.__getitem__, store.top_rows()))
+              for store, row, column in zip(stores, rows, sizes)]
+    
+    # 共有路径：每个根目录取出一整列大小再逐列比较，循环都在 map 中完成
+    aligned = [list(map(column.__getitem__, map(row.__getitem__, common))) for row, column in zip(rows, sizes)]
+    spreads = list(map(operator.sub, map(max, *aligned), map(min, *aligned)))
+    differs = len(spreads) - spreads.count(0)
+    same = len(spreads) - differs
+    
+    heap = []   # (差值, 序号, 条目) 的最小堆，保留差值最大的 limit 项
+    seq = 0
+    for index in heapq.nlargest(limit, compress(range(len(spreads)), spreads), key=spreads.__getitem__):
+        key = common[index]
+        spread = spreads[index]
+        values = tuple(column[index] for column in aligned)
+        heap.append((spread, seq, ('differs', types[0][rows[0][key]], key, values, spread)))
+        seq += 1
+    heapq.heapify(heap)
+    
+    missing_count = 0
+    missing = [0] * count
+    missing_bytes = [0] * count
+    for key in everywhere.difference(common):
+        values = []
+        item_type = None
+        for row, column, type_column in zip(rows, sizes, types):
+            index = row.get(key)
+            if index is None:
+                values.append(None)
+            else:
+                values.append(column[index])
+                item_type = type_column[index]
+        # 父文件夹在同一根目录中也缺失时不单独报告
+        parent = key.rpartition(sep)[0] if sep in key else ''
+        top = [i for i, value in enumerate(values)
+               if value is None and (not key or parent not in everywhere or parent in rows[i])]
+        if not top:
+            continue
+        missing_count += 1
+        high = max(value for value in values if value is not None)
+        for i in top:
+            missing[i] += 1
+            missing_bytes[i] += high
+        if len(heap) < limit or high > heap[0][0]:
+            entry = (high, seq, ('missing', item_type, key, tuple(values), high))
+            seq += 1
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heapreplace(heap, entry)
+    
+    entries = [item[2] for item in heap]
+    entries.sort(key=lambda e: e[4], reverse=True)
+    return {'roots': list(roots), 'totals': totals, 'same': same, 'differs': differs,
+            'count': differs + missing_count, 'missing': missing, 'missing_bytes': missing_bytes, 'entries': entries}
+
+class FolderCompareScanner(MultiRootScanner):
+    """文件夹比较：同时扫描两个或更多文件夹（每个文件夹一个线程），再按相对路径对齐比较
+
+    用于比较主副本与镜像、昨天和今天的备份等。扫描结果仍合并显示在结果表格中，
+    比较结果（compare_roots 的返回值）保存在 comparison 属性中，在 finished 之前得到。
+    """
+    def __init__(self, roots, scan_files=False, scan_folders=True, ext_categories=None,
+                 priority='normal', dir_timeout=10.0, lister=None, limit=10000):
+        super().__init__(roots, scan_files, scan_folders, ext_categories, priority, dir_timeout, lister)
+        self.limit = limit
+        self.comparison = None
+    
+    def _group_roots(self):
+        # 各副本通常在不同的磁盘或主机上，每个文件夹单独一个线程
+        return [(root, [root]) for root in self.roots]
+    
+    def _compare(self, stores, roots):
+        if len(stores) < 2:
+            return
+        phase_start = time.perf_counter()
+        self.comparison = compare_roots(stores, roots, self.limit)
+        self.stats.add_time('compare', time.perf_counter() - phase_start)
+
+class _DisplaySizeColumn:
+    """按需格式化的大小显示列（见 ScanResultStore.display_size），只在显示和导出时生成文本"""
+    __slots__ = ('_store',)
+    
+    def __init__(self, store):
+        self._store = store
+    
+    def __len__(self):
+        return len(self._store)
+    
+    def __getitem__(self, row):
+        return self._store.display_size(row)
+    
+    def __iter__(self):
+        return map(self._store.display_size, range(len(self._store)))
+
+class ScanResultStore:
+    """列式存储的扫描结果
+
+    每一列是一个数组，第 i 行的数据分布在各列的第 i 个元素中。
+    相比每项一个字典，内存占用更小，排序等操作也可以整列进行。
+    """
+    # 可排序的列（cold0/cold1/... 对应 AGE_BUCKET_DAYS 中的各阈值）
+    SORT_KEYS = ('name', 'type', 'path', 'size', 'root') + tuple(f'cold{i}' for i in range(len(AGE_BUCKET_DAYS)))
+
+    def __init__(self):
+        self.types = bytearray()        # TYPE_FILE / TYPE_FOLDER
+        self.paths = []
+        self.names = []
+        self.sizes = array('q')
+        self.display_sizes = _DisplaySizeColumn(self)  # 大小的显示文本，按需格式化
+        self.levels = array('i')
+        self.mtimes = array('d')        # 修改时间
+        self.atimes = array('d')        # 访问时间
+        # 超过各年龄阈值未修改/访问的字节数，每个阈值一列
+        self.cold_sizes = tuple(array('q') for _ in AGE_BUCKET_DAYS)
+        self.parents = array('i')       # 父文件夹行号（-1 表示没有记录父文件夹）
+        # 估算扫描结果的 95% 置信区间半宽（字节，0 为精确值，-1 为只知道下限），精确扫描为 None
+        self.estimate_errors = None
+        # 多个根目录合并扫描时各行所属根目录（roots 的下标），单个根目录时为 None
+        self.roots = []
+        self.root_ids = None
+        self.scan_time = 0.0            # 扫描开始时间，冷数据年龄的参照点
+        self.total_size = 0
+        self.max_size = 0
+        self._sort_orders = {}          # 列名 -> 升序排列（行号数组）
+        self._extensions = None
+        self._children = None
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def append(self, item_type, path, name, size, level, mtime=0.0, atime=0.0,
+               cold=None, parent=-1):
+        self.types.append(item_type)
+        self.paths.append(path)
+        self.names.append(name)
+        self.sizes.append(size)
+        self.levels.append(level)
+        self.mtimes.append(mtime)
+        self.atimes.append(atime)
+        if cold is None:
+            for column in self.cold_sizes:
+                column.append(0)
+        else:
+            for column, value in zip(self.cold_sizes, cold):
+                column.append(value)
+        self.parents.append(parent)
+        self.total_size += size
+        if size > self.max_size:
+            self.max_size = size
+
+    def columns_since(self, start):
+        """第 start 行之后的各列数据（用于增量保存扫描断点）"""
+        return {
+            'types': self.types[start:], 'paths': self.paths[start:], 'names': self.names[start:],
+            'sizes': self.sizes[start:],
+            'levels': self.levels[start:], 'mtimes': self.mtimes[start:], 'atimes': self.atimes[start:],
+            'cold_sizes': tuple(column[start:] for column in self.cold_sizes),
+            'parents': self.parents[start:],
+        }
+
+    def extend_columns(self, columns):
+        """追加 columns_since 返回的各列数据（旧版本断点中的 display_sizes 列被忽略）"""
+        for key in ('types', 'paths', 'names', 'sizes', 'levels',
+                    'mtimes', 'atimes', 'parents'):
+            getattr(self, key).extend(columns[key])
+        for column, values in zip(self.cold_sizes, columns['cold_sizes']):
+            column.extend(values)
+        sizes = columns['sizes']
+        if sizes:
+            self.total_size += sum(sizes)
+            self.max_size = max(self.max_size, max(sizes))
+
+    @classmethod
+    def merge(cls, stores, roots):
+        """合并多个根目录的扫描结果（父行号加上偏移），root_ids 列记录每行所属的根目录"""
+        merged = cls()
+        merged.roots = list(roots)
+        merged.root_ids = array('H')
+        merged.scan_time = min((store.scan_time for store in stores), default=0.0)
+        for root_id, store in enumerate(stores):
+            base = len(merged)
+            columns = store.columns_since(0)
+            columns['parents'] = array('i', (p + base if p >= 0 else -1 for p in store.parents))
+            merged.extend_columns(columns)
+            merged.root_ids.extend(repeat(root_id, len(store)))
+        merged.sort_by_size()
+        return merged
+
+    def root_name(self, row):
+        """行所属的根目录（单个根目录的结果返回空字符串）"""
+        return self.roots[self.root_ids[row]] if self.root_ids is not None else ''
+
+    def resolve_parents(self, dir_rows):
+        """把扫描时记录的父目录编号转换为父文件夹行号"""
+        self.parents = array('i', (dir_rows[p] if p >= 0 else -1 for p in self.parents))
+        self._children = None
+
+    def children(self):
+        """父行号 -> 子行号列表（-1 为顶层），子项按大小降序；首次调用时构建"""
+        if self._children is None:
+            children = {}
+            for row, parent in enumerate(self.parents):
+                rows = children.get(parent)
+                if rows is None:
+                    children[parent] = [row]
+                else:
+                    rows.append(row)
+            self._children = children
+        return self._children
+
+    def top_rows(self):
+        """没有父文件夹记录的顶层行（通常只有扫描根文件夹）"""
+        return self.children().get(-1, [])
+
+    def type_name(self, row):
+        return "文件夹" if self.types[row] == TYPE_FOLDER else "文件"
+
+    def is_estimated(self, row):
+        return self.estimate_errors is not None and self.estimate_errors[row] != 0
+
+    def display_size(self, row):
+        """第 row 行大小的显示文本；估算值带 ≈（或只知下限时 ≥）和置信区间半宽的百分比"""
+        size = self.sizes[row]
+        if self.estimate_errors is None:
+            return format_size(size)
+        error = self.estimate_errors[row]
+        if error == 0:
+            return format_size(size)
+        if error < 0:
+            return f"≥{format_size(size)}"
+        if size <= 0:
+            return f"≈{format_size(size)}"
+        percent = error * 100 / size
+        return f"≈{format_size(size)} ±{percent:.1f}%" if percent < 1 else \
+            f"≈{format_size(size)} ±{min(999, round(percent))}%"
+
+    def sort_by_size(self):
+        """按大小降序重排所有列"""
+        sizes = self.sizes
+        self._reorder(sorted(range(len(sizes)), key=sizes.__getitem__, reverse=True))
+
+    def remove_rows(self, rows):
+        """删除若干行及其下所有子项，并从各祖先文件夹的大小和冷数据中减去，删除文件后无需重新扫描"""
+        parents = self.parents
+        removed = bytearray(len(self))
+        children = self.children()
+        for row in rows:
+            if removed[row]:
+                continue
+            size = self.sizes[row]
+            cold = [column[row] for column in self.cold_sizes]
+            parent = parents[row]
+            while parent >= 0:
+                self.sizes[parent] -= size
+                for column, value in zip(self.cold_sizes, cold):
+                    column[parent] -= value
+                parent = parents[parent]
+            stack = [row]
+            while stack:
+                current = stack.pop()
+                removed[current] = 1
+                stack.extend(children.get(current, ()))
+        self._reorder([row for row, flag in enumerate(removed) if not flag])
+        self.total_size = sum(self.sizes)
+        self.max_size = max(self.sizes, default=0)
+        self.sort_by_size()
+
+    def _reorder(self, order):
+        """按行号列表 order 重排所有列；不在 order 中的行被丢弃（其子项也必须一并丢弃）"""
+        sizes = self.sizes
+        self.types = bytearray(map(self.types.__getitem__, order))
+        self.paths = list(map(self.paths.__getitem__, order))
+        self.names = list(map(self.names.__getitem__, order))
+        self.sizes = array('q', map(sizes.__getitem__, order))
+        self.levels = array('i', map(self.levels.__getitem__, order))
+        self.mtimes = array('d', map(self.mtimes.__getitem__, order))
+        self.atimes = array('d', map(self.atimes.__getitem__, order))
+        self.cold_sizes = tuple(array('q', map(column.__getitem__, order))
+                                for column in self.cold_sizes)
+        if self.estimate_errors is not None:
+            self.estimate_errors = array('q', map(self.estimate_errors.__getitem__, order))
+        if self.root_ids is not None:
+            self.root_ids = array('H', map(self.root_ids.__getitem__, order))
+        # 父行号随排序一起重映射
+        new_rows = array('i', [-1]) * len(self.parents)
+        for new_row, old_row in enumerate(order):
+            new_rows[old_row] = new_row
+        self.parents = array('i', (new_rows[p] if p >= 0 else -1
+                                   for p in map(self.parents.__getitem__, order)))
+        self._sort_orders.clear()
+        self._children = None
+        self._extensions = None
+
+    @property
+    def extensions(self):
+        """小写扩展名列（不含点，文件夹为空字符串），首次访问时计算"""
+        if self._extensions is None:
+            self.prepare_extensions()
+        return self._extensions
+
+    def sort_order(self, key):
+        """返回按 key 列升序的行号排列，首次计算后缓存"""
+        order = self._sort_orders.get(key)
+        if order is None:
+            n = len(self)
+            if key == 'size':
+                # 各列始终按大小降序存放，升序即为倒序（range 无需实际分配）
+                order = range(n - 1, -1, -1)
+            elif key == 'name':
+                names = [name.lower() for name in self.names]
+                order = array('i', sorted(range(n), key=names.__getitem__))
+            elif key == 'path':
+                paths = list(map(os.path.normcase, self.paths))
+                order = array('i', sorted(range(n), key=paths.__getitem__))
+            elif key == 'type':
+                order = array('i', sorted(range(n), key=self.types.__getitem__))
+            elif key == 'root':
+                order = range(n) if self.root_ids is None else \
+                    array('i', sorted(range(n), key=self.root_ids.__getitem__))
+            elif key.startswith('cold'):
+                column = self.cold_sizes[int(key[4:])]
+                order = array('i', sorted(range(n), key=column.__getitem__))
+            else:
+                raise KeyError(key)
+            self._sort_orders[key] = order
+        return order
+
+    def prepare_sort_orders(self):
+        """预先计算所有列的排序排列（在扫描线程中调用）"""
+        for key in self.SORT_KEYS:
+            self.sort_order(key)
+
+    def prepare_extensions(self):
+        """预先计算扩展名列，供过滤表达式使用（在扫描线程中调用）"""
+        if self._extensions is not None:
+            return
+        exts = {}
+        column = []
+        for name, item_type in zip(self.names, self.types):
+            ext = os.path.splitext(name)[1][1:].lower() if item_type == TYPE_FILE else ''
+            # 相同扩展名共享同一个字符串对象
+            column.append(exts.setdefault(ext, ext))
+        self._extensions = column
+
+class SearchIndex:
+    """扫描结果的名称/路径搜索索引
+
+    名称使用三元组倒排索引（按去重后的名称建立，重复文件名只索引一次），
+    路径使用排序数组做前缀查询。查询结果为按原顺序递增的行号列表。
+    """
+    def __init__(self, store):
+        self._unique_names = []     # 去重后的小写名称
+        self._name_rows = []        # 每个唯一名称对应的行号
+        self._trigrams = {}         # 三元组 -> 唯一名称编号数组
+
+        name_ids = {}
+        for row, name in enumerate(store.names):
+            name = name.lower()
+            name_id = name_ids.get(name)
+            if name_id is None:
+                name_id = len(self._unique_names)
+                name_ids[name] = name_id
+                self._unique_names.append(name)
+                self._name_rows.append(array('i'))
+                for gram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                    postings = self._trigrams.get(gram)
+                    if postings is None:
+                        postings = self._trigrams[gram] = array('i')
+                    postings.append(name_id)
+            self._name_rows[name_id].append(row)
+
+        # 路径排序数组，用于前缀查询（复用结果存储中的路径排序排列）
+        self._path_rows = store.sort_order('path')
+        paths = store.paths
+        self._sorted_paths = [os.path.normcase(paths[r]) for r in self._path_rows]
+
+    def __len__(self):
+        return len(self._path_rows)
+
+    def search(self, text):
+        """搜索名称包含 text 的行；包含路径分隔符时按路径前缀查询"""
+        text = text.strip()
+        if not text:
+            return list(range(len(self)))
+
+        if os.sep in text or (os.altsep and os.altsep in text):
+            return self._search_path_prefix(text)
+
+        query = text.lower()
+        if len(query) < 3:
+            # 查询太短无法使用三元组，直接扫描唯一名称
+            name_ids = [i for i, name in enumerate(self._unique_names) if query in name]
+        else:
+            grams = {query[i:i + 3] for i in range(len(query) - 2)}
+            postings = []
+            for gram in grams:
+                ids = self._trigrams.get(gram)
+                if ids is None:
+                    return []
+                postings.append(ids)
+            # 从最短的倒排表开始求交集
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates.intersection_update(ids)
+                if not candidates:
+                    return []
+            names = self._unique_names
+            name_ids = [i for i in candidates if query in names[i]]
+
+        rows = []
+        for name_id in name_ids:
+            rows.extend(self._name_rows[name_id])
+        rows.sort()
+        return rows
+
+    def find_path(self, path):
+        """完整路径对应的行号，没有时返回 -1"""
+        key = os.path.normcase(os.path.normpath(path))
+        paths = self._sorted_paths
+        i = bisect.bisect_left(paths, key)
+        return self._path_rows[i] if i < len(paths) and paths[i] == key else -1
+
+    def _search_path_prefix(self, text):
+        """在排序路径数组中二分查找前缀范围"""
+        prefix = os.path.normcase(text)
+        paths = self._sorted_paths
+        start = bisect.bisect_left(paths, prefix)
+        # 前缀范围的上界：前缀后接最大字符
+        end = bisect.bisect_left(paths, prefix + '\U0010ffff', start)
+        return sorted(self._path_rows[start:end])
+
+class FilterSyntaxError(ValueError):
+    """过滤表达式语法错误"""
+
+# 掩码取反用的字节转换表（0 <-> 1）
+_MASK_NOT = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+def mask_and(a, b):
+    """两个 0/1 字节掩码按位与（整块转换为大整数计算）"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    value = int.from_bytes(a, 'little') & int.from_bytes(b, 'little')
+    return bytearray(value.to_bytes(len(a), 'little'))
+
+def mask_not(mask):
+    return bytearray(mask.translate(_MASK_NOT))
+
+def rows_to_mask(rows, count):
+    """行号列表转换为 0/1 字节掩码"""
+    mask = bytearray(count)
+    for row in rows:
+        mask[row] = 1
+    return mask
+
+class FilterExpression:
+    """过滤表达式，编译为对结果存储整列求值的条件
+
+    语法：空格分隔的条件同时满足，条件前加 ! 表示取反，逗号分隔表示任一值。
+        size>1G size<=500M          大小（B/K/M/G/T，按1024进位）
+        type:file type:folder       类型（也可写 文件/文件夹）
+        ext:iso,vmdk                扩展名
+        mtime>180d atime>1y         修改/访问时间距今超过（h/d/w/y）
+        mtime<2024-01-01            修改时间早于指定日期
+        depth<=3                    相对扫描根目录的层级
+        path:/data/*  name:*.log    路径/名称通配符
+    """
+    _COMPARE = re.compile(r'^(size|mtime|atime|depth)(>=|<=|!=|>|<|=)(.+)$', re.IGNORECASE)
+    _MATCH = re.compile(r'^(type|ext|path|name):(.+)$', re.IGNORECASE)
+    _SIZE = re.compile(r'^(\d+(?:\.\d+)?)\s*([KMGT]?)I?B?$', re.IGNORECASE)
+    _AGE = re.compile(r'^(\d+(?:\.\d+)?)([hdwy])$', re.IGNORECASE)
+    _SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+    _AGE_UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400, 'y': 365 * 86400}
+    _TYPES = {'file': TYPE_FILE, '文件': TYPE_FILE, 'folder': TYPE_FOLDER,
+              'dir': TYPE_FOLDER, '文件夹': TYPE_FOLDER}
+    # 列值 x 与阈值 t 比较时使用 t 的方法，使 map() 全程在 C 层执行
+    _REVERSED_OPS = {'>': '__lt__', '>=': '__le__', '<': '__gt__',
+                     '<=': '__ge__', '=': '__eq__', '!=': '__ne__'}
+    _FLIPPED = {'>': '<', '>=': '<=', '<': '>', '<=': '>=', '=': '=', '!=': '!='}
+
+    def __init__(self, text):
+        self.text = text
+        self._terms = []        # (取反, 条件函数)
+        try:
+            tokens = shlex.split(text, posix=False)
+        except ValueError as e:
+            raise FilterSyntaxError(str(e))
+        for token in tokens:
+            negate = token.startswith('!')
+            if negate:
+                token = token[1:]
+            self._terms.append((negate, self._compile(token)))
+
+    def __bool__(self):
+        return bool(self._terms)
+
+    def evaluate(self, store):
+        """对结果存储求值，返回 0/1 字节掩码"""
+        now = time.time()
+        mask = None
+        for negate, predicate in self._terms:
+            term = predicate(store, now)
+            if negate:
+                term = mask_not(term)
+            mask = mask_and(mask, term)
+        return mask
+
+    def _compile(self, token):
+        match = self._COMPARE.match(token)
+        if match:
+            field, op, value = match.group(1).lower(), match.group(2), match.group(3)
+            if field == 'size':
+                return self._compare('sizes', op, self._parse_size(value))
+            if field == 'depth':
+                try:
+                    return self._compare('levels', op, int(value))
+                except ValueError:
+                    raise FilterSyntaxError(f"无效的层级: {value}")
+            return self._compile_time(field + 's', op, value)
+
+        match = self._MATCH.match(token)
+        if match:
+            field, value = match.group(1).lower(), self._unquote(match.group(2))
+            if field == 'type':
+                item_type = self._TYPES.get(value.lower())
+                if item_type is None:
+                    raise FilterSyntaxError(f"无效的类型: {value}")
+                return self._compare('types', '=', item_type)
+            if field == 'ext':
+                exts = {e.strip().lstrip('.').lower() for e in value.split(',') if e.strip()}
+                return lambda store, now: bytearray(map(exts.__contains__, store.extensions))
+            return self._compile_glob(field + 's', value)
+
+        raise FilterSyntaxError(f"无法识别的条件: {token}")
+
+    def _compare(self, column, op, threshold):
+        method = getattr(threshold, self._REVERSED_OPS[op])
+        return lambda store, now: bytearray(map(method, getattr(store, column)))
+
+    def _compile_time(self, column, op, value):
+        match = self._AGE.match(value)
+        if match:
+            # 时间跨度比较的是“距今多久”，方向与时间戳相反
+            seconds = float(match.group(1)) * self._AGE_UNITS[match.group(2).lower()]
+            method_name = self._REVERSED_OPS[self._FLIPPED[op]]
+            def predicate(store, now):
+                method = getattr(now - seconds, method_name)
+                return bytearray(map(method, getattr(store, column)))
+            return predicate
+        try:
+            threshold = time.mktime(time.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise FilterSyntaxError(f"无效的时间: {value}（例如 180d 或 2024-01-01）")
+        return self._compare(column, op, threshold)
+
+    def _compile_glob(self, column, pattern):
+        if os.name == 'nt':
+            pattern = pattern.replace('/', os.sep)
+        elif pattern.endswith('*') and not any(c in pattern[:-1] for c in '*?['):
+            # 纯前缀模式直接用 startswith，避免逐行正则匹配
+            prefix = pattern[:-1]
+            return lambda store, now: bytearray(map(str.startswith, getattr(store, column), repeat(prefix)))
+        flags = re.IGNORECASE if os.name == 'nt' else 0
+        match = re.compile(fnmatch.translate(pattern), flags).match
+        return lambda store, now: bytearray(map(bool, map(match, getattr(store, column))))
+
+    def _parse_size(self, value):
+        match = self._SIZE.match(value)
+        if not match:
+            raise FilterSyntaxError(f"无效的大小: {value}（例如 500M 或 1G）")
+        return int(float(match.group(1)) * self._SIZE_UNITS[match.group(2).upper()])
+
+    @staticmethod
+    def _unquote(value):
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+            return value[1:-1]
+        return value
+
+# ---------------- 扫描快照 ----------------
+# 快照为二进制文件：文件头之后依次是各列的定长数组段和字符串表，元数据（JSON）在文件末尾。
+# 行按大小降序存放（与 ScanResultStore 相同），另存一段按规范化路径排序的行号排列。
+# 打开时用 mmap 映射，各列直接引用映射内存，只有实际访问到的行才会被读入。
+SNAPSHOT_MAGIC = b'BFFSNAP2'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SUFFIX = '.snap'
+_SNAPSHOT_HEADER = struct.Struct('<8sIQQ')     # 魔数, 版本, 元数据偏移, 元数据长度
+
+# 定长数组段：(段名, 数组类型码)
+SNAPSHOT_COLUMNS = (('types', 'B'), ('sizes', 'q'), ('levels', 'i'), ('mtimes', 'd'),
+                    ('atimes', 'd'), ('parents', 'i'), ('path_order', 'i'), ('top_rows', 'i')) + \
+                   tuple((f'cold{i}', 'q') for i in range(len(AGE_BUCKET_DAYS)))
+
+def snapshot_dir():
+    """快照保存目录（应用数据目录下的 snapshots）"""
+    return app_data_dir('snapshots')
+
+def snapshot_file(name, directory=None):
+    """快照名称对应的文件路径"""
+    safe_name = re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') or 'snapshot'
+    return os.path.join(directory or snapshot_dir(), safe_name + SNAPSHOT_SUFFIX)
+
+def _string_table(strings):
+    """把字符串序列编码为 (偏移数组, UTF-8 数据)，第 i 项为 data[offsets[i]:offsets[i + 1]]"""
+    encoded = [s.encode('utf-8', 'surrogateescape') for s in strings]
+    offsets = array('q', [0])
+    offsets.extend(accumulate(map(len, encoded)))
+    return offsets, b''.join(encoded)
+
+def save_snapshot(store, root, name, directory=None):
+    """把扫描结果写入快照文件，返回文件路径"""
+    file_path = snapshot_file(name, directory)
+    top_rows = array('i', store.top_rows())
+    paths = store.paths
+    columns = {
+        'types': store.types, 'sizes': store.sizes, 'levels': store.levels,
+        'mtimes': store.mtimes, 'atimes': store.atimes, 'parents': store.parents,
+        'path_order': store.sort_order('path'), 'top_rows': top_rows,
+    }
+    for i, column in enumerate(store.cold_sizes):
+        columns[f'cold{i}'] = column
+    # 名称逐行保存；完整路径只保存顶层项目的，其余路径由父文件夹路径和名称拼出
+    columns['name_offsets'], columns['names'] = _string_table(store.names)
+    columns['top_path_offsets'], columns['top_paths'] = _string_table(paths[row] for row in top_rows)
+    
+    sections = {}
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(bytes(_SNAPSHOT_HEADER.size))
+        for key, column in columns.items():
+            f.write(bytes(-f.tell() % 8))     # 各段按 8 字节对齐
+            offset = f.tell()
+            f.write(column)
+            sections[key] = (offset, f.tell() - offset)
+        meta = json.dumps({
+            'name': name, 'root': root, 'scan_time': store.scan_time,
+            'count': len(store), 'total_size': store.total_size, 'max_size': store.max_size,
+            'root_size': sum(store.sizes[row] for row in top_rows),
+            'byteorder': sys.byteorder, 'sections': sections,
+        }, ensure_ascii=False).encode('utf-8')
+        meta_offset = f.tell()
+        f.write(meta)
+        f.seek(0)
+        f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, meta_offset, len(meta)))
+    os.replace(tmp_path, file_path)
+    return file_path
+
+def _read_snapshot_meta(f):
+    """读取已打开快照文件的元数据，格式不对时抛出 ValueError"""
+    header = f.read(_SNAPSHOT_HEADER.size)
+    if len(header) != _SNAPSHOT_HEADER.size:
+        raise ValueError("不是快照文件")
+    magic, version, meta_offset, meta_length = _SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("不是快照文件")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本: {version}")
+    f.seek(meta_offset)
+    meta = json.loads(f.read(meta_length).decode('utf-8'))
+    if meta['byteorder'] != sys.byteorder:
+        raise ValueError("快照来自字节序不同的系统")
+    return meta
+
+def read_snapshot_header(file_path):
+    """读取快照元数据，返回 dict；不是快照文件时返回 None"""
+    try:
+        with open(file_path, 'rb') as f:
+            meta = _read_snapshot_meta(f)
+    except (OSError, ValueError, KeyError):
+        return None
+    meta['file'] = file_path
+    return meta
+
+def list_snapshots(directory=None):
+    """列出已保存的快照（按扫描时间从新到旧）"""
+    directory = directory or snapshot_dir()
+    snapshots = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(SNAPSHOT_SUFFIX):
+            header = read_snapshot_header(entry.path)
+            if header is not None:
+                snapshots.append(header)
+    snapshots.sort(key=lambda h: h['scan_time'], reverse=True)
+    return snapshots
+
+class _StringColumn:
+    """映射在快照文件中的字符串表，按行解码"""
+    __slots__ = ('_offsets', '_data')
+    
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+    
+    def __len__(self):
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, row):
+        offsets = self._offsets
+        return str(self._data[offsets[row]:offsets[row + 1]], 'utf-8', 'surrogateescape')
+    
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+class _PathColumn:
+    """由父文件夹路径和名称拼出完整路径，已拼出的文件夹路径会缓存（有上限）"""
+    __slots__ = ('_names', '_parents', '_top_rows', '_top_paths', '_folder_paths')
+    CACHE_LIMIT = 65536         # 缓存的文件夹路径数上限，用满后清空
+    
+    def __init__(self, names, parents, top_rows, top_paths):
+        self._names = names
+        self._parents = parents
+        self._top_rows = top_rows
+        self._top_paths = top_paths
+        self._folder_paths = {}
+    
+    def __len__(self):
+        return len(self._parents)
+    
+    @staticmethod
+    def join(folder_path, name):
+        """文件夹路径加上名称（文件夹路径可能以分隔符结尾，如 C:\\ 或 /）"""
+        return folder_path + name if folder_path.endswith(os.sep) else folder_path + os.sep + name
+    
+    def top_path(self, row):
+        """顶层项目的完整路径"""
+        return self._top_paths[bisect.bisect_left(self._top_rows, row)]
+    
+    def ancestors(self, row):
+        """从顶层项目到 row 的各级 [(行号, 路径)]，不使用也不填充缓存"""
+        parents, names = self._parents, self._names
+        chain = []
+        while parents[row] >= 0:
+            chain.append(row)
+            row = parents[row]
+        path = self.top_path(row)
+        result = [(row, path)]
+        for row in reversed(chain):
+            path = self.join(path, names[row])
+            result.append((row, path))
+        return result
+    
+    def __getitem__(self, row):
+        parents, folder_paths = self._parents, self._folder_paths
+        # 向上找到已缓存的祖先或顶层项目，再逐级向下拼接
+        chain = []
+        path = None
+        while True:
+            parent = parents[row]
+            if parent < 0:
+                path = self.top_path(row)
+                break
+            chain.append(row)
+            path = folder_paths.get(parent)
+            if path is not None:
+                break
+            row = parent
+        if len(folder_paths) + len(chain) > self.CACHE_LIMIT:
+            folder_paths.clear()    # 表格只访问可见行，通常用不满；整列遍历时避免缓存所有文件夹
+        names = self._names
+        for row in reversed(chain):
+            parent = parents[row]
+            if parent not in folder_paths:
+                folder_paths[parent] = path
+            path = self.join(path, names[row])
+        return path
+    
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+class MappedScanResultStore(ScanResultStore):
+    """通过 mmap 打开的只读快照
+
+    各数值列是映射内存上的 memoryview，名称、路径和大小显示按行解码，
+    打开耗时与快照大小无关，表格只会读入实际显示的行。
+    """
+    def __init__(self, file_path):
+        super().__init__()
+        with open(file_path, 'rb') as f:
+            meta = _read_snapshot_meta(f)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_path = file_path
+        self.name = meta['name']
+        self.root = meta['root']
+        self.scan_time = meta['scan_time']
+        self.total_size = meta['total_size']
+        self.max_size = meta['max_size']
+        
+        buffer = memoryview(self._mmap)
+        sections = meta['sections']
+        def section(key, typecode='B'):
+            offset, length = sections[key]
+            return buffer[offset:offset + length].cast(typecode)
+        
+        columns = {key: section(key, typecode) for key, typecode in SNAPSHOT_COLUMNS}
+        self.types = columns['types']
+        self.sizes = columns['sizes']
+        self.levels = columns['levels']
+        self.mtimes = columns['mtimes']
+        self.atimes = columns['atimes']
+        self.parents = columns['parents']
+        self.cold_sizes = tuple(columns[f'cold{i}'] for i in range(len(AGE_BUCKET_DAYS)))
+        self._path_order = columns['path_order']
+        self._top_rows = columns['top_rows']
+        self.names = _StringColumn(section('name_offsets', 'q'), section('names'))
+        top_paths = _StringColumn(section('top_path_offsets', 'q'), section('top_paths'))
+        self.paths = _PathColumn(self.names, self.parents, self._top_rows, top_paths)
+    
+    def top_rows(self):
+        return self._top_rows
+    
+    def sort_order(self, key):
+        if key == 'path' and key not in self._sort_orders:
+            # 路径排列已保存在快照中，直接整段复制
+            order = array('i')
+            order.frombytes(self._path_order.cast('B'))
+            self._sort_orders[key] = order
+        return super().sort_order(key)
+    
+    def iter_path_order(self):
+        """按规范化路径顺序逐条产生 (规范化路径, 类型, 大小, 路径)，不复制整列
+
+        路径由当前祖先链上的文件夹路径和名称拼出，占用的内存只与目录深度有关。
+        路径顺序不完全是深度优先（如 "a b" 排在 "a" 和 "a/b" 之间），祖先链对不上时向上重建。
+        """
+        normcase = os.path.normcase
+        types, sizes, parents, names, paths = self.types, self.sizes, self.parents, self.names, self.paths
+        join = paths.join
+        stack = []      # 当前祖先链 [(行号, 路径)]，自顶层向下
+        for row in self._path_order:
+            parent = parents[row]
+            if parent < 0:
+                path = paths.top_path(row)
+                stack.clear()
+            else:
+                while stack and stack[-1][0] != parent:
+                    stack.pop()
+                if not stack:
+                    stack = paths.ancestors(parent)
+                path = join(stack[-1][1], names[row])
+            if types[row] == TYPE_FOLDER:
+                stack.append((row, path))
+            yield normcase(path), types[row], sizes[row], path
+
+def iter_snapshot_diff(old_file, new_file):
+    """归并两个快照，逐条产生有变化的项目 (变化, 类型, 路径, 原大小, 新大小)
+
+    变化为 'added'、'removed'、'grown' 或 'shrunk'。两个快照都按路径排列顺序读取，
+    各只遍历一遍，只保留当前祖先链上的文件夹路径，不会把快照读入内存。
+    """
+    old_iter = MappedScanResultStore(old_file).iter_path_order()
+    new_iter = MappedScanResultStore(new_file).iter_path_order()
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield 'removed', old[1], old[3], old[2], 0
+            old = next(old_iter, None)
+        elif old is None or new[0] < old[0]:
+            yield 'added', new[1], new[3], 0, new[2]
+            new = next(new_iter, None)
+        else:
+            if new[2] != old[2]:
+                yield ('grown' if new[2] > old[2] else 'shrunk'), new[1], new[3], old[2], new[2]
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+
+class SnapshotSaveWorker(QThread):
+    """在后台线程中保存快照"""
+    finished = Signal(str)      # 快照文件路径
+    error = Signal(str)
+    
+    def __init__(self, store, root, name, directory=None):
+        super().__init__()
+        self.store = store
+        self.root = root
+        self.name = name
+        self.directory = directory  # None 为默认快照目录
+    
+    def run(self):
+        try:
+            self.finished.emit(save_snapshot(self.store, self.root, self.name, self.directory))
+        except OSError as e:
+            self.error.emit(f"保存快照失败: {e}")
+
+class SnapshotDiffWorker(QThread):
+    """在后台线程中比较两个快照，只保留变化量最大的若干项"""
+    progress = Signal(int)      # 已比较的变化项数
+    finished = Signal(object)   # dict：各类变化的数量/字节数及按变化量排序的条目
+    error = Signal(str)
+    
+    PROGRESS_INTERVAL = 0.1
+    
+    def __init__(self, old_file, new_file, limit=10000):
+        super().__init__()
+        self.old_file = old_file
+        self.new_file = new_file
+        self.limit = limit
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        counts = {'added': 0, 'removed': 0, 'grown': 0, 'shrunk': 0}
+        deltas = dict.fromkeys(counts, 0)
+        heap = []   # (|变化量|, 序号, 条目) 的最小堆，保留变化最大的 limit 项
+        limit = self.limit
+        last_emit = 0.0
+        try:
+            for seq, (change, item_type, path, old_size, new_size) in enumerate(
+                    iter_snapshot_diff(self.old_file, self.new_file)):
+                delta = new_size - old_size
+                counts[change] += 1
+                deltas[change] += delta
+                entry = (abs(delta), seq, (change, item_type, path, old_size, new_size, delta))
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry[0] > heap[0][0]:
+                    heapq.heapreplace(heap, entry)
+                
+                if seq & 0x3FF == 0:
+                    if self._cancelled:
+                        return
+                    now = time.time()
+                    if now - last_emit >= self.PROGRESS_INTERVAL:
+                        last_emit = now
+                        self.progress.emit(seq)
+        except (OSError, ValueError, KeyError) as e:
+            self.error.emit(f"读取快照失败: {e}")
+            return
+        
+        entries = [item[2] for item in heap]
+        entries.sort(key=lambda e: e[5], reverse=True)
+        self.finished.emit({'counts': counts, 'deltas': deltas, 'entries': entries})
+
+# ---------------- ncdu JSON 导入导出 ----------------
+# ncdu 导出格式：[1, 2, {元数据}, [{根目录}, {文件}, [{子目录}, ...], ...]]，目录是以自身信息开头的数组
+NCDU_MAJOR_VERSION = 1
+NCDU_MINOR_VERSION = 2
+NCDU_REMAINDER_NAME = '<未单独列出的文件>'   # 只扫描文件夹时，文件夹中文件的总大小导出为这一项
+NCDU_CHUNK_SIZE = 4 * 1024 * 1024
+NCDU_MAX_ITEM = 1024 * 1024     # 单个对象的长度上限，超过时认为文件格式错误
+
+# 逐个匹配数组括号、对象和文件头中的版本号；ncdu 按 name、asize、dsize ... mtime 的顺序写出字段，
+# 名称中没有转义字符的对象直接由正则取出这几个字段，其余对象交给 json.loads
+_NCDU_TOKEN = re.compile(
+    r'[\s,]*(?:(\[)|(\])'
+    r'|\{"name":"([^"\\]*)"(?:,"asize":(\d+))?(?:,"dsize":\d+)?((?:[^{}"]|"[^"\\]*")*?)(?:,"mtime":(\d+))?\}'
+    r'|(\{(?:[^{}"]|"(?:[^"\\]|\\.)*")*\})'
+    r'|(-?\d+))')
+
+def _open_ncdu(file_path):
+    """打开 ncdu 导出文件（可以是 gzip 压缩的），返回 (原始文件, 读取用的流)"""
+    raw = open(file_path, 'rb')
+    try:
+        magic = raw.read(8)
+        raw.seek(0)
+        if magic[:2] == b'\x1f\x8b':
+            import gzip
+            return raw, gzip.GzipFile(fileobj=raw)
+        if magic[:1] == b'\xbf':
+            raise ValueError("这是 ncdu 2 的二进制导出文件，请用 ncdu -o 导出 JSON 格式")
+        return raw, raw
+    except BaseException:
+        raw.close()
+        raise
+
+def load_ncdu_json(file_path, include_files=True, ext_categories=None, progress=None):
+    """流式读取 ncdu 导出文件（ncdu -o），返回 (ScanResultStore, 根目录, TypeBreakdown)
+
+    按块读取并逐个解析数组括号和对象，不把整个 JSON 文档载入内存；行的组织方式与扫描线程相同
+    （文件夹在其内容之后追加，最后把父目录编号转换为行号并按大小排序），各列先收集在局部数组中，
+    最后一次性写入结果。与扫描一致，大小取 asize，文件夹的大小为其中所有文件之和（不含目录项自身的大小）；
+    被 ncdu 排除的项目不导入。ncdu 不记录访问时间，冷数据列为 0。
+    progress(已读取比例) 每读取一块调用一次。格式不对时抛出 ValueError。
+    """
+    import codecs
+    breakdown = TypeBreakdown(ext_categories)
+    extensions = breakdown.extensions
+    types = bytearray()
+    paths = []
+    names = []
+    sizes = array('q')
+    levels = array('i')
+    mtimes = array('d')
+    parents = array('i')
+    add_type, add_path, add_name = types.append, paths.append, names.append
+    add_size, add_level, add_mtime, add_parent = sizes.append, levels.append, mtimes.append, parents.append
+    dir_rows = []
+    stack = []              # [路径, 路径前缀, 名称, 层级, 目录编号, 大小, 修改时间]
+    frame = None            # 栈顶
+    root = None
+    scan_time = 0.0
+    started = finished = expect_dir = False
+    header = []
+    decoder = codecs.getincrementaldecoder('utf-8')('surrogateescape')
+    
+    raw, stream = _open_ncdu(file_path)
+    with raw:
+        total_bytes = os.fstat(raw.fileno()).st_size or 1
+        buffer = ''
+        eof = False
+        while not eof:
+            chunk = stream.read(NCDU_CHUNK_SIZE)
+            eof = not chunk
+            buffer += decoder.decode(chunk, eof)
+            pos = 0
+            for match in _NCDU_TOKEN.finditer(buffer):
+                start, end = match.span()
+                if start != pos:
+                    break           # 块末尾不完整的对象（或格式错误），留到下一块
+                pos = end
+                kind = match.lastindex
+                if kind == 5 or kind == 6:
+                    name, asize, rest, mtime = match.group(3, 4, 5, 6)
+                    if expect_dir or not frame or (rest and 'excluded' in rest):
+                        item = {'name': name, 'asize': int(asize or 0), 'mtime': int(mtime or 0)}
+                        if rest and 'excluded' in rest:
+                            item['excluded'] = True
+                    else:
+                        # 最常见的情况：名称不含转义字符的文件
+                        size = int(asize) if asize else 0
+                        frame[5] += size
+                        dot = name.rfind('.')
+                        ext = name[dot + 1:].lower() if dot > 0 else ''
+                        stat = extensions.get(ext)
+                        if stat is None:
+                            stat = extensions[ext] = [0, 0]
+                        stat[0] += 1
+                        stat[1] += size
+                        if include_files:
+                            add_type(TYPE_FILE)
+                            add_path(frame[1] + name)
+                            add_name(name)
+                            add_size(size)
+                            add_level(frame[3] + 1)
+                            add_mtime(int(mtime) if mtime else 0)
+                            add_parent(frame[4])
+                        continue
+                elif kind == 7:
+                    try:
+                        item = json.loads(match.group(7))
+                    except ValueError as e:
+                        raise ValueError(f"ncdu JSON 格式错误: {e}")
+                    if not stack and not expect_dir:
+                        scan_time = float(item.get('timestamp', 0))     # 文件头中的元数据
+                        continue
+                elif kind == 1:
+                    if started:
+                        expect_dir = True
+                    else:
+                        started = True
+                    continue
+                elif kind == 2:
+                    if not stack:
+                        finished = True
+                        continue
+                    stack.pop()
+                    parent_id = -1
+                    if stack:
+                        parent = stack[-1]
+                        parent[5] += frame[5]
+                        parent_id = parent[4]
+                    dir_rows[frame[4]] = len(sizes)
+                    add_type(TYPE_FOLDER)
+                    add_path(frame[0])
+                    add_name(frame[2])
+                    add_size(frame[5])
+                    add_level(frame[3])
+                    add_mtime(frame[6])
+                    add_parent(parent_id)
+                    frame = stack[-1] if stack else None
+                    continue
+                else:
+                    header.append(int(match.group(8)))
+                    continue
+                
+                # 目录、被排除的项目和名称含转义字符的文件
+                name = item.get('name', '')
+                size = item.get('asize', 0)
+                mtime = item.get('mtime', 0)
+                if expect_dir:
+                    expect_dir = False
+                    if frame:
+                        path = frame[1] + name
+                        level = frame[3] + 1
+                    else:
+                        # 根目录的名称是完整路径
+                        path = root = name
+                        level = 0
+                    prefix = path if path.endswith(('/', os.sep)) else path + ('/' if '/' in path else os.sep)
+                    frame = [path, prefix, name, level, len(dir_rows), 0, mtime]
+                    stack.append(frame)
+                    dir_rows.append(-1)
+                elif not frame:
+                    raise ValueError("ncdu JSON 格式错误: 根目录之外出现了项目")
+                elif 'excluded' not in item:
+                    frame[5] += size
+                    breakdown.add(name, size)
+                    if include_files:
+                        add_type(TYPE_FILE)
+                        add_path(frame[1] + name)
+                        add_name(name)
+                        add_size(size)
+                        add_level(frame[3] + 1)
+                        add_mtime(mtime)
+                        add_parent(frame[4])
+            if not started or (header and header[0] != NCDU_MAJOR_VERSION):
+                raise ValueError("不是 ncdu 导出文件" if not started or not header else
+                                 f"不支持的 ncdu 导出版本: {header[0]}")
+            if not pos and len(buffer) > NCDU_MAX_ITEM:
+                raise ValueError(f"ncdu JSON 格式错误: {buffer[:80]!r}")
+            buffer = buffer[pos:]
+            if progress is not None:
+                progress(min(1.0, raw.tell() / total_bytes))
+    
+    if buffer.strip():
+        raise ValueError(f"ncdu JSON 格式错误: {buffer.strip()[:80]!r}")
+    if not finished or stack or root is None:
+        raise ValueError("ncdu JSON 文件不完整")
+    store = ScanResultStore()
+    count = len(sizes)
+    zeros = bytes(8 * count)
+    store.extend_columns({
+        'types': types, 'paths': paths, 'names': names, 'sizes': sizes, 'levels': levels,
+        'mtimes': mtimes, 'atimes': array('d', zeros), 'parents': parents,
+        'cold_sizes': tuple(array('q', zeros) for _ in AGE_BUCKET_DAYS),
+    })
+    store.roots = [root]
+    store.scan_time = scan_time
+    store.resolve_parents(dir_rows)
+    store.sort_by_size()
+    return store, root, breakdown
+
+def save_ncdu_json(store, file_path):
+    """把扫描结果写成 ncdu 导出格式（ncdu -f 可以直接打开），只支持以单个文件夹为根的结果
+
+    只记录了大小（asize 和 dsize 都写入扫描得到的大小）和修改时间；文件夹自身的大小写为 0，
+    其中没有单独列出的部分（只扫描文件夹时的文件）写为一个名为 NCDU_REMAINDER_NAME 的文件，
+    这样 ncdu 汇总出的文件夹大小与扫描结果一致。
+    """
+    from json.encoder import encode_basestring
+    top_rows = store.top_rows()
+    if len(top_rows) != 1 or store.types[top_rows[0]] != TYPE_FOLDER:
+        raise ValueError("ncdu 格式只能导出以单个文件夹为根的扫描结果")
+    children = store.children()
+    types, names, sizes, mtimes = store.types, store.names, store.sizes, store.mtimes
+    
+    def item(name, size, mtime):
+        text = f'{{"name":{encode_basestring(name)},"asize":{size},"dsize":{size}'
+        return text + (f',"mtime":{int(mtime)}}}' if mtime > 0 else '}')
+    
+    def remainder(row):
+        return sizes[row] - sum(map(sizes.__getitem__, children.get(row, ())))
+    
+    root = top_rows[0]
+    meta = json.dumps({'progname': 'BigFileFinderGUI', 'progver': '1.0', 'timestamp': int(store.scan_time)},
+                      separators=(',', ':'))
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+        write = f.write
+        write(f'[{NCDU_MAJOR_VERSION},{NCDU_MINOR_VERSION},{meta},\n[{item(store.paths[root], 0, mtimes[root])}')
+        stack = [(root, iter(children.get(root, ())))]
+        while stack:
+            row, rows = stack[-1]
+            for child in rows:
+                if types[child] == TYPE_FOLDER:
+                    write(f',\n[{item(names[child], 0, mtimes[child])}')
+                    stack.append((child, iter(children.get(child, ()))))
+                    break
+                write(f',\n{item(names[child], sizes[child], mtimes[child])}')
+            else:
+                rest = remainder(row)
+                if rest > 0:
+                    write(f',\n{item(NCDU_REMAINDER_NAME, rest, 0)}')
+                write(']')
+                stack.pop()
+        write(']\n')
+    os.replace(tmp_path, file_path)
+    return file_path
+
+class NcduImportWorker(QThread):
+    """在后台线程中导入 ncdu 导出文件"""
+    progress = Signal(int)      # 已读取的百分比
+    finished = Signal(object)   # dict：store、root、breakdown
+    error = Signal(str)
+    
+    def __init__(self, file_path, include_files=True, ext_categories=None):
+        super().__init__()
+        self.file_path = file_path
+        self.include_files = include_files
+        self.ext_categories = ext_categories
+    
+    def run(self):
+        try:
+            store, root, breakdown = load_ncdu_json(self.file_path, self.include_files, self.ext_categories,
+                                                    lambda fraction: self.progress.emit(int(fraction * 100)))
+            store.prepare_sort_orders()
+        except (OSError, ValueError, EOFError) as e:
+            self.error.emit(f"导入 ncdu 文件失败: {e}")
+            return
+        self.finished.emit({'store': store, 'root': root, 'breakdown': breakdown})
+
+class NcduExportWorker(QThread):
+    """在后台线程中导出 ncdu 格式"""
+    finished = Signal(str)      # 导出的文件路径
+    error = Signal(str)
+    
+    def __init__(self, store, file_path):
+        super().__init__()
+        self.store = store
+        self.file_path = file_path
+    
+    def run(self):
+        try:
+            self.finished.emit(save_ncdu_json(self.store, self.file_path))
+        except (OSError, ValueError) as e:
+            self.error.emit(f"导出 ncdu 文件失败: {e}")
+
+# ---------------- 增长趋势 ----------------
+class TrendStore:
+    """按文件夹记录大小的时间序列（SQLite）
+
+    每次扫描只为大小发生变化的文件夹写入一个点，某一时刻的大小即此前最后一个点的值，
+    因此没有变化的文件夹不占空间。旧数据按时间降采样，每个时间段只保留最后一个点。
+    """
+    # (早于多少秒, 降采样间隔秒)：90 天前每周一个点，两年前每 30 天一个点
+    DOWNSAMPLE = ((90 * 86400, 7 * 86400), (730 * 86400, 30 * 86400))
+    
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(app_data_dir(), 'trends.sqlite3')
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS folders (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,      -- 规范化路径
+                display_path TEXT NOT NULL,
+                last_size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS points (
+                folder_id INTEGER NOT NULL,
+                time REAL NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (folder_id, time)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS scans (
+                root TEXT NOT NULL,             -- 规范化路径
+                time REAL NOT NULL,
+                PRIMARY KEY (root, time)
+            ) WITHOUT ROWID;
+        """)
+    
+    def close(self):
+        self.conn.close()
+    
+    @staticmethod
+    def _prefix_range(root_key):
+        """root_key 之下路径的范围 [lo, hi)"""
+        prefix = root_key if root_key.endswith(os.sep) else root_key + os.sep
+        return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+    
+    def _folders_under(self, root_key):
+        """root_key 及其下所有已记录的文件夹 (编号, 规范化路径, 最近大小)"""
+        lo, hi = self._prefix_range(root_key)
+        return self.conn.execute(
+            "SELECT id, path, last_size FROM folders WHERE path = ? OR (path >= ? AND path < ?)",
+            (root_key, lo, hi))
+    
+    def record(self, store, root, depth, root_id=None):
+        """记录一次扫描中 depth 层以内文件夹的大小，返回写入的点数
+
+        多根目录合并的结果用 root_id 只记录属于 root 的行。
+        """
+        normcase = os.path.normcase
+        root_key = normcase(root)
+        prefix_len = len(self._prefix_range(root_key)[0])
+        now = store.scan_time
+        written = 0
+        with self.conn:
+            conn = self.conn
+            conn.execute("INSERT OR IGNORE INTO scans (root, time) VALUES (?, ?)", (root_key, now))
+            known = {path: (folder_id, last_size) for folder_id, path, last_size
+                     in self._folders_under(root_key)}
+            
+            seen = set()
+            points = []
+            types, levels, sizes, paths = store.types, store.levels, store.sizes, store.paths
+            root_ids = store.root_ids if root_id is not None else None
+            for row in range(len(store)):
+                if types[row] != TYPE_FOLDER or levels[row] > depth:
+                    continue
+                if root_ids is not None and root_ids[row] != root_id:
+                    continue
+                path = paths[row]
+                key = normcase(path)
+                size = sizes[row]
+                seen.add(key)
+                folder = known.get(key)
+                if folder is None:
+                    folder_id = conn.execute(
+                        "INSERT INTO folders (path, display_path, last_size) VALUES (?, ?, ?)",
+                        (key, path, size)).lastrowid
+                    points.append((folder_id, now, size))
+                elif folder[1] != size:
+                    points.append((folder[0], now, size))
+            
+            # 曾经记录过、这次在记录深度内却没有出现的文件夹记为 0
+            for key, (folder_id, last_size) in known.items():
+                if key in seen or last_size == 0:
+                    continue
+                if key != root_key and key[prefix_len:].count(os.sep) + 1 > depth:
+                    continue
+                points.append((folder_id, now, 0))
+            
+            conn.executemany("INSERT OR REPLACE INTO points (folder_id, time, size) VALUES (?, ?, ?)", points)
+            conn.executemany("UPDATE folders SET last_size = ? WHERE id = ?",
+                             ((size, folder_id) for folder_id, _, size in points))
+            written = len(points)
+            self._downsample(now)
+        return written
+    
+    def _downsample(self, now):
+        """旧数据每个时间段只保留最后一个点（段末时刻的取值不变）"""
+        conn = self.conn
+        for age, interval in self.DOWNSAMPLE:
+            params = {'cutoff': now - age, 'interval': interval}
+            conn.execute("""
+                DELETE FROM points WHERE time < :cutoff AND EXISTS (
+                    SELECT 1 FROM points q
+                    WHERE q.folder_id = points.folder_id AND q.time > points.time AND q.time < :cutoff
+                      AND CAST(q.time / :interval AS INTEGER) = CAST(points.time / :interval AS INTEGER))
+            """, params)
+            conn.execute("""
+                DELETE FROM scans WHERE time < :cutoff AND EXISTS (
+                    SELECT 1 FROM scans q
+                    WHERE q.root = scans.root AND q.time > scans.time AND q.time < :cutoff
+                      AND CAST(q.time / :interval AS INTEGER) = CAST(scans.time / :interval AS INTEGER))
+            """, params)
+    
+    def scan_times(self, root):
+        """某扫描路径的历次扫描时间（升序）"""
+        return [t for (t,) in self.conn.execute(
+            "SELECT time FROM scans WHERE root = ? ORDER BY time", (os.path.normcase(root),))]
+    
+    def growth(self, root, window_days, limit=200):
+        """按窗口期内的增长量排序，返回 [(文件夹编号, 路径, 当前大小, 增长字节, 每天增长字节)]"""
+        times = self.scan_times(root)
+        if not times:
+            return []
+        now = times[-1]
+        # 历史不足一个窗口期时以第一次扫描为基准
+        since = max(now - window_days * 86400, times[0])
+        elapsed_days = max((now - since) / 86400, 1 / 24)
+        root_key = os.path.normcase(root)
+        lo, hi = self._prefix_range(root_key)
+        rows = self.conn.execute("""
+            SELECT id, display_path, last_size,
+                   (SELECT size FROM points p WHERE p.folder_id = f.id AND p.time <= :since
+                    ORDER BY p.time DESC LIMIT 1)
+            FROM folders f WHERE path = :root OR (path >= :lo AND path < :hi)
+        """, {'since': since, 'root': root_key, 'lo': lo, 'hi': hi})
+        result = []
+        for folder_id, path, size, base in rows:
+            if base is None:
+                base = 0
+            delta = size - base
+            if delta:
+                result.append((folder_id, path, size, delta, delta / elapsed_days))
+        result.sort(key=lambda r: r[3], reverse=True)
+        return result[:limit]
+    
+    def series(self, folder_id, times):
+        """文件夹在给定各时刻（升序）的大小"""
+        points = self.conn.execute(
+            "SELECT time, size FROM points WHERE folder_id = ? AND time <= ? ORDER BY time",
+            (folder_id, times[-1])).fetchall()
+        values = []
+        size = 0
+        i = 0
+        for t in times:
+            while i < len(points) and points[i][0] <= t:
+                size = points[i][1]
+                i += 1
+            values.append(size)
+        return values
+
+class TrendRecordWorker(QThread):
+    """扫描完成后在后台把文件夹大小写入趋势库"""
+    finished = Signal(int)      # 写入的点数
+    error = Signal(str)
+    
+    def __init__(self, store, root, depth):
+        super().__init__()
+        self.store = store
+        self.root = root
+        self.depth = depth
+    
+    def run(self):
+        try:
+            trends = TrendStore()
+            try:
+                if self.store.root_ids is None:
+                    written = trends.record(self.store, self.root, self.depth)
+                else:
+                    # 多根目录合并的结果按根目录分别记录
+                    written = sum(trends.record(self.store, root, self.depth, root_id)
+                                  for root_id, root in enumerate(self.store.roots))
+            finally:
+                trends.close()
+        except (OSError, sqlite3.Error) as e:
+            self.error.emit(f"记录增长趋势失败: {e}")
+            return
+        self.finished.emit(written)
+
+# ---------------- 删除到回收站 ----------------
+class SHFILEOPSTRUCT(ctypes.Structure):
+    _fields_ = [
+        ("hwnd", wintypes.HWND),
+        ("wFunc", wintypes.UINT),
+        ("pFrom", ctypes.c_wchar_p),
+        ("pTo", ctypes.c_wchar_p),
+        ("fFlags", wintypes.WORD),
+        ("fAnyOperationsAborted", wintypes.BOOL),
+        ("hNameMappings", ctypes.c_void_p),
+        ("lpszProgressTitle", ctypes.c_wchar_p)
+    ]
+
+def shell_recycle(paths):
+    """用一次 SHFileOperationW 把多个路径移到回收站（Windows），返回错误码（0 为成功）"""
+    FO_DELETE = 3
+    FOF_SILENT = 0x4                # 不显示进度对话框
+    FOF_NOCONFIRMATION = 0x10       # 不显示确认对话框
+    FOF_ALLOWUNDO = 0x40            # 删除到回收站
+    FOF_NOERRORUI = 0x400
+    FOF_WANTNUKEWARNING = 0x4000    # 放不进回收站、需要彻底删除时仍然询问
+    shfileop = ctypes.windll.shell32.SHFileOperationW
+    shfileop.argtypes = [ctypes.POINTER(SHFILEOPSTRUCT)]
+    shfileop.restype = wintypes.INT
+    
+    file_op = SHFILEOPSTRUCT()
+    file_op.hwnd = None
+    file_op.wFunc = FO_DELETE
+    file_op.pFrom = '\0'.join(paths) + '\0\0'  # 多个路径以空字符分隔，整体以双空字符结尾
+    file_op.pTo = None
+    file_op.fFlags = FOF_ALLOWUNDO | FOF_NOCONFIRMATION | FOF_SILENT | FOF_NOERRORUI | FOF_WANTNUKEWARNING
+    file_op.fAnyOperationsAborted = False
+    file_op.hNameMappings = None
+    file_op.lpszProgressTitle = None
+    result = shfileop(ctypes.byref(file_op))
+    if result == 0 and file_op.fAnyOperationsAborted:
+        return -1
+    return result
+
+class FreedesktopTrash:
+    """freedesktop.org 回收站规范的实现（Linux 等）
+
+    文件只在同一文件系统内重命名进回收站，从不跨文件系统复制：与主目录同一文件系统的文件进入
+    $XDG_DATA_HOME/Trash，其他分区使用分区根目录下的 .Trash/$uid（须为设置了粘滞位的目录）
+    或 .Trash-$uid。找不到同一文件系统的回收站时抛出 OSError。
+    """
+    def __init__(self):
+        self.uid = os.getuid()
+        data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+        self.home_trash = os.path.join(data_home, 'Trash')
+        self._trash_dirs = {}       # 设备号 -> (回收站目录, 分区根目录；主目录回收站为 None)
+    
+    @staticmethod
+    def _mount_point(path):
+        dev = os.lstat(path).st_dev
+        while True:
+            parent = os.path.dirname(path)
+            if parent == path or os.lstat(parent).st_dev != dev:
+                return path
+            path = parent
+    
+    def _home_device(self):
+        path = self.home_trash
+        while not os.path.exists(path):
+            path = os.path.dirname(path)
+        return os.stat(path).st_dev
+    
+    def _trash_dir(self, path):
+        dev = os.lstat(path).st_dev
+        cached = self._trash_dirs.get(dev)
+        if cached is not None:
+            return cached
+        if dev == self._home_device():
+            result = (self.home_trash, None)
+        else:
+            topdir = self._mount_point(path)
+            shared = os.path.join(topdir, '.Trash')
+            try:
+                st = os.lstat(shared)
+                usable = os.path.isdir(shared) and not os.path.islink(shared) and st.st_mode & 0o1000
+            except OSError:
+                usable = False
+            trash = os.path.join(shared, str(self.uid)) if usable else \
+                os.path.join(topdir, f'.Trash-{self.uid}')
+            result = (trash, topdir)
+        for sub in ('files', 'info'):
+            os.makedirs(os.path.join(result[0], sub), mode=0o700, exist_ok=True)
+        if os.lstat(result[0]).st_dev != dev:
+            raise OSError(f"{path} 所在文件系统没有可用的回收站")
+        self._trash_dirs[dev] = result
+        return result
+    
+    def trash(self, path):
+        path = os.path.abspath(path)
+        trash, topdir = self._trash_dir(path)
+        files_dir = os.path.join(trash, 'files')
+        info_dir = os.path.join(trash, 'info')
+        # 先以独占方式创建 .trashinfo 占住名称，再重命名
+        base = os.path.basename(path.rstrip(os.sep)) or 'root'
+        counter = 1
+        while True:
+            name = base if counter == 1 else f"{base}.{counter}"
+            info_path = os.path.join(info_dir, name + '.trashinfo')
+            try:
+                fd = os.open(info_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                counter += 1
+                continue
+            if os.path.lexists(os.path.join(files_dir, name)):
+                os.close(fd)
+                os.unlink(info_path)
+                counter += 1
+                continue
+            break
+        original = os.path.relpath(path, topdir) if topdir else path
+        info = (f"[Trash Info]\nPath={urllib.parse.quote(original)}\n"
+                f"DeletionDate={time.strftime('%Y-%m-%dT%H:%M:%S')}\n")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(info)
+        try:
+            os.rename(path, os.path.join(files_dir, name))
+        except OSError:
+            os.unlink(info_path)
+            raise
+
+class DeleteWorker(QThread):
+    """在后台把项目移到回收站，可取消
+
+    Windows 上把多个路径合并为一次 SHFileOperationW 调用（每批 BATCH_SIZE 个，批与批之间响应取消），
+    其他系统用 FreedesktopTrash 逐个在同一文件系统内重命名。是否删除成功以路径是否还存在为准。
+    """
+    progress = Signal(int, int)     # 已处理项目数，总数
+    finished = Signal(object)       # dict：deleted（已删除的行号）、failed（(名称, 原因)）、cancelled
+    
+    BATCH_SIZE = 100
+    PROGRESS_INTERVAL = 0.1
+    
+    def __init__(self, items):
+        super().__init__()
+        self.items = items          # [(行号, 路径, 名称)]
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        deleted = []
+        failed = []
+        try:
+            items = []
+            for row, path, name in self.items:
+                if path and os.path.lexists(path):
+                    items.append((row, path, name))
+                else:
+                    failed.append((name, "路径不存在"))
+            total = len(items)
+            if os.name == 'nt':
+                for start in range(0, total, self.BATCH_SIZE):
+                    if self._cancelled:
+                        break
+                    batch = items[start:start + self.BATCH_SIZE]
+                    result = shell_recycle([path for _, path, _ in batch])
+                    for row, path, name in batch:
+                        if os.path.lexists(path):
+                            failed.append((name, "已取消" if result == -1 else f"错误码 {result:#x}"))
+                        else:
+                            deleted.append(row)
+                    self.progress.emit(start + len(batch), total)
+            else:
+                trash = FreedesktopTrash()
+                last_emit = 0.0
+                for done, (row, path, name) in enumerate(items, 1):
+                    if self._cancelled:
+                        break
+                    try:
+                        trash.trash(path)
+                        deleted.append(row)
+                    except OSError as e:
+                        failed.append((name, e.strerror or str(e)))
+                    now = time.monotonic()
+                    if now - last_emit >= self.PROGRESS_INTERVAL or done == total:
+                        last_emit = now
+                        self.progress.emit(done, total)
+        except Exception as e:
+            failed.append(("", str(e)))
+        self.finished.emit({'deleted': deleted, 'failed': failed, 'cancelled': self._cancelled})
+
+# ---------------- 后台扫描服务 ----------------
+# JSON-RPC 2.0 错误码
+RPC_PARSE_ERROR = -32700
+RPC_INVALID_REQUEST = -32600
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_INTERNAL_ERROR = -32603
+RPC_SCAN_NOT_FOUND = -32001
+RPC_SCAN_NOT_READY = -32002
+RPC_ACCESS_DENIED = -32003
+
+def scan_service_name():
+    """扫描服务的本地套接字名称（默认每个用户一个服务）
+
+    多人共享同一服务时，用 --shared 启动服务，并在各客户端设置相同的环境变量 BIGFILEFINDER_SERVICE。
+    """
+    name = os.environ.get('BIGFILEFINDER_SERVICE')
+    if name:
+        return name
+    try:
+        user = getpass.getuser()
+    except (OSError, KeyError):
+        user = 'user'
+    return f"DiskAnalyzer-scan-{re.sub(r'[^A-Za-z0-9_.-]+', '_', user)}"
+
+def local_peer_uid(descriptor):
+    """本地套接字对端进程的用户 ID（Linux 的 SO_PEERCRED），其他平台或无法取得时返回 None"""
+    if not sys.platform.startswith('linux') or descriptor < 0:
+        return None
+    from socket import fromfd, AF_UNIX, SOCK_STREAM, SOL_SOCKET, SO_PEERCRED     # SO_PEERCRED 只在 Linux 上有
+    credentials = struct.Struct('3i')      # pid, uid, gid
+    try:
+        # fromfd 复制描述符，关闭副本不影响 Qt 持有的连接
+        with fromfd(descriptor, AF_UNIX, SOCK_STREAM) as peer:
+            return credentials.unpack(peer.getsockopt(SOL_SOCKET, SO_PEERCRED, credentials.size))[1]
+    except OSError:
+        return None
+
+class ServiceError(Exception):
+    """扫描服务请求错误，code 为 JSON-RPC 错误码"""
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+def list_service_scans(directory=None):
+    """扫描服务保存的已完成扫描概要（scan-N.json），按编号从新到旧"""
+    directory = directory or app_data_dir('service')
+    scans = []
+    for entry in os.scandir(directory):
+        if entry.name.startswith('scan-') and entry.name.endswith('.json'):
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(info, dict) and isinstance(info.get('scan_id'), int):
+                scans.append(info)
+    scans.sort(key=lambda info: info['scan_id'], reverse=True)
+    return scans
+
+def latest_service_scan(path, directory=None):
+    """服务对 path 最近一次完成的扫描概要，没有时返回 None（不需要服务正在运行）"""
+    key = os.path.normcase(os.path.abspath(path))
+    for info in list_service_scans(directory):
+        if (os.path.normcase(os.path.abspath(info.get('path', ''))) == key
+                and info.get('scan_folders') and os.path.exists(info.get('snapshot') or '')):
+            return info
+    return None
+
+class ScanSchedule:
+    """定时扫描设置（QSettings 的 schedule/* 项），服务每次检查时重新读取
+
+    结果比 interval 旧的根目录到期；系统空闲时比 idle_interval 旧的也提前扫描。
+    """
+    def __init__(self, settings=None):
+        settings = settings or QSettings()
+        settings.sync()             # 读取界面进程写入的最新设置
+        roots = settings.value("schedule/roots") or []
+        self.roots = [roots] if isinstance(roots, str) else list(roots)
+        self.interval = settings.value("schedule/interval_minutes", 360, type=int) * 60
+        self.idle_interval = settings.value("schedule/idle_minutes", 60, type=int) * 60
+        self.scan_files = settings.value("schedule/scan_files", False, type=bool)
+        priority = settings.value("schedule/priority", "background")
+        self.priority = priority if priority in SCAN_PRIORITIES else 'background'
+
+    def contains(self, path):
+        key = os.path.normcase(os.path.abspath(path))
+        return any(os.path.normcase(os.path.abspath(root)) == key for root in self.roots)
+
+    @staticmethod
+    def set_scheduled(path, enabled):
+        """加入或移出定时扫描的根目录"""
+        settings = QSettings()
+        schedule = ScanSchedule(settings)
+        key = os.path.normcase(os.path.abspath(path))
+        roots = [root for root in schedule.roots if os.path.normcase(os.path.abspath(root)) != key]
+        if enabled:
+            roots.append(path)
+        settings.setValue("schedule/roots", roots)
+        settings.sync()
+
+class _ServiceScan:
+    """扫描服务中的一次扫描"""
+    def __init__(self, scan_id, path, scan_files, scan_folders, priority):
+        self.scan_id = scan_id
+        self.path = path
+        self.scan_files = scan_files
+        self.scan_folders = scan_folders
+        self.priority = priority
+        self.state = 'running'      # running / saving / finished / cancelled / error
+        self.started = time.time()
+        self.finished_at = None
+        self.resumed = False        # 是否从服务保存的断点继续
+        self.scheduled = False      # 是否为定时扫描
+        self.scanner = None
+        self.store = None           # 完成后为映射快照的 MappedScanResultStore
+        self.snapshot = None        # 快照文件路径
+        self.search_index = None
+        self.breakdown = None
+        self.cleanup = None         # CleanupCandidates
+        self.progress = ('', 0, -1)     # 当前路径，已扫描项目数，完成百分比
+        self.throttle = ''
+        self.slow_dirs = []
+        self.diagnostics = None     # 扫描线程退出后的诊断数据（ScanStats.to_dict）
+        self.error = None
+        self.subscribers = set()    # 订阅进度通知的连接
+
+    def is_active(self):
+        return self.state in ('running', 'saving')
+
+    def info(self, detail=False):
+        """扫描概要；detail 为 True 时附带慢目录、类型分布、清理候选和诊断数据"""
+        current_path, count, percent = self.progress
+        info = {
+            'scan_id': self.scan_id, 'path': self.path, 'scan_files': self.scan_files,
+            'scan_folders': self.scan_folders, 'priority': self.priority, 'state': self.state,
+            'started': self.started, 'finished_at': self.finished_at, 'resumed': self.resumed,
+            'scheduled': self.scheduled,
+            'paused': self.state == 'running' and self.scanner is not None and self.scanner.is_paused(),
+            'current_path': current_path, 'count': count, 'percent': percent,
+            'throttle': self.throttle, 'snapshot': self.snapshot, 'error': self.error,
+        }
+        if self.store is not None:
+            info.update(count=len(self.store), total_size=self.store.total_size,
+                        scan_time=self.store.scan_time)
+        if detail:
+            info['slow_dirs'] = [list(slow) for slow in self.slow_dirs]
+            info['breakdown'] = self.breakdown.extensions if self.breakdown is not None else None
+            info['cleanup'] = self.cleanup.to_list() if self.cleanup is not None else None
+            diagnostics = self.diagnostics
+            if diagnostics is None and self.scanner is not None:
+                diagnostics = self.scanner.stats.to_dict()      # 进行中的扫描取当前值
+            info['diagnostics'] = diagnostics
+        return info
+
+class ScanService(QObject):
+    """后台扫描服务：持有扫描线程和扫描结果，通过本地套接字提供 JSON-RPC 接口
+
+    每行一个 JSON-RPC 2.0 消息（python Find.py --daemon 启动）。客户端可以开始、暂停、取消扫描，
+    订阅进度通知（scan.progress / scan.slow_directory / scan.throttle / scan.finished /
+    scan.stopped / scan.error），并查询最大的项目、子目录和搜索结果。
+    同一路径、同一扫描方式正在扫描时，再次请求扫描会附加到已有扫描而不是重新开始。
+    完成的扫描写成快照（连同概要 JSON）保存在服务目录中，服务重启后仍可查询；
+    客户端直接 mmap 打开快照即可得到完整结果，不经过套接字传输。
+    以 --shared 启动时，服务用户以外的连接只能扫描和查询定时扫描的根目录及 service/shared_roots
+    中的目录（含子目录），否则任何本地用户都能借服务的权限读出自己无权查看的目录内容。
+    服务还按 ScanSchedule 定期（或在系统空闲时）以设置的优先级重新扫描配置的根目录，
+    界面打开时直接载入最近的结果（见 latest_service_scan）。
+    """
+    KEEP_SCANS = 10             # 各根目录最新结果之外保留的已结束扫描数，更早的连同快照文件删除
+    MAX_ROWS = 10000            # 一次查询最多返回的行数
+    MAX_REQUEST_BYTES = 4 << 20  # 单个请求（一行）的最大字节数，超过时断开连接
+    SCHEDULE_CHECK = 60 * 1000  # 检查定时扫描的间隔（毫秒）
+    IDLE_CPU = 10.0             # CPU 占用低于此百分比且 I/O 压力低于 IDLE_IO 时视为空闲
+    IDLE_IO = 0.05
+    _REQUIRED = object()
+
+    def __init__(self, directory=None, parent=None):
+        super().__init__(parent)
+        self.directory = directory or app_data_dir('service')
+        self.checkpoint_dir = os.path.join(self.directory, 'checkpoints')
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self._on_new_connection)
+        self.scans = {}             # 扫描编号 -> _ServiceScan
+        self._buffers = {}          # 连接 -> 尚未收到换行的输入
+        self._trusted = set()       # 不受共享模式限制的连接（非共享模式下为全部连接）
+        self.shared = False
+        self._workers = set()       # 正在保存快照/写入趋势的线程
+        self._methods = {
+            'scan.start': self.rpc_start,
+            'scan.list': self.rpc_list,
+            'scan.subscribe': self.rpc_subscribe,
+            'scan.unsubscribe': self.rpc_unsubscribe,
+            'scan.cancel': self.rpc_cancel,
+            'scan.pause': self.rpc_pause,
+            'scan.resume': self.rpc_resume,
+            'results.top': self.rpc_top,
+            'results.subtree': self.rpc_subtree,
+            'results.search': self.rpc_search,
+            'schedule.status': self.rpc_schedule_status,
+            'schedule.check': self.rpc_schedule_check,
+        }
+        self._restore()
+        self._next_id = max(self.scans, default=0) + 1
+        self._io_monitor = IoPressureMonitor()
+        psutil.cpu_percent(None)    # 第一次调用只建立基准
+        self.schedule_timer = QTimer(self)
+        self.schedule_timer.timeout.connect(self._check_schedule)
+
+    def listen(self, name=None, shared=False):
+        """开始监听；同名服务已在运行或无法监听时抛出 OSError"""
+        name = name or scan_service_name()
+        probe = QLocalSocket()
+        probe.connectToServer(name)
+        if probe.waitForConnected(500):
+            probe.disconnectFromServer()
+            raise OSError(f"扫描服务已在运行: {name}")
+        QLocalServer.removeServer(name)     # 清理上次异常退出留下的套接字文件
+        self.shared = shared
+        if shared:
+            self.server.setSocketOptions(QLocalServer.WorldAccessOption)
+        if not self.server.listen(name):
+            raise OSError(self.server.errorString())
+        self.schedule_timer.start(self.SCHEDULE_CHECK)
+        QTimer.singleShot(5000, self._check_schedule)
+
+    def shutdown(self):
+        """取消所有进行中的扫描（各自保存断点），等待线程退出"""
+        for scan in self.scans.values():
+            if scan.scanner is not None and scan.scanner.isRunning():
+                scan.scanner.cancel()
+        for scan in self.scans.values():
+            if scan.scanner is not None:
+                scan.scanner.wait(5000)
+        for worker in list(self._workers):
+            worker.wait()
+
+    # ---------- 连接与消息 ----------
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self._buffers[socket] = b''
+            socket.setReadBufferSize(self.MAX_REQUEST_BYTES)
+            if not self.shared:
+                self._trusted.add(socket)
+            else:
+                uid = local_peer_uid(int(socket.socketDescriptor()))
+                if uid is not None and uid == os.getuid():
+                    self._trusted.add(socket)
+            socket.readyRead.connect(lambda s=socket: self._on_ready_read(s))
+            socket.disconnected.connect(lambda s=socket: self._on_disconnected(s))
+
+    def _on_ready_read(self, socket):
+        *lines, rest = (self._buffers.get(socket, b'') + bytes(socket.readAll())).split(b'\n')
+        for line in lines:
+            if line.strip():
+                self._handle(socket, line)
+        if socket not in self._buffers:     # 处理请求期间已断开
+            return
+        if len(rest) > self.MAX_REQUEST_BYTES:
+            # 不限制时一直不发换行的连接可以让服务耗尽内存
+            self._buffers[socket] = b''
+            self._send(socket, {'id': None, 'error': {'code': RPC_PARSE_ERROR,
+                                                      'message': f"请求超过 {self.MAX_REQUEST_BYTES} 字节"}})
+            socket.disconnectFromServer()
+            return
+        self._buffers[socket] = rest
+
+    def _on_disconnected(self, socket):
+        self._buffers.pop(socket, None)
+        self._trusted.discard(socket)
+        for scan in self.scans.values():
+            scan.subscribers.discard(socket)
+        socket.deleteLater()
+
+    def _send(self, socket, message):
+        # ensure_ascii：无法用 UTF-8 编码的路径（surrogateescape）以 \\u 转义传输
+        socket.write(json.dumps(dict(message, jsonrpc='2.0')).encode('ascii') + b'\n')
+
+    def _notify(self, scan, method, params):
+        params = dict(params, scan_id=scan.scan_id)
+        for socket in scan.subscribers:
+            self._send(socket, {'method': method, 'params': params})
+
+    def _handle(self, socket, line):
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise ServiceError(RPC_PARSE_ERROR, f"无法解析请求: {e}")
+            if not isinstance(request, dict):
+                raise ServiceError(RPC_INVALID_REQUEST, "请求必须是 JSON 对象")
+            request_id = request.get('id')
+            method = self._methods.get(request.get('method'))
+            if method is None:
+                raise ServiceError(RPC_METHOD_NOT_FOUND, f"未知方法: {request.get('method')}")
+            params = request.get('params') or {}
+            if not isinstance(params, dict):
+                raise ServiceError(RPC_INVALID_PARAMS, "params 必须是对象")
+            result = method(socket, params)
+        except ServiceError as e:
+            self._send(socket, {'id': request_id, 'error': {'code': e.code, 'message': str(e)}})
+            return
+        except Exception as e:
+            # 处理方法内部出错（如读写断点、建索引失败）也要回复，否则客户端一直等待
+            traceback.print_exc()
+            self._send(socket, {'id': request_id,
+                                'error': {'code': RPC_INTERNAL_ERROR, 'message': f"服务内部错误: {e}"}})
+            return
+        if 'id' in request:     # 没有 id 的请求是通知，不回复
+            self._send(socket, {'id': request_id, 'result': result})
+
+    def _param(self, params, key, kind, default=_REQUIRED):
+        value = params.get(key, default)
+        if value is self._REQUIRED:
+            raise ServiceError(RPC_INVALID_PARAMS, f"缺少参数: {key}")
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            raise ServiceError(RPC_INVALID_PARAMS, f"参数类型错误: {key}")
+        return value
+
+    def _permitted(self, socket, path):
+        """连接能否扫描或查询 path：服务用户本人不受限，共享服务的其他用户只能访问允许的根目录及其子目录"""
+        if socket in self._trusted:
+            return True
+        settings = QSettings()
+        extra = settings.value("service/shared_roots") or []
+        roots = ScanSchedule(settings).roots + ([extra] if isinstance(extra, str) else list(extra))
+        # 按真实路径比较，避免借符号链接或 .. 绕出允许的目录
+        key = os.path.normcase(os.path.realpath(path))
+        for root in roots:
+            root = os.path.normcase(os.path.realpath(root))
+            if key == root or key.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        return False
+
+    def _scan(self, socket, params):
+        scan = self.scans.get(self._param(params, 'scan_id', int))
+        if scan is None or not self._permitted(socket, scan.path):
+            raise ServiceError(RPC_SCAN_NOT_FOUND, f"没有编号为 {params['scan_id']} 的扫描")
+        return scan
+
+    def _results(self, socket, params):
+        """已完成扫描的 (扫描, 结果存储)"""
+        scan = self._scan(socket, params)
+        if scan.store is None:
+            raise ServiceError(RPC_SCAN_NOT_READY, f"扫描 {scan.scan_id} 尚未完成")
+        return scan, scan.store
+
+    def _limit(self, params):
+        return max(1, min(self._param(params, 'n', int, 50), self.MAX_ROWS))
+
+    def _index(self, scan):
+        if scan.search_index is None:
+            scan.search_index = SearchIndex(scan.store)
+        return scan.search_index
+
+    @staticmethod
+    def _row(store, row):
+        return {
+            'row': row, 'path': store.paths[row], 'name': store.names[row],
+            'type': 'folder' if store.types[row] == TYPE_FOLDER else 'file',
+            'size': store.sizes[row], 'level': store.levels[row],
+            'mtime': store.mtimes[row], 'atime': store.atimes[row], 'parent': store.parents[row],
+        }
+
+    # ---------- 扫描控制 ----------
+    def rpc_start(self, socket, params):
+        """开始扫描并订阅其进度；相同的扫描正在进行时附加到该扫描"""
+        path = self._param(params, 'path', str)
+        scan_files = self._param(params, 'scan_files', bool, False)
+        scan_folders = self._param(params, 'scan_folders', bool, True)
+        priority = self._param(params, 'priority', str, 'normal')
+        if priority not in SCAN_PRIORITIES:
+            raise ServiceError(RPC_INVALID_PARAMS, f"未知的扫描优先级: {priority}")
+        if not self._permitted(socket, path):
+            raise ServiceError(RPC_ACCESS_DENIED, f"共享服务只允许扫描定时扫描和 service/shared_roots 中的目录: {path}")
+        if not os.path.isdir(path):
+            raise ServiceError(RPC_INVALID_PARAMS, f"路径不存在: {path}")
+        scan = self._active_scan(path, scan_files, scan_folders)
+        shared = scan is not None
+        if not shared:
+            scan = self._start_scan(path, scan_files, scan_folders, priority)
+        scan.subscribers.add(socket)
+        return dict(scan.info(detail=True), shared=shared)
+
+    def _active_scan(self, path, scan_files, scan_folders):
+        """同一路径、同一扫描方式正在进行的扫描"""
+        key = os.path.normcase(os.path.abspath(path))
+        for scan in self.scans.values():
+            if (scan.is_active() and os.path.normcase(os.path.abspath(scan.path)) == key
+                    and (scan.scan_files, scan.scan_folders) == (scan_files, scan_folders)):
+                return scan
+        return None
+
+    def _start_scan(self, path, scan_files, scan_folders, priority):
+        scan = _ServiceScan(self._next_id, path, scan_files, scan_folders, priority)
+        self._next_id += 1
+        # 服务中的扫描同样保存断点，取消或服务退出后再次扫描同一路径时自动继续
+        checkpoint = ScanCheckpoint(path, scan_files, scan_folders, self.checkpoint_dir)
+        if checkpoint.exists() and checkpoint.summary() is None:
+            checkpoint.clear()
+        scan.resumed = checkpoint.exists()
+        settings = QSettings()
+        dir_timeout = float(settings.value("scan/dir_timeout", 10.0))
+        scanner = FolderSizeScanner(path, scan_files, scan_folders, load_file_categories(), checkpoint,
+                                    scan.resumed, priority, dir_timeout, FakeSlowLister.from_environment())
+        scanner.profile = settings.value("diagnostics/profile", False, type=bool)
+        scanner.trace_memory = settings.value("diagnostics/tracemalloc", False, type=bool)
+        scanner.progress.connect(lambda p, count, percent: self._on_progress(scan, p, count, percent))
+        scanner.slow_directory.connect(lambda p, seconds, skipped: self._on_slow_directory(scan, p, seconds, skipped))
+        scanner.throttle_status.connect(lambda text: self._on_throttle(scan, text))
+        scanner.finished.connect(lambda results: self._on_finished(scan, results))
+        scanner.stopped.connect(lambda: self._on_stopped(scan))
+        scanner.error.connect(lambda message: self._on_error(scan, message))
+        scanner.diagnostics.connect(lambda stats: setattr(scan, 'diagnostics', stats.to_dict()))
+        scan.scanner = scanner
+        self.scans[scan.scan_id] = scan
+        scanner.start()
+        return scan
+
+    def rpc_list(self, socket, params):
+        return [scan.info() for scan in sorted(self.scans.values(), key=lambda s: s.scan_id, reverse=True)
+                if self._permitted(socket, scan.path)]
+
+    def rpc_subscribe(self, socket, params):
+        scan = self._scan(socket, params)
+        scan.subscribers.add(socket)
+        return scan.info(detail=True)
+
+    def rpc_unsubscribe(self, socket, params):
+        self._scan(socket, params).subscribers.discard(socket)
+        return True
+
+    def rpc_cancel(self, socket, params):
+        scan = self._scan(socket, params)
+        if scan.state == 'running':
+            scan.scanner.cancel()
+        return scan.info()
+
+    def rpc_pause(self, socket, params):
+        scan = self._scan(socket, params)
+        if scan.state == 'running':
+            scan.scanner.pause()
+        return scan.info()
+
+    def rpc_resume(self, socket, params):
+        scan = self._scan(socket, params)
+        if scan.state == 'running':
+            scan.scanner.resume_scan()
+        return scan.info()
+
+    # ---------- 结果查询 ----------
+    def rpc_top(self, socket, params):
+        """最大的 n 项（type 为 file/folder 时只返回该类型）"""
+        scan, store = self._results(socket, params)
+        item_type = {'': None, 'file': TYPE_FILE, 'folder': TYPE_FOLDER}.get(self._param(params, 'type', str, ''), -1)
+        if item_type == -1:
+            raise ServiceError(RPC_INVALID_PARAMS, "type 只能是 file 或 folder")
+        types = store.types
+        # 结果按大小降序排列，按行号顺序取前 n 个即可
+        rows = range(len(store)) if item_type is None else (r for r in range(len(store)) if types[r] == item_type)
+        return [self._row(store, row) for row in islice(rows, self._limit(params))]
+
+    def rpc_subtree(self, socket, params):
+        """文件夹（path 为空时为扫描根目录）及其最大的 n 个子项"""
+        scan, store = self._results(socket, params)
+        path = self._param(params, 'path', str, '')
+        if path:
+            row = self._index(scan).find_path(path)
+            if row < 0:
+                raise ServiceError(RPC_INVALID_PARAMS, f"扫描结果中没有: {path}")
+            children = store.children().get(row, [])
+            item = self._row(store, row)
+        else:
+            children = store.top_rows()
+            item = None
+        limit = self._limit(params)
+        return {'item': item, 'total': len(children),
+                'children': [self._row(store, child) for child in children[:limit]]}
+
+    def rpc_search(self, socket, params):
+        """名称包含 text（含路径分隔符时为路径前缀）的最大的 n 项"""
+        scan, store = self._results(socket, params)
+        rows = self._index(scan).search(self._param(params, 'text', str))
+        return {'total': len(rows), 'rows': [self._row(store, row) for row in rows[:self._limit(params)]]}
+
+    # ---------- 定时扫描 ----------
+    def _last_attempt(self, root):
+        """根目录最近一次扫描结束的时间（完成、取消或失败），没有时为 0"""
+        key = os.path.normcase(os.path.abspath(root))
+        return max((scan.finished_at or 0 for scan in self.scans.values()
+                    if not scan.is_active() and scan.scan_folders
+                    and os.path.normcase(os.path.abspath(scan.path)) == key), default=0)
+
+    def _is_idle(self):
+        pressure = self._io_monitor.pressure()
+        return psutil.cpu_percent(None) < self.IDLE_CPU and (pressure is None or pressure < self.IDLE_IO)
+
+    def _check_schedule(self):
+        """按结果从旧到新启动到期的定时扫描；同一时间只进行一个定时扫描，被取消的扫描也要等到下次到期"""
+        if any(scan.scheduled and scan.is_active() for scan in self.scans.values()):
+            return
+        schedule = ScanSchedule()
+        idle = self._is_idle()
+        now = time.time()
+        for root in sorted(schedule.roots, key=self._last_attempt):
+            age = now - self._last_attempt(root)
+            if not (age >= schedule.interval or (idle and age >= schedule.idle_interval)):
+                continue
+            if not os.path.isdir(root) or self._active_scan(root, schedule.scan_files, True) is not None:
+                continue
+            scan = self._start_scan(root, schedule.scan_files, True, schedule.priority)
+            scan.scheduled = True
+            return
+
+    def rpc_schedule_check(self, socket, params):
+        """立即检查定时扫描（界面修改设置后调用），返回 schedule.status 的结果"""
+        self._check_schedule()
+        return self.rpc_schedule_status(socket, params)
+
+    def rpc_schedule_status(self, socket, params):
+        """定时扫描设置，以及各根目录上次扫描结束和下次到期的时间"""
+        schedule = ScanSchedule()
+        roots = []
+        for root in schedule.roots:
+            last = self._last_attempt(root)
+            active = next((scan.scan_id for scan in self.scans.values() if scan.is_active()
+                           and os.path.normcase(os.path.abspath(scan.path)) == os.path.normcase(os.path.abspath(root))),
+                          None)
+            roots.append({'path': root, 'last_scan': last or None, 'next_due': last + schedule.interval,
+                          'active_scan': active})
+        return {'roots': roots, 'interval': schedule.interval, 'idle_interval': schedule.idle_interval,
+                'priority': schedule.priority, 'scan_files': schedule.scan_files}
+
+    # ---------- 扫描线程信号 ----------
+    def _on_progress(self, scan, path, count, percent):
+        scan.progress = (path, count, percent)
+        self._notify(scan, 'scan.progress', {'path': path, 'count': count, 'percent': percent})
+
+    def _on_slow_directory(self, scan, path, seconds, skipped):
+        scan.slow_dirs.append((path, seconds, skipped))
+        self._notify(scan, 'scan.slow_directory', {'path': path, 'seconds': seconds, 'skipped': skipped})
+
+    def _on_throttle(self, scan, text):
+        scan.throttle = text
+        self._notify(scan, 'scan.throttle', {'text': text})
+
+    def _on_stopped(self, scan):
+        if scan.state == 'running':
+            scan.state = 'cancelled'
+            scan.finished_at = time.time()
+            self._notify(scan, 'scan.stopped', {})
+            self._prune()
+
+    def _on_error(self, scan, message):
+        scan.state = 'error'
+        scan.error = message
+        scan.finished_at = time.time()
+        self._notify(scan, 'scan.error', {'message': message})
+        self._prune()
+
+    def _on_finished(self, scan, results):
+        """保存快照后切换为映射快照，释放扫描得到的内存结果；趋势由服务统一记录"""
+        scan.state = 'saving'
+        scan.store = results
+        scan.breakdown = scan.scanner.breakdown
+        scan.cleanup = scan.scanner.cleanup
+        scan.search_index = scan.scanner.search_index   # 只保存行号和名称，不引用结果本身
+        scan.scanner.search_index = None
+        saver = SnapshotSaveWorker(results, scan.path, f"scan-{scan.scan_id}", self.directory)
+        saver.finished.connect(lambda file_path: self._on_snapshot_saved(scan, file_path))
+        saver.error.connect(lambda message: self._on_error(scan, message))
+        trends = TrendRecordWorker(results, scan.path, QSettings().value("trend/depth", 3, type=int))
+        # 线程对象在 run 返回前不能被回收，只在新任务开始时清理已退出的
+        self._workers = {worker for worker in self._workers if worker.isRunning()}
+        for worker in (saver, trends):
+            self._workers.add(worker)
+            worker.start()
+
+    def _on_snapshot_saved(self, scan, file_path):
+        try:
+            scan.store = MappedScanResultStore(file_path)
+        except (OSError, ValueError, KeyError) as e:
+            self._on_error(scan, f"无法打开快照: {e}")
+            return
+        scan.snapshot = file_path
+        scan.state = 'finished'
+        scan.finished_at = time.time()
+        info = scan.info(detail=True)
+        try:
+            tmp_file = os.path.join(self.directory, f"scan-{scan.scan_id}.json.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            os.replace(tmp_file, tmp_file[:-4])
+        except OSError:
+            pass        # 概要只用于服务重启后恢复，写入失败不影响本次查询
+        self._notify(scan, 'scan.finished', info)
+        self._prune()
+
+    def _restore(self):
+        """载入服务目录中已完成扫描的概要和快照"""
+        for info in list_service_scans(self.directory):
+            try:
+                scan = _ServiceScan(info['scan_id'], info['path'], info['scan_files'],
+                                    info['scan_folders'], info['priority'])
+                scan.store = MappedScanResultStore(info['snapshot'])
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            scan.state = 'finished'
+            scan.started = info['started']
+            scan.finished_at = info['finished_at']
+            scan.snapshot = info['snapshot']
+            scan.scheduled = info.get('scheduled', False)
+            scan.slow_dirs = [tuple(slow) for slow in info.get('slow_dirs') or ()]
+            scan.diagnostics = info.get('diagnostics')
+            if info.get('breakdown') is not None:
+                scan.breakdown = TypeBreakdown(load_file_categories())
+                scan.breakdown.extensions = info['breakdown']
+            if info.get('cleanup') is not None:
+                scan.cleanup = CleanupCandidates.from_list(info['cleanup'])
+            self.scans[scan.scan_id] = scan
+
+    def _prune(self):
+        """保留各根目录最新的完成结果，以及其余最近 KEEP_SCANS 个已结束的扫描"""
+        latest = {}
+        for scan in self.scans.values():
+            if scan.state == 'finished':
+                key = (os.path.normcase(os.path.abspath(scan.path)), scan.scan_files, scan.scan_folders)
+                latest[key] = max(latest.get(key, 0), scan.scan_id)
+        keep = set(latest.values())
+        ended = sorted((scan for scan in self.scans.values()
+                        if not scan.is_active() and scan.scan_id not in keep
+                        and not (scan.scanner and scan.scanner.isRunning())),
+                       key=lambda s: s.scan_id)
+        for scan in ended[:max(0, len(ended) - self.KEEP_SCANS)]:
+            del self.scans[scan.scan_id]
+            scan.store = None
+            for file_path in (scan.snapshot, os.path.join(self.directory, f"scan-{scan.scan_id}.json")):
+                try:
+                    if file_path:
+                        os.remove(file_path)
+                except OSError:
+                    pass
+
+def run_scan_service(shared=False):
+    """以无界面的后台服务运行（python Find.py --daemon [--shared]），返回退出码"""
+    app = QCoreApplication(sys.argv)
+    app.setApplicationName("磁盘空间分析工具")
+    app.setOrganizationName("DiskAnalyzer")
+    service = ScanService()
+    try:
+        service.listen(shared=shared)
+    except OSError as e:
+        print(f"❌ 无法启动扫描服务: {e}", file=sys.stderr)
+        return 1
+    app.aboutToQuit.connect(service.shutdown)
+    # Qt 事件循环中 Python 收不到信号，定时回到解释器以便响应 Ctrl+C / SIGTERM
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: app.quit())
+    timer = QTimer()
+    timer.timeout.connect(lambda: None)
+    timer.start(500)
+    print(f"🛰️ 扫描服务已启动: {service.server.fullServerName()}（共享: {'是' if shared else '否'}）")
+    return app.exec()
+
+class ScanServiceClient(QObject):
+    """扫描服务的客户端连接，在界面线程中异步收发 JSON-RPC 消息"""
+    notification = Signal(str, object)  # 服务推送的通知：方法名，参数
+    disconnected = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.socket = QLocalSocket(self)
+        self.socket.readyRead.connect(self._on_ready_read)
+        self.socket.disconnected.connect(self._on_disconnected)
+        self._buffer = b''
+        self._next_id = 1
+        self._callbacks = {}        # 请求编号 -> (成功回调, 失败回调)
+
+    def is_connected(self):
+        return self.socket.state() == QLocalSocket.ConnectedState
+
+    def connect_to_service(self, name=None, timeout_ms=500):
+        """连接到服务（已连接时直接返回），返回是否连接成功"""
+        if self.is_connected():
+            return True
+        self.socket.abort()
+        self.socket.connectToServer(name or scan_service_name())
+        return self.socket.waitForConnected(timeout_ms)
+
+    def call(self, method, params=None, callback=None, errback=None):
+        """发送请求；结果和错误说明分别传给 callback / errback"""
+        request_id = self._next_id
+        self._next_id += 1
+        self._callbacks[request_id] = (callback, errback)
+        message = {'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params or {}}
+        self.socket.write(json.dumps(message).encode('ascii') + b'\n')
+        self.socket.flush()
+
+    def _on_ready_read(self):
+        *lines, self._buffer = (self._buffer + bytes(self.socket.readAll())).split(b'\n')
+        for line in lines:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if 'id' in message:
+                callback, errback = self._callbacks.pop(message['id'], (None, None))
+                if 'error' in message:
+                    if errback is not None:
+                        errback(message['error'].get('message', ''))
+                elif callback is not None:
+                    callback(message.get('result'))
+            elif 'method' in message:
+                self.notification.emit(message['method'], message.get('params') or {})
+
+    def _on_disconnected(self):
+        self._buffer = b''
+        callbacks, self._callbacks = self._callbacks, {}
+        for _, errback in callbacks.values():
+            if errback is not None:
+                errback("与扫描服务的连接已断开")
+        self.disconnected.emit()
+
+class ServiceScanProxy(QObject):
+    """扫描服务中一次扫描的本地代理
+
+    信号和控制方法与 FolderSizeScanner 相同，界面可以同样对待。扫描在服务进程中进行，
+    关闭窗口只取消订阅（detach），扫描继续；完成后直接映射服务写出的快照。
+    """
+    progress = Signal(str, int, int)
+    finished = Signal(object)
+    error = Signal(str)
+    stopped = Signal()
+    slow_directory = Signal(str, float, bool)
+    throttle_status = Signal(str)
+    diagnostics = Signal(object)
+
+    def __init__(self, client, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self.scan_id = None
+        self.info = {}
+        self.slow_dirs = []
+        self.search_index = None    # 界面中首次搜索时建立
+        self.breakdown = None
+        self.cleanup = None
+        self.stats = None           # 完成后为服务端扫描的诊断数据（ScanStats）
+        self._running = False
+        self._paused = False
+        self._cancel_requested = False
+        client.notification.connect(self._on_notification)
+        client.disconnected.connect(self._on_disconnected)
+
+    def start_scan(self, path, scan_files, scan_folders, priority):
+        self._running = True
+        self.client.call('scan.start', {'path': path, 'scan_files': scan_files, 'scan_folders': scan_folders,
+                                        'priority': priority}, self._attached, self._failed)
+
+    def attach(self, scan_id):
+        self._running = True
+        self.client.call('scan.subscribe', {'scan_id': scan_id}, self._attached, self._failed)
+
+    def detach(self):
+        if self._running and self.scan_id is not None and self.client.is_connected():
+            self.client.call('scan.unsubscribe', {'scan_id': self.scan_id})
+        self._running = False
+
+    def isRunning(self):
+        return self._running
+
+    def cancel(self):
+        if self.scan_id is None:
+            self._cancel_requested = True   # 服务尚未返回扫描编号，附加后再取消
+        else:
+            self.client.call('scan.cancel', {'scan_id': self.scan_id})
+
+    def pause(self):
+        self._paused = True
+        self.client.call('scan.pause', {'scan_id': self.scan_id})
+
+    def resume_scan(self):
+        self._paused = False
+        self.client.call('scan.resume', {'scan_id': self.scan_id})
+
+    def is_paused(self):
+        return self._paused
+
+    def _attached(self, info):
+        self.scan_id = info['scan_id']
+        self.info = info
+        self._paused = info['paused']
+        for path, seconds, skipped in info['slow_dirs']:
+            self._on_slow_directory(path, seconds, skipped)
+        state = info['state']
+        if state == 'finished':
+            self._finish(info)
+        elif state == 'cancelled':
+            self._running = False
+            self.stopped.emit()
+        elif state == 'error':
+            self._failed(info['error'])
+        else:
+            self.progress.emit(info['current_path'], info['count'], info['percent'])
+            if info['throttle']:
+                self.throttle_status.emit(info['throttle'])
+            if self._cancel_requested:
+                self.cancel()
+
+    def _failed(self, message):
+        self._running = False
+        self.error.emit(message)
+
+    def _finish(self, info):
+        self._running = False
+        self.info = info
+        if info['breakdown'] is not None:
+            self.breakdown = TypeBreakdown(load_file_categories())
+            self.breakdown.extensions = info['breakdown']
+        if info.get('cleanup') is not None:
+            self.cleanup = CleanupCandidates.from_list(info['cleanup'])
+        if info.get('diagnostics'):
+            self.stats = ScanStats.from_dict(info['diagnostics'])
+        try:
+            store = MappedScanResultStore(info['snapshot'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.error.emit(f"无法打开扫描服务保存的快照: {e}")
+            return
+        self.finished.emit(store)
+        if self.stats is not None:
+            self.diagnostics.emit(self.stats)
+
+    def _on_slow_directory(self, path, seconds, skipped):
+        self.slow_dirs.append((path, seconds, skipped))
+        self.slow_directory.emit(path, seconds, skipped)
+
+    def _on_notification(self, method, params):
+        if not self._running or params.get('scan_id') != self.scan_id:
+            return
+        if method == 'scan.progress':
+            self.progress.emit(params['path'], params['count'], params['percent'])
+        elif method == 'scan.slow_directory':
+            self._on_slow_directory(params['path'], params['seconds'], params['skipped'])
+        elif method == 'scan.throttle':
+            self.throttle_status.emit(params['text'])
+        elif method == 'scan.finished':
+            self._finish(params)
+        elif method == 'scan.stopped':
+            self._running = False
+            self.stopped.emit()
+        elif method == 'scan.error':
+            self._failed(params['message'])
+
+    def _on_disconnected(self):
+        if self._running:
+            self._failed("与扫描服务的连接已断开，扫描可能仍在服务中进行，重新连接后可再次附加")
+
+class ItemSizeModel(QAbstractTableModel):
+    """自定义表格模型，用于显示文件和文件夹大小
+
+    模型自己负责排序：每列的排序排列由 ScanResultStore 计算一次并缓存，
+    切换排序列或升降序只需重新映射行号，不需要逐行调用 data() 比较。
+    每行的样式（着色级别、是否文件夹、是否估算值）在首次显示时算出并按行缓存为一个字节，
+    字体和颜色对象由所有行共用，滚动时 data() 不再创建 QFont / QColor。
+    """
+    # 表格列 -> 排序使用的结果列（None 表示按扫描结果顺序，冷数据列取决于当前阈值）
+    SORT_KEYS = {0: None, 1: 'name', 2: 'type', 3: 'path', 4: 'size', 5: 'size', 6: 'cold', 7: 'root'}
+    COLD_COLUMN = 6
+    ROOT_COLUMN = 7
+    # 各着色级别的文字颜色（见 size_style）
+    FOREGROUND_COLORS = ('#FF6B6B', '#FFA726', '#FFEE58', '#FFFFFF')
+    # 行样式字节：低两位为着色级别
+    _STYLE_LEVEL = 0x03
+    _STYLE_FOLDER = 0x04
+    _STYLE_ESTIMATED = 0x08
+    _STYLE_UNKNOWN = 0xFF
+    # PySide6 中每次按属性取 Qt 枚举成员要数微秒，data() 每次重绘调用上千次，预先取出
+    _DISPLAY_ROLE = Qt.DisplayRole
+    _FOREGROUND_ROLE = Qt.ForegroundRole
+    _TOOLTIP_ROLE = Qt.ToolTipRole
+    _USER_ROLE = Qt.UserRole
+    _FONT_ROLE = Qt.FontRole
+    _HORIZONTAL = Qt.Horizontal
+    # 视图绘制每个单元格时会查询十来种角色，其余角色不查行号直接返回
+    _ROLES = frozenset((_DISPLAY_ROLE, _FOREGROUND_ROLE, _TOOLTIP_ROLE, _USER_ROLE, _FONT_ROLE))
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = ScanResultStore()
+        self.filter_mask = None     # 过滤掩码（bytearray，1表示可见），None表示全部可见
+        self.headers = ['序号', '名称', '类型', '路径', '大小', '百分比', '冷数据', '根目录']
+        self.cold_bucket = 1        # 冷数据列使用的 AGE_BUCKET_DAYS 下标
+        self._sort_column = 4
+        self._sort_order = Qt.DescendingOrder
+        self._view = None           # 按升序排列的可见行号，None表示结果存储顺序
+        self._reversed = True       # 降序时倒序读取 _view
+        self._count = 0
+        self._styles = bytearray()  # 结果存储行号 -> 行样式字节，_STYLE_UNKNOWN 表示尚未计算
+        self._foregrounds = tuple(QColor(color) for color in self.FOREGROUND_COLORS)
+        self._plain_font = QFont()
+        self._bold_font = QFont()   # 文件夹名称加粗
+        self._bold_font.setBold(True)
+        self._italic_font = QFont() # 估算值用斜体
+        self._italic_font.setItalic(True)
+        
+    def rowCount(self, parent=None):
+        return self._count
+    
+    def columnCount(self, parent=None):
+        return len(self.headers)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if role not in self._ROLES or not index.isValid():
+            return None
+        view_row = index.row()
+        if view_row >= self._count:
+            return None
+            
+        store = self.store
+        row = self.row_id(view_row)
+        
+        if role == self._DISPLAY_ROLE:
+            column = index.column()
+            if column == 0:  # 序号
+                return str(view_row + 1)
+            elif column == 1:  # 名称
+                return store.names[row]
+            elif column == 2:  # 类型
+                return store.type_name(row)
+            elif column == 3:  # 路径
+                return store.paths[row]
+            elif column == 4:  # 大小
+                return store.display_size(row)
+            elif column == 5:  # 百分比
+                return self._calculate_percentage(row)
+            elif column == 6:  # 冷数据
+                return format_size(store.cold_sizes[self.cold_bucket][row])
+            elif column == 7:  # 根目录（多根目录扫描）
+                return store.root_name(row)
+                
+        elif role == self._FOREGROUND_ROLE:
+            # 大于10GB 红色，大于1GB 橙色，大于100MB 黄色，其余白色
+            return self._foregrounds[self._row_style(row) & self._STYLE_LEVEL]
+                
+        elif role == self._TOOLTIP_ROLE:
+            return (f"路径: {store.paths[row]}\n大小: {store.display_sizes[row]}\n类型: {store.type_name(row)}\n"
+                    f"{self._estimate_text(row)}{self._age_histogram_text(row)}")
+            
+        elif role == self._USER_ROLE:  # 原始大小数据
+            return store.sizes[row]
+            
+        elif role == self._FONT_ROLE:
+            column = index.column()
+            if column == 1:  # 文件夹名称加粗
+                return self._bold_font if self._row_style(row) & self._STYLE_FOLDER else self._plain_font
+            if column in (4, 5) and self._row_style(row) & self._STYLE_ESTIMATED:
+                return self._italic_font
+            
+        return None
+    
+    def _row_style(self, row):
+        """结果存储第 row 行的样式字节，首次访问时计算"""
+        style = self._styles[row]
+        if style == self._STYLE_UNKNOWN:
+            store = self.store
+            style = size_style(store.sizes[row])
+            if store.types[row] == TYPE_FOLDER:
+                style |= self._STYLE_FOLDER
+            if store.is_estimated(row):
+                style |= self._STYLE_ESTIMATED
+            self._styles[row] = style
+        return style
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == self._HORIZONTAL and role == self._DISPLAY_ROLE:
+            if section == self.COLD_COLUMN:
+                return f"冷数据(>{AGE_BUCKET_DAYS[self.cold_bucket]}天)"
+            return self.headers[section]
+        return None
+    
+    def set_cold_bucket(self, bucket):
+        """切换冷数据列使用的年龄阈值"""
+        self.cold_bucket = bucket
+        self.headerDataChanged.emit(Qt.Horizontal, self.COLD_COLUMN, self.COLD_COLUMN)
+        if self._sort_column == self.COLD_COLUMN:
+            self.sort(self._sort_column, self._sort_order)
+        elif self._count:
+            self.dataChanged.emit(self.index(0, self.COLD_COLUMN),
+                                  self.index(self._count - 1, self.COLD_COLUMN))
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        """使用缓存的排序排列排序，保持选中项"""
+        if column not in self.SORT_KEYS:
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        old_ids = [self.row_id(index.row()) for index in persistent]
+        
+        self._sort_column = column
+        self._sort_order = order
+        self._rebuild_view()
+        
+        if persistent:
+            positions = self._row_positions(set(old_ids))
+            new_indexes = []
+            for index, row_id in zip(persistent, old_ids):
+                row = positions.get(row_id)
+                if row is None:
+                    new_indexes.append(QModelIndex())
+                else:
+                    new_indexes.append(self.index(row, index.column()))
+            self.changePersistentIndexList(persistent, new_indexes)
+        self.layoutChanged.emit()
+    
+    def set_store(self, store):
+        self.beginResetModel()
+        self.store = store
+        self.filter_mask = None
+        self._styles = bytearray([self._STYLE_UNKNOWN]) * len(store)
+        self._rebuild_view()
+        self.endResetModel()
+    
+    def set_filter_mask(self, mask):
+        """设置过滤掩码（每个结果存储行一个字节，1表示可见），None表示显示全部"""
+        self.beginResetModel()
+        self.filter_mask = mask
+        self._rebuild_view()
+        self.endResetModel()
+    
+    def row_id(self, row):
+        """返回模型第 row 行对应的结果存储行号"""
+        if self._reversed:
+            row = self._count - 1 - row
+        if self._view is None:
+            return row
+        return self._view[row]
+    
+    def _rebuild_view(self):
+        """根据排序列和过滤掩码重建可见行排列"""
+        key = self.SORT_KEYS[self._sort_column]
+        if key == 'cold':
+            key = f'cold{self.cold_bucket}'
+        order = self.store.sort_order(key) if key else None
+        mask = self.filter_mask
+        if mask is None:
+            self._view = order
+        else:
+            base = order if order is not None else range(len(self.store))
+            self._view = array('i', compress(base, map(mask.__getitem__, base)))
+        self._reversed = self._sort_order == Qt.DescendingOrder
+        self._count = len(self._view) if self._view is not None else len(self.store)
+    
+    def _row_positions(self, row_ids):
+        """返回指定结果存储行号在当前视图中的行位置"""
+        view = self._view
+        if view is None:
+            found = {row_id: row_id for row_id in row_ids if row_id < self._count}
+        elif len(row_ids) <= 64:
+            # 选中项较少时逐个在数组中查找（C层线性查找）
+            found = {}
+            for row_id in row_ids:
+                try:
+                    found[row_id] = view.index(row_id)
+                except ValueError:
+                    pass
+        else:
+            inverse = dict(zip(view, range(len(view))))
+            found = {row_id: inverse[row_id] for row_id in row_ids if row_id in inverse}
+
+        if self._reversed:
+            last = self._count - 1
+            return {row_id: last - pos for row_id, pos in found.items()}
+        return found
+    
+    def _estimate_text(self, row):
+        """估算值的置信区间说明"""
+        store = self.store
+        if not store.is_estimated(row):
+            return ""
+        error = store.estimate_errors[row]
+        size = store.sizes[row]
+        if error < 0:
+            return f"估算值：至少 {format_size(size)}（尚无下探样本）\n"
+        return (f"估算值：95% 置信区间约 {format_size(max(0, size - error))} ~ "
+                f"{format_size(size + error)}\n")
+    
+    def _age_histogram_text(self, row):
+        """按年龄区间描述行的字节分布"""
+        size = self.store.sizes[row]
+        colds = [column[row] for column in self.store.cold_sizes]
+        bounds = [0] + list(AGE_BUCKET_DAYS)
+        parts = []
+        newer = size
+        for i, cold in enumerate(colds):
+            parts.append(f"  {bounds[i]}-{bounds[i + 1]}天: {format_size(newer - cold)}")
+            newer = cold
+        parts.append(f"  超过{bounds[-1]}天: {format_size(newer)}")
+        return "最后访问/修改时间分布:\n" + "\n".join(parts)
+    
+    def size_bar(self, row):
+        """大小条形图数据（供 SizeBarDelegate 使用）"""
+        row = self.row_id(row)
+        return self.store.sizes[row], self.store.max_size, self.store.display_size(row)
+    
+    def _calculate_percentage(self, row):
+        """计算项目大小占总扫描大小的百分比"""
+        total_size = self.store.total_size
+        if total_size == 0:
+            return "0%"
+            
+        item_size = self.store.sizes[row]
+        percentage = (item_size / total_size) * 100
+        return f"{percentage:.1f}%"
+
+class SizeBarDelegate(QStyledItemDelegate):
+    """自定义委托，显示大小条形图
+
+    模型需提供 size_bar(row)，返回 (字节数, 最大字节数, 显示文本)。
+    背景和条形（含抗锯齿圆角）按 (单元格大小, 条形像素宽度, 着色级别, 设备像素比) 缓存为 QPixmap，
+    重绘时只需贴图并绘制文字；条形宽度按像素取整，缓存项数有限。
+    """
+    BAR_COLORS = ('#FF5252', '#FF9800', '#FFEB3B', '#4CAF50')     # 各着色级别（见 size_style）
+    PIXMAP_CACHE_LIMIT = 4096
+    _ALIGN_CENTER = Qt.AlignCenter
+    
+    def __init__(self, parent=None, column=4):
+        super().__init__(parent)
+        self.column = column    # 绘制条形图的列
+        self._bar_colors = tuple(QColor(color) for color in self.BAR_COLORS)
+        self._background = QColor('#424242')
+        self._text_color = QColor('#FFFFFF')
+        self._pixmaps = {}
+    
+    def paint(self, painter, option, index):
+        if index.column() == self.column:
+            size_bytes, max_size, display_text = index.model().size_bar(index.row())
+            
+            bg_rect = option.rect.adjusted(2, 2, -2, -2)
+            # 条形宽度（像素），没有可比较的最大值时为 -1
+            bar_width = int(size_bytes / max_size * (bg_rect.width() - 4)) if max_size > 0 else -1
+            ratio = painter.device().devicePixelRatioF()
+            key = (bg_rect.width(), bg_rect.height(), bar_width, size_style(size_bytes), ratio)
+            pixmap = self._pixmaps.get(key)
+            if pixmap is None:
+                pixmap = self._render_bar(*key)
+            painter.drawPixmap(bg_rect.topLeft(), pixmap)
+            
+            # 绘制文本
+            painter.save()
+            painter.setPen(self._text_color)
+            painter.drawText(bg_rect, self._ALIGN_CENTER, display_text)
+            painter.restore()
+        else:
+            super().paint(painter, option, index)
+    
+    def _render_bar(self, width, height, bar_width, level, ratio):
+        """绘制背景和条形并缓存"""
+        if len(self._pixmaps) >= self.PIXMAP_CACHE_LIMIT:
+            self._pixmaps.clear()   # 列宽反复调整后才会用满，直接清空即可
+        pixmap = QPixmap(max(1, round(width * ratio)), max(1, round(height * ratio)))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(self._background)
+        if bar_width >= 0:
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            bar_color = self._bar_colors[level]
+            bar_rect = QRect(0, 0, width, height).adjusted(2, 2, -(width - bar_width), -2)
+            painter.fillRect(bar_rect, bar_color)
+            # 添加圆角效果
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(bar_color)
+            painter.drawRoundedRect(bar_rect, 3, 3)
+            painter.end()
+        self._pixmaps[(width, height, bar_width, level, ratio)] = pixmap
+        return pixmap
+
+class BreakdownModel(QAbstractTableModel):
+    """类型分布表格模型（按类别或扩展名）"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []          # (名称, 文件数, 字节数, 显示大小)
+        self.headers = ['类别', '文件数', '大小', '占比']
+        self.total_size = 0
+        self.max_size = 0
+    
+    def rowCount(self, parent=None):
+        return len(self.rows)
+    
+    def columnCount(self, parent=None):
+        return len(self.headers)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        name, count, size, display_size = self.rows[index.row()]
+        
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return name
+            elif index.column() == 1:
+                return f"{count:,}"
+            elif index.column() == 2:
+                return display_size
+            elif index.column() == 3:
+                percentage = size * 100 / self.total_size if self.total_size else 0
+                return f"{percentage:.1f}%"
+        elif role == Qt.TextAlignmentRole and index.column() in (1, 3):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+    
+    def set_rows(self, rows, first_header):
+        self.beginResetModel()
+        self.rows = rows
+        self.headers[0] = first_header
+        self.total_size = sum(r[2] for r in rows)
+        self.max_size = max((r[2] for r in rows), default=0)
+        self.endResetModel()
+        self.headerDataChanged.emit(Qt.Horizontal, 0, 0)
+    
+    def size_bar(self, row):
+        """大小条形图数据（供 SizeBarDelegate 使用）"""
+        _, _, size, display_size = self.rows[row]
+        return size, self.max_size, display_size
+
+class CleanupModel(QAbstractTableModel):
+    """清理建议表格模型（按可回收字节数降序）"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []          # (类别, 路径, 字节数, 文件数, 建议)
+        self.headers = ['类别', '路径', '内容', '可回收', '建议']
+        self.max_size = 0
+    
+    def rowCount(self, parent=None):
+        return len(self.rows)
+    
+    def columnCount(self, parent=None):
+        return len(self.headers)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        category, path, size, count, advice = self.rows[index.row()]
+        
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return category
+            elif index.column() == 1:
+                return path
+            elif index.column() == 2:
+                return "整个文件夹" if count is None else f"{count:,} 个文件"
+            elif index.column() == 3:
+                return format_size(size)
+            elif index.column() == 4:
+                return advice
+        elif role == Qt.ToolTipRole and index.column() in (1, 4):
+            return path if index.column() == 1 else advice
+        elif role == Qt.TextAlignmentRole and index.column() == 2:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+    
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.max_size = max((r[2] for r in rows), default=0)
+        self.endResetModel()
+    
+    def size_bar(self, row):
+        """大小条形图数据（供 SizeBarDelegate 使用）"""
+        size = self.rows[row][2]
+        return size, self.max_size, format_size(size)
+
+class SnapshotDiffModel(QAbstractTableModel):
+    """快照比较结果表格模型"""
+    CHANGE_NAMES = {'added': '新增', 'removed': '删除', 'grown': '增长', 'shrunk': '减少'}
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []       # (变化, 类型, 路径, 原大小, 新大小, 变化量)
+        self.headers = ['变化', '类型', '路径', '原大小', '新大小', '增减']
+    
+    def rowCount(self, parent=None):
+        return len(self.entries)
+    
+    def columnCount(self, parent=None):
+        return len(self.headers)
     
-    def __init__(self, root_path, scan_files=False, scan_folders=True):
-        super().__init__()
-        self.root_path = root_path
-        self._cancelled = False
-        self.scan_files = scan_files
-        self.scan_folders = scan_folders
-        
-    def cancel(self):
-        self._cancelled = True
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.entries):
+            return None
+        change, item_type, path, old_size, new_size, delta = self.entries[index.row()]
+        column = index.column()
         
-    def run(self):
-        try:
-            results = []
-            items = []
-            
-            # 收集所有需要扫描的项目
-            if self.scan_folders:
-                try:
-                    for root, dirs, files in os.walk(self.root_path):
-                        if self._cancelled:
-                            return
-                        items.append((root, 'folder'))
-                        # 限制最大扫描文件夹数量，避免内存问题
-                        if len(items) > 10000:
-                            break
-                except Exception as e:
-                    print(f"遍历文件夹出错: {e}")
-                    items.append((self.root_path, 'folder'))
-            
-            if self.scan_files:
-                try:
-                    for root, dirs, files in os.walk(self.root_path):
-                        if self._cancelled:
-                            return
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            items.append((file_path, 'file'))
-                            # 限制最大扫描文件数量，避免内存问题
-                            if len(items) > 50000:
-                                break
-                        if len(items) > 50000:
-                            break
-                except Exception as e:
-                    print(f"遍历文件出错: {e}")
-            
-            total_items = len(items)
-            
-            # 扫描每个项目
-            for i, (item_path, item_type) in enumerate(items):
-                if self._cancelled:
-                    return
-                    
-                try:
-                    if item_type == 'folder':
-                        # 扫描文件夹大小
-                        item_size = self._get_folder_size(item_path)
-                        result = {
-                            'type': 'folder',
-                            'path': item_path,
-                            'name': os.path.basename(item_path) if item_path != self.root_path else os.path.splitdrive(item_path)[0] + '根目录',
-                            'size': item_size,
-                            'display_size': self._format_size(item_size),
-                            'level': item_path.count(os.sep) - self.root_path.count(os.sep)
-                        }
-                    else:
-                        # 扫描文件大小
-                        item_size = os.path.getsize(item_path)
-                        result = {
-                            'type': 'file',
-                            'path': item_path,
-                            'name': os.path.basename(item_path),
-                            'size': item_size,
-                            'display_size': self._format_size(item_size),
-                            'level': item_path.count(os.sep) - self.root_path.count(os.sep)
-                        }
-                    
-                    results.append(result)
-                    
-                    # 更新进度
-                    progress = int((i + 1) * 100 / total_items) if total_items > 0 else 0
-                    self.progress.emit(item_path, i + 1, total_items)
-                    
-                except (PermissionError, OSError) as e:
-                    continue
-                except Exception as e:
-                    print(f"扫描项目 {item_path} 出错: {e}")
-                    continue
-            
-            # 按大小排序
-            results.sort(key=lambda x: x['size'], reverse=True)
-            
-            if not self._cancelled:
-                self.finished.emit(results)
-                
-        except Exception as e:
-            self.error.emit(str(e))
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return self.CHANGE_NAMES[change]
+            elif column == 1:
+                return "文件夹" if item_type == TYPE_FOLDER else "文件"
+            elif column == 2:
+                return path
+            elif column == 3:
+                return format_size(old_size) if change != 'added' else "-"
+            elif column == 4:
+                return format_size(new_size) if change != 'removed' else "-"
+            elif column == 5:
+                sign = '+' if delta >= 0 else '-'
+                return f"{sign}{format_size(abs(delta))}"
+        elif role == Qt.ForegroundRole and column in (0, 5):
+            return QColor('#FF7B7B') if delta > 0 else QColor('#6FE3A1')
+        elif role == Qt.TextAlignmentRole and column in (3, 4, 5):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        elif role == Qt.ToolTipRole and column == 2:
+            return path
+        return None
     
-    def _get_folder_size(self, folder_path):
-        """获取文件夹大小"""
-        total_size = 0
-        
-        try:
-            # 使用os.walk方法递归计算所有文件大小
-            for dirpath, dirnames, filenames in os.walk(folder_path):
-                if self._cancelled:
-                    return 0
-                for filename in filenames:
-                    try:
-                        filepath = os.path.join(dirpath, filename)
-                        total_size += os.path.getsize(filepath)
-                    except (OSError, PermissionError):
-                        continue
-        except (PermissionError, OSError):
-            try:
-                # 尝试使用os.scandir递归计算
-                for entry in os.scandir(folder_path):
-                    if self._cancelled:
-                        return 0
-                        
-                    try:
-                        if entry.is_file():
-                            total_size += entry.stat().st_size
-                        elif entry.is_dir():
-                            # 递归计算子目录大小
-                            try:
-                                total_size += self._get_folder_size(entry.path)
-                            except:
-                                pass
-                    except (OSError, PermissionError):
-                        continue
-            except:
-                return 0
-            
-        return total_size
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+    
+    def set_entries(self, entries):
+        self.beginResetModel()
+        self.entries = entries
+        self.endResetModel()
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        keys = {0: lambda e: e[0], 1: lambda e: e[1], 2: lambda e: os.path.normcase(e[2]),
+                3: lambda e: e[3], 4: lambda e: e[4], 5: lambda e: e[5]}
+        self.layoutAboutToBeChanged.emit()
+        self.entries.sort(key=keys[column], reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
+
+class FolderCompareModel(QAbstractTableModel):
+    """文件夹比较结果表格模型：每个根目录一列大小"""
+    STATUS_NAMES = {'differs': '不同', 'missing': '缺失'}
     
-    def _format_size(self, size_bytes):
-        """格式化文件大小显示"""
-        if size_bytes == 0:
-            return "0 B"
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.roots = []
+        self.entries = []       # (状态, 类型, 相对路径, 各根目录大小（缺失为 None）, 差值)
+        self.headers = ['状态', '类型', '相对路径', '差值']
+    
+    def rowCount(self, parent=None):
+        return len(self.entries)
+    
+    def columnCount(self, parent=None):
+        return len(self.headers)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.entries):
+            return None
+        status, item_type, path, sizes, spread = self.entries[index.row()]
+        column = index.column()
+        size_column = column - 3
         
-        size_names = ("B", "KB", "MB", "GB", "TB")
-        i = 0
-        while size_bytes >= 1024 and i < len(size_names) - 1:
-            size_bytes /= 1024.0
-            i += 1
-        
-        if i == 0:
-            return f"{int(size_bytes)} B"
-        elif i == 1:
-            return f"{size_bytes:.1f} KB"
-        elif i == 2:
-            return f"{size_bytes:.1f} MB"
-        elif i == 3:
-            return f"{size_bytes:.2f} GB"
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return self.STATUS_NAMES[status]
+            elif column == 1:
+                return "文件夹" if item_type == TYPE_FOLDER else "文件"
+            elif column == 2:
+                return path or "（根目录）"
+            elif size_column < len(sizes):
+                size = sizes[size_column]
+                return "—" if size is None else format_size(size)
+            else:
+                return format_size(spread)
+        elif role == Qt.ForegroundRole:
+            if column == 0:
+                return QColor('#FF7B7B') if status == 'missing' else QColor('#FFD166')
+            if 0 <= size_column < len(sizes) and sizes[size_column] is None:
+                return QColor('#FF7B7B')
+        elif role == Qt.TextAlignmentRole and column >= 3:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        elif role == Qt.ToolTipRole and column == 2:
+            return "\n".join(os.path.join(root, path) for root in self.roots)
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            if role == Qt.DisplayRole:
+                return self.headers[section]
+            if role == Qt.ToolTipRole and 3 <= section < 3 + len(self.roots):
+                return self.roots[section - 3]
+        return None
+    
+    def set_comparison(self, comparison):
+        """显示 compare_roots 的结果；comparison 为 None 时清空"""
+        self.beginResetModel()
+        if comparison is None:
+            self.roots, self.entries = [], []
         else:
-            return f"{size_bytes:.2f} TB"
+            self.roots, self.entries = comparison['roots'], comparison['entries']
+        self.headers = (['状态', '类型', '相对路径']
+                        + [f"#{i} {os.path.basename(root.rstrip(os.sep)) or root}"
+                           for i, root in enumerate(self.roots, 1)]
+                        + ['差值'])
+        self.endResetModel()
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column < 3:
+            key = [lambda e: e[0], lambda e: e[1], lambda e: os.path.normcase(e[2])][column]
+        elif column - 3 < len(self.roots):
+            key = lambda e: -1 if e[3][column - 3] is None else e[3][column - 3]
+        else:
+            key = lambda e: e[4]
+        self.layoutAboutToBeChanged.emit()
+        self.entries.sort(key=key, reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
 
-class ItemSizeModel(QAbstractTableModel):
-    """自定义表格模型，用于显示文件和文件夹大小"""
+class TrendModel(QAbstractTableModel):
+    """增长趋势表格模型"""
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.items = []
-        self.headers = ['序号', '名称', '类型', '路径', '大小', '百分比']
-        
+        self.rows = []          # (文件夹编号, 路径, 当前大小, 增长字节, 每天增长字节, 大小序列)
+        self.headers = ['路径', '当前大小', '增长', '每天', '趋势']
+    
     def rowCount(self, parent=None):
-        return len(self.items)
+        return len(self.rows)
     
     def columnCount(self, parent=None):
         return len(self.headers)
     
+    def _signed(self, value):
+        return f"{'+' if value >= 0 else '-'}{format_size(abs(int(value)))}"
+    
     def data(self, index, role=Qt.DisplayRole):
-        if not index.isValid() or index.row() >= len(self.items):
+        if not index.isValid() or index.row() >= len(self.rows):
             return None
-            
-        item = self.items[index.row()]
+        _, path, size, delta, rate, series = self.rows[index.row()]
+        column = index.column()
         
         if role == Qt.DisplayRole:
-            if index.column() == 0:  # 序号
-                return str(index.row() + 1)
-            elif index.column() == 1:  # 名称
-                return item.get('name', '')
-            elif index.column() == 2:  # 类型
-                return "文件夹" if item.get('type') == 'folder' else "文件"
-            elif index.column() == 3:  # 路径
-                return item.get('path', '')
-            elif index.column() == 4:  # 大小
-                return item.get('display_size', '')
-            elif index.column() == 5:  # 百分比
-                return self._calculate_percentage(index.row())
-                
-        elif role == Qt.ForegroundRole:
-            size_gb = item.get('size', 0) / (1024**3)
-            if size_gb > 10:  # 大于10GB
-                return QColor('#FF6B6B')  # 红色
-            elif size_gb > 1:  # 大于1GB
-                return QColor('#FFA726')  # 橙色
-            elif size_gb > 0.1:  # 大于100MB
-                return QColor('#FFEE58')  # 黄色
-            else:
-                return QColor('#FFFFFF')
-                
+            if column == 0:
+                return path
+            elif column == 1:
+                return format_size(size)
+            elif column == 2:
+                return self._signed(delta)
+            elif column == 3:
+                return self._signed(rate)
+        elif role == Qt.UserRole and column == 4:
+            return series
+        elif role == Qt.ForegroundRole and column in (2, 3) and delta:
+            return QColor('#FF7B7B') if delta > 0 else QColor('#6FE3A1')
+        elif role == Qt.TextAlignmentRole and column in (1, 2, 3):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
         elif role == Qt.ToolTipRole:
-            return f"路径: {item.get('path', '')}\n大小: {item.get('display_size', '')}\n类型: {'文件夹' if item.get('type') == 'folder' else '文件'}"
-            
-        elif role == Qt.UserRole:  # 用于排序的原始大小数据
-            return item.get('size', 0)
-            
-        elif role == Qt.FontRole and index.column() == 1:  # 文件夹名称加粗
-            font = QFont()
-            if item.get('type') == 'folder':
-                font.setBold(True)
-            return font
-            
+            return f"{path}\n最近 {len(series)} 次扫描: " + " → ".join(format_size(v) for v in series[-6:])
         return None
     
     def headerData(self, section, orientation, role=Qt.DisplayRole):
@@ -243,93 +5433,407 @@ class ItemSizeModel(QAbstractTableModel):
             return self.headers[section]
         return None
     
-    def set_items(self, items):
+    def set_rows(self, rows):
         self.beginResetModel()
-        self.items = items
+        self.rows = rows
         self.endResetModel()
-    
-    def _calculate_percentage(self, row_index):
-        """计算项目大小占总扫描大小的百分比"""
-        if not self.items or row_index >= len(self.items):
-            return "0%"
-        
-        total_size = sum(f.get('size', 0) for f in self.items)
-        if total_size == 0:
-            return "0%"
-            
-        item_size = self.items[row_index].get('size', 0)
-        percentage = (item_size / total_size) * 100
-        return f"{percentage:.1f}%"
 
-class SizeBarDelegate(QStyledItemDelegate):
-    """自定义委托，显示大小条形图"""
+class SparklineDelegate(QStyledItemDelegate):
+    """绘制迷你折线图，数据为模型 UserRole 返回的数值序列"""
     def paint(self, painter, option, index):
-        if index.column() == 4:  # 大小列（现在是第5列，索引为4）
-            # 获取原始模型和索引
-            proxy_model = index.model()
-            source_model = proxy_model.sourceModel()
-            source_index = proxy_model.mapToSource(index)
-            
-            if not source_index.isValid():
-                super().paint(painter, option, index)
-                return
-            
-            # 获取原始大小数据
-            item_data = source_model.items[source_index.row()]
-            size_bytes = item_data.get('size', 0)
-            
-            # 计算最大值用于比例
-            max_size = max((f.get('size', 0) for f in source_model.items), default=1)
-            
-            # 绘制背景
-            painter.save()
-            painter.setRenderHint(QPainter.Antialiasing)
-            
-            # 绘制背景矩形
-            bg_rect = option.rect.adjusted(2, 2, -2, -2)
-            painter.fillRect(bg_rect, QColor('#424242'))
-            
-            # 计算条形图宽度
-            if max_size > 0:
-                percentage = size_bytes / max_size
-                bar_width = int(percentage * (bg_rect.width() - 4))
-                
-                # 根据大小设置颜色
-                size_gb = size_bytes / (1024**3)
-                if size_gb > 10:
-                    bar_color = QColor('#FF5252')
-                elif size_gb > 1:
-                    bar_color = QColor('#FF9800')
-                elif size_gb > 0.1:
-                    bar_color = QColor('#FFEB3B')
-                else:
-                    bar_color = QColor('#4CAF50')
-                
-                # 绘制条形图
-                bar_rect = bg_rect.adjusted(2, 2, -(bg_rect.width() - bar_width), -2)
-                painter.fillRect(bar_rect, bar_color)
-                
-                # 添加圆角效果
-                painter.setPen(Qt.NoPen)
-                painter.setBrush(bar_color)
-                painter.drawRoundedRect(bar_rect, 3, 3)
+        series = index.data(Qt.UserRole)
+        if not series or len(series) < 2:
+            super().paint(painter, option, index)
+            return
+        
+        rect = QRectF(option.rect.adjusted(6, 5, -6, -5))
+        low, high = min(series), max(series)
+        span = (high - low) or 1
+        step = rect.width() / (len(series) - 1)
+        points = [QPointF(rect.left() + i * step, rect.bottom() - (value - low) / span * rect.height())
+                  for i, value in enumerate(series)]
+        
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        color = QColor('#FF7B7B') if series[-1] > series[0] else QColor('#6FE3A1') \
+            if series[-1] < series[0] else QColor('#888888')
+        pen = QPen(color)
+        pen.setWidthF(1.5)
+        painter.setPen(pen)
+        painter.drawPolyline(points)
+        painter.setBrush(color)
+        painter.drawEllipse(points[-1], 2, 2)
+        painter.restore()
+
+class TreemapLayoutWorker(QThread):
+    """在后台线程中计算 squarified 树状图布局并绘制到 QImage
+
+    面积小于 MIN_TILE_AREA 像素的子项合并为一个“其他”块，不再细分，
+    因此布局和绘制的块数受窗口像素数限制，而与结果数量无关。
+    """
+    finished = Signal(int, object, object, float, float)  # 请求编号, 图像, 块列表, 布局耗时ms, 绘制耗时ms
+    
+    MIN_TILE_AREA = 16      # 最小块面积（像素）
+    PADDING = 2             # 文件夹块内边距
+    HEADER = 14             # 足够大的文件夹块顶部留出名称栏
+    
+    # 伪行号：未单独记录的文件、被合并的小块
+    FILES = -2
+    OTHER = -3
+    
+    def __init__(self, generation, store, root, width, height):
+        super().__init__()
+        self.generation = generation
+        self.store = store
+        self.root = root            # 根行号，-1 表示扫描根的顶层
+        self.width = width
+        self.height = height
+        self._cancelled = False
+    
+    def cancel(self):
+        self._cancelled = True
+    
+    def run(self):
+        start = time.perf_counter()
+        tiles = self._layout()
+        layout_ms = (time.perf_counter() - start) * 1000
+        if self._cancelled:
+            return
+        
+        start = time.perf_counter()
+        image = self._render(tiles)
+        paint_ms = (time.perf_counter() - start) * 1000
+        if not self._cancelled:
+            self.finished.emit(self.generation, image, tiles, layout_ms, paint_ms)
+    
+    def _layout(self):
+        """返回块列表 [(x, y, w, h, 行号, 深度, 顶层分支序号)]，父块在子块之前"""
+        store = self.store
+        sizes = store.sizes
+        children = store.children()
+        tiles = []
+        
+        root = self.root
+        root_rows = children.get(root, [])
+        extra = 0
+        if root >= 0:
+            extra = sizes[root] - sum(sizes[r] for r in root_rows)
+        
+        jobs = [(root_rows, extra, 0.0, 0.0, float(self.width), float(self.height), 0, -1)]
+        while jobs:
+            if self._cancelled:
+                return tiles
+            rows, extra, x, y, w, h, depth, branch = jobs.pop()
+            for (rx, ry, rw, rh), row, index in self._squarify_children(rows, extra, x, y, w, h):
+                tile_branch = index if depth == 0 else branch
+                tiles.append((rx, ry, rw, rh, row, depth, tile_branch))
+                if row < 0 or store.types[row] != TYPE_FOLDER:
+                    continue
+                sub_rows = children.get(row)
+                if not sub_rows:
+                    continue
+                # 内缩后继续细分；块足够高时留出名称栏
+                pad = self.PADDING
+                top = self.HEADER if rh > self.HEADER * 3 and rw > 60 else pad
+                cw, ch = rw - 2 * pad, rh - top - pad
+                if cw * ch < self.MIN_TILE_AREA * 4 or cw < 4 or ch < 4:
+                    continue
+                sub_extra = sizes[row] - sum(sizes[r] for r in sub_rows)
+                jobs.append((sub_rows, sub_extra, rx + pad, ry + top, cw, ch, depth + 1, tile_branch))
+        return tiles
+    
+    def _squarify_children(self, rows, extra, x, y, w, h):
+        """对一组子项做 squarify 布局，返回 [(矩形, 行号, 序号)]"""
+        sizes = self.store.sizes
+        total = sum(sizes[r] for r in rows) + max(extra, 0)
+        if total <= 0 or w <= 0 or h <= 0:
+            return []
+        scale = w * h / total
+        min_value = self.MIN_TILE_AREA / scale
+        
+        # 子项已按大小降序；过小的子项合并为“其他”
+        items = []
+        other = 0
+        for row in rows:
+            value = sizes[row]
+            if value >= min_value:
+                items.append((value, row))
+            else:
+                other += value
+        if extra > 0:
+            if extra >= min_value:
+                items.append((extra, self.FILES))
+            else:
+                other += extra
+        if other >= min_value:
+            items.append((other, self.OTHER))
+        items.sort(key=lambda item: item[0], reverse=True)
+        if not items:
+            return []
+        
+        areas = [value * scale for value, _ in items]
+        rects = self._squarify(areas, x, y, w, h)
+        return [(rect, row, i) for i, (rect, (_, row)) in enumerate(zip(rects, items))]
+    
+    @staticmethod
+    def _squarify(areas, x, y, w, h):
+        """Bruls 等人的 squarified 算法，areas 已按降序排列且总和为 w*h"""
+        rects = []
+        i, n = 0, len(areas)
+        while i < n:
+            short = min(w, h)
+            if short <= 0:
+                break
+            short2 = short * short
+            row_sum = areas[i]
+            row_max = areas[i]
+            worst = max(short2 * row_max / (row_sum * row_sum), (row_sum * row_sum) / (short2 * row_max))
+            j = i + 1
+            while j < n:
+                value = areas[j]
+                new_sum = row_sum + value
+                new_sum2 = new_sum * new_sum
+                new_worst = max(short2 * row_max / new_sum2, new_sum2 / (short2 * value))
+                if new_worst > worst:
+                    break
+                row_sum, worst = new_sum, new_worst
+                j += 1
             
-            # 绘制文本
-            display_text = item_data.get('display_size', '')
-            painter.setPen(QColor('#FFFFFF'))
-            painter.drawText(bg_rect, Qt.AlignCenter, display_text)
+            thickness = row_sum / short
+            if w >= h:
+                # 沿左侧竖排一列
+                cy = y
+                for value in areas[i:j]:
+                    length = value / thickness
+                    rects.append((x, cy, thickness, length))
+                    cy += length
+                x += thickness
+                w -= thickness
+            else:
+                # 沿顶部横排一行
+                cx = x
+                for value in areas[i:j]:
+                    length = value / thickness
+                    rects.append((cx, y, length, thickness))
+                    cx += length
+                y += thickness
+                h -= thickness
+            i = j
+        return rects
+    
+    def _render(self, tiles):
+        image = QImage(max(1, self.width), max(1, self.height), QImage.Format_RGB32)
+        image.fill(QColor('#121212'))
+        painter = QPainter(image)
+        border = QPen(QColor('#121212'))
+        border.setWidth(1)
+        painter.setPen(border)
+        font = QFont()
+        font.setPointSize(8)
+        painter.setFont(font)
+        metrics = QFontMetrics(font)
+        
+        store = self.store
+        colors = {}
+        for x, y, w, h, row, depth, branch in tiles:
+            if row == self.OTHER:
+                key = ('other', depth)
+            elif row == self.FILES or store.types[row] == TYPE_FILE:
+                key = (branch, depth, 'file')
+            else:
+                key = (branch, depth)
+            color = colors.get(key)
+            if color is None:
+                color = colors[key] = self._tile_color(key)
+            rect = QRectF(x, y, w, h)
+            painter.fillRect(rect, color)
+            if w >= 3 and h >= 3:
+                painter.drawRect(rect)
             
-            painter.restore()
+            # 足够大的块绘制名称
+            if w >= 50 and h >= 14 and row != self.OTHER:
+                name = "(文件)" if row == self.FILES else store.names[row]
+                painter.setPen(QColor('#F0F0F0'))
+                text = metrics.elidedText(name, Qt.ElideRight, int(w) - 6)
+                painter.drawText(QRectF(x + 3, y + 1, w - 6, 13), Qt.AlignLeft | Qt.AlignVCenter, text)
+                painter.setPen(border)
+        painter.end()
+        return image
+    
+    @staticmethod
+    def _tile_color(key):
+        if key[0] == 'other':
+            return QColor('#4A4A4A')
+        branch, depth = key[0], key[1]
+        hue = (branch * 47) % 360 if branch >= 0 else 0
+        lightness = max(60, 150 - depth * 14)
+        if len(key) == 3:  # 文件块更亮一些
+            lightness = min(190, lightness + 30)
+        return QColor.fromHsl(hue, 110, lightness)
+
+class TreemapWidget(QWidget):
+    """树状图视图：显示后台线程绘制好的缓存图像，左键放大子文件夹，右键返回上一级"""
+    root_changed = Signal(int)          # 当前根行号（-1 为扫描根）
+    layout_done = Signal(int, float, float)  # 块数, 布局耗时ms, 绘制耗时ms
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = None
+        self.root = -1
+        self.top_root = -1
+        self._image = None
+        self._tiles = []
+        self._generation = 0
+        self._workers = []
+        self.setMouseTracking(True)
+        self.setMinimumSize(200, 150)
+        self._relayout_timer = QTimer(self)
+        self._relayout_timer.setSingleShot(True)
+        self._relayout_timer.setInterval(120)
+        self._relayout_timer.timeout.connect(self.request_layout)
+    
+    def set_store(self, store):
+        self.store = store
+        # 顶层只有扫描根文件夹一项时直接从它开始显示
+        self.top_root = -1
+        if store is not None:
+            top_rows = store.top_rows()
+            if len(top_rows) == 1 and store.types[top_rows[0]] == TYPE_FOLDER:
+                self.top_root = top_rows[0]
+        self.set_root(self.top_root)
+    
+    def set_root(self, row):
+        self.root = row
+        self.root_changed.emit(row)
+        self.request_layout()
+    
+    def zoom_out(self):
+        if self.store is not None and self.root != self.top_root:
+            self.set_root(self.store.parents[self.root])
+    
+    def request_layout(self):
+        """取消正在进行的布局并提交新的布局请求"""
+        for worker in self._workers:
+            worker.cancel()
+        # 只保留仍在运行的线程引用，避免线程对象在运行中被回收
+        self._workers = [w for w in self._workers if w.isRunning()]
+        self._generation += 1
+        if self.store is None or not len(self.store) or not self.isVisible():
+            self._image = None
+            self._tiles = []
+            self.update()
+            return
+        worker = TreemapLayoutWorker(self._generation, self.store, self.root,
+                                     self.width(), self.height())
+        worker.finished.connect(self._on_layout_finished)
+        self._workers.append(worker)
+        worker.start()
+    
+    def _on_layout_finished(self, generation, image, tiles, layout_ms, paint_ms):
+        if generation != self._generation:
+            return
+        self._image = image
+        self._tiles = tiles
+        self.update()
+        self.layout_done.emit(len(tiles), layout_ms, paint_ms)
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self._image is None:
+            painter.fillRect(self.rect(), QColor('#1E1E1E'))
+            painter.setPen(QColor('#888888'))
+            painter.drawText(self.rect(), Qt.AlignCenter, "扫描完成后在此显示树状图")
+        elif self._image.size() == self.size():
+            painter.drawImage(0, 0, self._image)
         else:
-            super().paint(painter, option, index)
+            # 尺寸变化后、新布局完成前先缩放显示旧图像
+            painter.drawImage(self.rect(), self._image)
+        painter.end()
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._relayout_timer.start()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._image is None or self._image.size() != self.size():
+            self._relayout_timer.start()
+    
+    def tile_at(self, pos, top_level=False):
+        """返回坐标处最深的块（top_level 为真时返回第一层块）"""
+        px, py = pos.x(), pos.y()
+        found = None
+        for tile in self._tiles:
+            x, y, w, h, row, depth = tile[:6]
+            if x <= px < x + w and y <= py < y + h:
+                if top_level:
+                    if depth == 0:
+                        return tile
+                elif found is None or depth >= found[5]:
+                    found = tile
+        return found
+    
+    def mousePressEvent(self, event):
+        if self.store is None:
+            return
+        if event.button() == Qt.RightButton:
+            self.zoom_out()
+        elif event.button() == Qt.LeftButton:
+            tile = self.tile_at(event.position().toPoint(), top_level=True)
+            if tile and tile[4] >= 0 and self.store.types[tile[4]] == TYPE_FOLDER \
+                    and self.store.children().get(tile[4]):
+                self.set_root(tile[4])
+    
+    def mouseMoveEvent(self, event):
+        if self.store is None:
+            return
+        pos = event.position().toPoint()
+        tile = self.tile_at(pos)
+        if tile is None:
+            QToolTip.hideText()
+            return
+        row = tile[4]
+        if row == TreemapLayoutWorker.OTHER:
+            text = "（多个较小的项目）"
+        elif row == TreemapLayoutWorker.FILES:
+            text = "（未单独列出的文件）"
+        else:
+            text = f"{self.store.paths[row]}\n{self.store.display_sizes[row]}"
+        QToolTip.showText(event.globalPosition().toPoint(), text, self)
 
 class DarkDiskSpaceAnalyzer(QMainWindow):
+    disks_loaded = Signal(int)      # 磁盘列表加载完成（列表项数）
+    
     def __init__(self):
         super().__init__()
         self.scanner_thread = None
         self.current_scan_path = ""
+        self.search_index = None
+        self.search_mask = None         # 搜索框过滤掩码
+        self.expression_mask = None     # 过滤表达式掩码
+        self.breakdown = None           # 最近一次扫描的类型分布
+        self.cleanup = None             # 最近一次扫描的清理候选（CleanupCandidates）
+        self.scan_stats = None          # 最近一次扫描的诊断数据（ScanStats）
+        self.snapshot_thread = None     # 正在保存或比较快照的线程
+        self.ncdu_thread = None         # 正在导入或导出 ncdu 文件的线程
+        self.trend_thread = None        # 正在写入增长趋势的线程
+        self._exact_after_stop = False  # 估算停止后改为精确扫描
+        self.delete_thread = None       # 正在删除到回收站的线程
+        self.delete_progress = None
+        self.delete_store = None
+        self.service_client = ScanServiceClient(self)   # 后台扫描服务连接
+        self.background = BackgroundCalls(parent=self)  # 可能卡住的磁盘查询和列目录
+        self.disk_usage = {}            # 挂载点 -> 分区用量（无响应为 None）
+        self._disk_generation = 0       # 每次加载磁盘列表加一，忽略过期的查询结果
+        self._disks_pending = None      # 尚未返回的分区用量查询数
+        self._default_disk = None       # 磁盘列表加载后优先选中的磁盘
+        self._choose_default_disk = False
+        self._service_retries = 0       # 启动服务后等待其监听的剩余重试次数
+        format_size.load_settings()
         self.init_ui()
         self.load_disks()
+        if self.service_checkbox.isChecked():
+            self.connect_service(launch=True)
         
     def init_ui(self):
         """初始化用户界面 - 夜晚模式"""
@@ -384,36 +5888,100 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
         self.scan_folders_checkbox.setChecked(True)  # 默认扫描文件夹
         control_layout.addWidget(self.scan_folders_checkbox, 0, 5)
         
+        # 扫描优先级（低优先级/后台模式会限速并降低线程的 CPU 和 I/O 优先级）
+        self.priority_combo = QComboBox()
+        self.priority_combo.setObjectName("diskCombo")
+        for key, (label, _, _, dir_rate, stat_rate) in SCAN_PRIORITIES.items():
+            self.priority_combo.addItem(f"🐢 {label}" if dir_rate else f"⚡ {label}", key)
+            if dir_rate:
+                self.priority_combo.setItemData(self.priority_combo.count() - 1,
+                                                f"每秒最多 {dir_rate:,} 个目录、{stat_rate:,} 次 stat，I/O 繁忙时自动降速",
+                                                Qt.ToolTipRole)
+        index = self.priority_combo.findData(QSettings().value("scan/priority", "normal"))
+        self.priority_combo.setCurrentIndex(max(index, 0))
+        self.priority_combo.currentIndexChanged.connect(
+            lambda: QSettings().setValue("scan/priority", self.priority_combo.currentData()))
+        control_layout.addWidget(self.priority_combo, 0, 6)
+        
+        # 扫描模式：精确扫描，或在限定时间内抽样估算
+        self.mode_combo = QComboBox()
+        self.mode_combo.setObjectName("diskCombo")
+        self.mode_combo.addItem("🎯 精确扫描", 0)
+        for seconds, label in ((30, "30 秒"), (120, "2 分钟"), (600, "10 分钟")):
+            self.mode_combo.addItem(f"⏱️ 估算 {label}", seconds)
+            self.mode_combo.setItemData(self.mode_combo.count() - 1,
+                                        f"在 {label}内抽样估算各文件夹大小（只统计文件夹，带置信区间）",
+                                        Qt.ToolTipRole)
+        index = self.mode_combo.findData(int(QSettings().value("scan/estimate_budget", 0)))
+        self.mode_combo.setCurrentIndex(max(index, 0))
+        self.mode_combo.currentIndexChanged.connect(
+            lambda: QSettings().setValue("scan/estimate_budget", self.mode_combo.currentData()))
+        control_layout.addWidget(self.mode_combo, 0, 7)
+        
+        # 在后台扫描服务中扫描：关闭窗口后扫描继续，其他窗口可附加到同一扫描
+        self.service_checkbox = QCheckBox("🛰️ 后台服务")
+        self.service_checkbox.setToolTip("扫描交给后台服务进程（不存在时自动启动），关闭窗口后扫描继续")
+        self.service_checkbox.setChecked(QSettings().value("service/enabled", False, type=bool))
+        self.service_checkbox.toggled.connect(self.on_service_toggled)
+        control_layout.addWidget(self.service_checkbox, 0, 8)
+        
+        self.attach_button = QPushButton("📡 附加")
+        self.attach_button.setToolTip("查看后台服务中进行中或已完成的扫描并附加")
+        self.attach_button.clicked.connect(self.attach_service_scan)
+        self.attach_button.setFixedWidth(80)
+        control_layout.addWidget(self.attach_button, 0, 9)
+        
         # 中间留空（拉伸）
-        control_layout.setColumnStretch(6, 1)
+        control_layout.setColumnStretch(10, 1)
         
         # 右边操作按钮
         self.scan_button = QPushButton("🔍 开始扫描")
         self.scan_button.clicked.connect(self.start_scan)
         self.scan_button.setFixedWidth(120)
         self.scan_button.setObjectName("scanButton")
-        control_layout.addWidget(self.scan_button, 0, 7)
+        control_layout.addWidget(self.scan_button, 0, 11)
+        
+        self.exact_button = QPushButton("🎯 精确扫描")
+        self.exact_button.clicked.connect(self.start_exact_scan)
+        self.exact_button.setFixedWidth(120)
+        self.exact_button.setToolTip("停止估算并对同一路径做精确扫描")
+        self.exact_button.setVisible(False)     # 估算扫描进行中或完成后显示
+        control_layout.addWidget(self.exact_button, 0, 12)
+        
+        self.pause_button = QPushButton("⏸️ 暂停")
+        self.pause_button.clicked.connect(self.toggle_pause)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setFixedWidth(100)
+        self.pause_button.setObjectName("pauseButton")
+        control_layout.addWidget(self.pause_button, 0, 13)
         
         self.stop_button = QPushButton("⏹️ 停止扫描")
         self.stop_button.clicked.connect(self.stop_scan)
         self.stop_button.setEnabled(False)
         self.stop_button.setFixedWidth(120)
         self.stop_button.setObjectName("stopButton")
-        control_layout.addWidget(self.stop_button, 0, 8)
+        control_layout.addWidget(self.stop_button, 0, 14)
         
         self.export_button = QPushButton("💾 导出列表")
-        self.export_button.clicked.connect(self.export_to_excel)
+        export_menu = QMenu(self.export_button)
+        excel_action = QAction("📊 导出 Excel（当前列表）", self)
+        excel_action.triggered.connect(self.export_to_excel)
+        export_menu.addAction(excel_action)
+        ncdu_action = QAction("📤 导出 ncdu JSON（完整结果，可用 ncdu -f 打开）", self)
+        ncdu_action.triggered.connect(self.export_ncdu)
+        export_menu.addAction(ncdu_action)
+        self.export_button.setMenu(export_menu)
         self.export_button.setFixedWidth(120)
         self.export_button.setObjectName("exportButton")
         self.export_button.setEnabled(False)  # 初始禁用，扫描完成后启用
-        control_layout.addWidget(self.export_button, 0, 9)
+        control_layout.addWidget(self.export_button, 0, 15)
         
         # 进度条
         self.progress_bar = QProgressBar()
         self.progress_bar.setFixedHeight(15)
         self.progress_bar.setTextVisible(True)
         self.progress_bar.setObjectName("progressBar")
-        control_layout.addWidget(self.progress_bar, 1, 0, 1, 10)
+        control_layout.addWidget(self.progress_bar, 1, 0, 1, 16)
         
         main_layout.addWidget(control_frame)
         
@@ -454,10 +6022,64 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
         right_layout.setContentsMargins(0, 0, 0, 0)
         right_layout.setSpacing(0)
         
-        list_label = QLabel("📊 文件夹大小排序")
-        list_label.setObjectName("sectionLabel")
-        list_label.setFixedHeight(30)
-        right_layout.addWidget(list_label)
+        # 结果标签页
+        self.result_tabs = QTabWidget()
+        self.result_tabs.setObjectName("resultTabs")
+        right_layout.addWidget(self.result_tabs)
+        
+        # ---- 文件夹大小排序 ----
+        table_page = QWidget()
+        table_layout = QVBoxLayout(table_page)
+        table_layout.setContentsMargins(0, 6, 0, 0)
+        table_layout.setSpacing(6)
+        
+        # 搜索框（基于扫描时构建的索引，输入时即时过滤）和过滤表达式
+        filter_layout = QHBoxLayout()
+        filter_layout.setSpacing(6)
+        
+        self.search_edit = QLineEdit()
+        self.search_edit.setObjectName("searchEdit")
+        self.search_edit.setPlaceholderText("🔎 搜索名称，或输入路径前缀（包含路径分隔符）")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.on_search_text_changed)
+        filter_layout.addWidget(self.search_edit, 2)
+        
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setObjectName("searchEdit")
+        self.filter_edit.setPlaceholderText("⚗️ 过滤（回车应用）: size>1G mtime>180d ext:iso,vmdk path:/data/*")
+        self.filter_edit.setToolTip(FilterExpression.__doc__)
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.returnPressed.connect(self.apply_filter_expression)
+        self.filter_edit.textChanged.connect(self.on_filter_text_changed)
+        filter_layout.addWidget(self.filter_edit, 3)
+        
+        # 冷数据阈值（表格冷数据列按此阈值统计和排序）
+        self.cold_combo = QComboBox()
+        self.cold_combo.setObjectName("diskCombo")
+        for days in AGE_BUCKET_DAYS:
+            self.cold_combo.addItem(f"❄️ 超过{days}天未使用", days)
+        self.cold_combo.setCurrentIndex(1)
+        self.cold_combo.currentIndexChanged.connect(self.on_cold_bucket_changed)
+        filter_layout.addWidget(self.cold_combo)
+        
+        # 大小显示单位：1024 或 1000 进位，自动或固定单位
+        self.unit_combo = QComboBox()
+        self.unit_combo.setObjectName("diskCombo")
+        self.unit_combo.setToolTip("大小的显示单位（只影响显示和导出的文本，不影响排序和过滤）")
+        for unit in (None,) + SizeFormatter.UNITS[1:]:
+            for system, base in SizeFormatter.BASES.items():
+                self.unit_combo.addItem(f"📏 {unit or '自动'}（{base} 进位）", f"{system}:{unit or ''}")
+        self.unit_combo.setCurrentIndex(
+            max(0, self.unit_combo.findData(f"{format_size.system}:{format_size.unit or ''}")))
+        self.unit_combo.currentIndexChanged.connect(self.on_size_units_changed)
+        filter_layout.addWidget(self.unit_combo)
+        
+        table_layout.addLayout(filter_layout)
+        
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(80)
+        self.search_timer.timeout.connect(self.apply_search)
         
         # 表格视图
         self.table_view = QTableView()
@@ -470,13 +6092,13 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
         self.table_view.horizontalHeader().setStretchLastSection(True)
         self.table_view.setSelectionMode(QAbstractItemView.ExtendedSelection)  # 支持Ctrl和Shift多选
         self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)  # 按行选择
+        # 固定行高：百万行的结果中视图按行号直接定位可见行，不逐行计算行高
+        self.table_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         
         # 自定义模型
         self.table_model = ItemSizeModel()
-        self.table_proxy = QSortFilterProxyModel()
-        self.table_proxy.setSourceModel(self.table_model)
-        self.table_proxy.setSortRole(Qt.UserRole)
-        self.table_view.setModel(self.table_proxy)
+        self.table_view.setModel(self.table_model)
+        self.table_view.sortByColumn(4, Qt.DescendingOrder)  # 默认按大小降序
         
         # 设置列宽
         self.table_view.setColumnWidth(0, 60)   # 序号
@@ -485,11 +6107,302 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
         self.table_view.setColumnWidth(3, 400)  # 路径
         self.table_view.setColumnWidth(4, 150)  # 大小
         self.table_view.setColumnWidth(5, 80)   # 百分比
+        self.table_view.setColumnWidth(6, 130)  # 冷数据
+        self.table_view.setColumnWidth(7, 150)  # 根目录（只在多磁盘扫描结果中显示）
+        self.table_view.setColumnHidden(ItemSizeModel.ROOT_COLUMN, True)
+        self.table_model.modelReset.connect(
+            lambda: self.table_view.setColumnHidden(ItemSizeModel.ROOT_COLUMN,
+                                                    self.table_model.store.root_ids is None))
         
         # 设置大小列的委托
         self.table_view.setItemDelegateForColumn(4, SizeBarDelegate(self.table_view))
         
-        right_layout.addWidget(self.table_view)
+        table_layout.addWidget(self.table_view)
+        self.result_tabs.addTab(table_page, "📊 文件夹大小排序")
+        
+        # ---- 类型分布 ----
+        breakdown_page = QWidget()
+        breakdown_layout = QVBoxLayout(breakdown_page)
+        breakdown_layout.setContentsMargins(0, 6, 0, 0)
+        breakdown_layout.setSpacing(6)
+        
+        breakdown_bar = QHBoxLayout()
+        self.breakdown_combo = QComboBox()
+        self.breakdown_combo.setObjectName("diskCombo")
+        self.breakdown_combo.addItem("按类别", "category")
+        self.breakdown_combo.addItem("按扩展名", "extension")
+        self.breakdown_combo.currentIndexChanged.connect(self.update_breakdown_view)
+        breakdown_bar.addWidget(self.breakdown_combo)
+        self.breakdown_label = QLabel("")
+        self.breakdown_label.setObjectName("statusLabel")
+        breakdown_bar.addWidget(self.breakdown_label, 1)
+        breakdown_layout.addLayout(breakdown_bar)
+        
+        self.breakdown_view = QTableView()
+        self.breakdown_view.setObjectName("tableView")
+        self.breakdown_view.setAlternatingRowColors(True)
+        self.breakdown_view.horizontalHeader().setStretchLastSection(True)
+        self.breakdown_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.breakdown_model = BreakdownModel()
+        self.breakdown_view.setModel(self.breakdown_model)
+        self.breakdown_view.setColumnWidth(0, 180)
+        self.breakdown_view.setColumnWidth(1, 100)
+        self.breakdown_view.setColumnWidth(2, 300)
+        self.breakdown_view.setItemDelegateForColumn(2, SizeBarDelegate(self.breakdown_view, column=2))
+        breakdown_layout.addWidget(self.breakdown_view)
+        self.result_tabs.addTab(breakdown_page, "🧩 类型分布")
+        
+        # ---- 清理建议 ----
+        cleanup_page = QWidget()
+        cleanup_layout = QVBoxLayout(cleanup_page)
+        cleanup_layout.setContentsMargins(0, 6, 0, 0)
+        cleanup_layout.setSpacing(6)
+        self.cleanup_label = QLabel("")
+        self.cleanup_label.setObjectName("statusLabel")
+        self.cleanup_label.setWordWrap(True)
+        cleanup_layout.addWidget(self.cleanup_label)
+        self.cleanup_view = QTableView()
+        self.cleanup_view.setObjectName("tableView")
+        self.cleanup_view.setAlternatingRowColors(True)
+        self.cleanup_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.cleanup_view.verticalHeader().setVisible(False)
+        self.cleanup_view.horizontalHeader().setStretchLastSection(True)
+        self.cleanup_model = CleanupModel()
+        self.cleanup_view.setModel(self.cleanup_model)
+        self.cleanup_view.setColumnWidth(0, 120)
+        self.cleanup_view.setColumnWidth(1, 420)
+        self.cleanup_view.setColumnWidth(2, 110)
+        self.cleanup_view.setColumnWidth(3, 220)
+        self.cleanup_view.setItemDelegateForColumn(3, SizeBarDelegate(self.cleanup_view, column=3))
+        self.cleanup_view.doubleClicked.connect(self.open_cleanup_candidate)
+        cleanup_layout.addWidget(self.cleanup_view)
+        self.result_tabs.addTab(cleanup_page, "🧹 清理建议")
+        
+        # ---- 树状图 ----
+        treemap_page = QWidget()
+        treemap_layout = QVBoxLayout(treemap_page)
+        treemap_layout.setContentsMargins(0, 6, 0, 0)
+        treemap_layout.setSpacing(6)
+        
+        treemap_bar = QHBoxLayout()
+        self.treemap_up_button = QPushButton("⬆️ 上一级")
+        self.treemap_up_button.setFixedWidth(100)
+        self.treemap_up_button.setEnabled(False)
+        treemap_bar.addWidget(self.treemap_up_button)
+        self.treemap_path_label = QLabel("")
+        self.treemap_path_label.setObjectName("statusLabel")
+        treemap_bar.addWidget(self.treemap_path_label, 1)
+        self.treemap_stats_label = QLabel("")
+        treemap_bar.addWidget(self.treemap_stats_label)
+        treemap_layout.addLayout(treemap_bar)
+        
+        self.treemap_view = TreemapWidget()
+        self.treemap_view.setToolTip("")
+        self.treemap_up_button.clicked.connect(self.treemap_view.zoom_out)
+        self.treemap_view.root_changed.connect(self.on_treemap_root_changed)
+        self.treemap_view.layout_done.connect(self.on_treemap_layout_done)
+        treemap_layout.addWidget(self.treemap_view, 1)
+        self.result_tabs.addTab(treemap_page, "🗺️ 树状图")
+        
+        # ---- 快照比较 ----
+        diff_page = QWidget()
+        diff_layout = QVBoxLayout(diff_page)
+        diff_layout.setContentsMargins(0, 6, 0, 0)
+        diff_layout.setSpacing(6)
+        
+        diff_bar = QHBoxLayout()
+        self.save_snapshot_button = QPushButton("📸 保存快照")
+        self.save_snapshot_button.setFixedWidth(110)
+        self.save_snapshot_button.setEnabled(False)
+        self.save_snapshot_button.clicked.connect(self.save_snapshot)
+        diff_bar.addWidget(self.save_snapshot_button)
+        diff_bar.addWidget(QLabel("旧:"))
+        self.old_snapshot_combo = QComboBox()
+        self.old_snapshot_combo.setObjectName("diskCombo")
+        diff_bar.addWidget(self.old_snapshot_combo, 1)
+        diff_bar.addWidget(QLabel("新:"))
+        self.new_snapshot_combo = QComboBox()
+        self.new_snapshot_combo.setObjectName("diskCombo")
+        diff_bar.addWidget(self.new_snapshot_combo, 1)
+        self.open_snapshot_button = QPushButton("📂 打开")
+        self.open_snapshot_button.setFixedWidth(80)
+        self.open_snapshot_button.setToolTip("在结果表格中打开“新”快照")
+        self.open_snapshot_button.clicked.connect(self.open_snapshot)
+        diff_bar.addWidget(self.open_snapshot_button)
+        self.import_ncdu_button = QPushButton("📥 导入 ncdu")
+        self.import_ncdu_button.setFixedWidth(110)
+        self.import_ncdu_button.setToolTip("打开 ncdu -o 导出的 JSON 文件（可为 gzip 压缩），无需重新扫描")
+        self.import_ncdu_button.clicked.connect(self.import_ncdu)
+        diff_bar.addWidget(self.import_ncdu_button)
+        self.diff_button = QPushButton("📈 比较")
+        self.diff_button.setFixedWidth(90)
+        self.diff_button.clicked.connect(self.compare_snapshots)
+        diff_bar.addWidget(self.diff_button)
+        diff_layout.addLayout(diff_bar)
+        
+        self.diff_label = QLabel("")
+        self.diff_label.setObjectName("statusLabel")
+        diff_layout.addWidget(self.diff_label)
+        
+        self.diff_view = QTableView()
+        self.diff_view.setObjectName("tableView")
+        self.diff_view.setAlternatingRowColors(True)
+        self.diff_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.diff_view.horizontalHeader().setStretchLastSection(True)
+        self.diff_view.verticalHeader().setVisible(False)
+        self.diff_model = SnapshotDiffModel()
+        self.diff_view.setModel(self.diff_model)
+        self.diff_view.setSortingEnabled(True)
+        self.diff_view.horizontalHeader().setSortIndicator(5, Qt.DescendingOrder)
+        self.diff_view.setColumnWidth(0, 60)
+        self.diff_view.setColumnWidth(1, 70)
+        self.diff_view.setColumnWidth(2, 500)
+        self.diff_view.setColumnWidth(3, 110)
+        self.diff_view.setColumnWidth(4, 110)
+        diff_layout.addWidget(self.diff_view)
+        self.result_tabs.addTab(diff_page, "📈 快照比较")
+        self.load_snapshot_list()
+        
+        # ---- 文件夹比较 ----
+        compare_page = QWidget()
+        compare_layout = QVBoxLayout(compare_page)
+        compare_layout.setContentsMargins(0, 6, 0, 0)
+        compare_layout.setSpacing(6)
+        
+        compare_bar = QHBoxLayout()
+        self.compare_button = QPushButton("⚖️ 选择文件夹并比较")
+        self.compare_button.setFixedWidth(170)
+        self.compare_button.setToolTip("同时扫描两个或更多文件夹（如主副本与镜像、两次备份），按相对路径对齐比较")
+        self.compare_button.clicked.connect(self.compare_folders)
+        compare_bar.addWidget(self.compare_button)
+        self.compare_label = QLabel("")
+        self.compare_label.setObjectName("statusLabel")
+        compare_bar.addWidget(self.compare_label, 1)
+        compare_layout.addLayout(compare_bar)
+        
+        self.compare_view = QTableView()
+        self.compare_view.setObjectName("tableView")
+        self.compare_view.setAlternatingRowColors(True)
+        self.compare_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.compare_view.horizontalHeader().setStretchLastSection(True)
+        self.compare_view.verticalHeader().setVisible(False)
+        self.compare_model = FolderCompareModel()
+        self.compare_view.setModel(self.compare_model)
+        self.compare_view.setSortingEnabled(True)
+        self.compare_view.setColumnWidth(0, 60)
+        self.compare_view.setColumnWidth(1, 70)
+        self.compare_view.setColumnWidth(2, 460)
+        compare_layout.addWidget(self.compare_view)
+        self.compare_tab_index = self.result_tabs.addTab(compare_page, "⚖️ 文件夹比较")
+        
+        # ---- 增长趋势 ----
+        trend_page = QWidget()
+        trend_layout = QVBoxLayout(trend_page)
+        trend_layout.setContentsMargins(0, 6, 0, 0)
+        trend_layout.setSpacing(6)
+        
+        trend_bar = QHBoxLayout()
+        trend_bar.addWidget(QLabel("时间窗口:"))
+        self.trend_window_combo = QComboBox()
+        self.trend_window_combo.setObjectName("diskCombo")
+        for days in (7, 30, 90, 365):
+            self.trend_window_combo.addItem(f"最近 {days} 天", days)
+        self.trend_window_combo.setCurrentIndex(1)
+        self.trend_window_combo.currentIndexChanged.connect(self.refresh_trends)
+        trend_bar.addWidget(self.trend_window_combo)
+        self.trend_label = QLabel("")
+        self.trend_label.setObjectName("statusLabel")
+        trend_bar.addWidget(self.trend_label, 1)
+        trend_layout.addLayout(trend_bar)
+        
+        self.trend_view = QTableView()
+        self.trend_view.setObjectName("tableView")
+        self.trend_view.setAlternatingRowColors(True)
+        self.trend_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.trend_view.verticalHeader().setVisible(False)
+        self.trend_model = TrendModel()
+        self.trend_view.setModel(self.trend_model)
+        self.trend_view.setColumnWidth(0, 500)
+        self.trend_view.setColumnWidth(1, 110)
+        self.trend_view.setColumnWidth(2, 110)
+        self.trend_view.setColumnWidth(3, 110)
+        self.trend_view.horizontalHeader().setStretchLastSection(True)
+        self.trend_view.setItemDelegateForColumn(4, SparklineDelegate(self.trend_view))
+        trend_layout.addWidget(self.trend_view)
+        self.result_tabs.addTab(trend_page, "📉 增长趋势")
+        
+        # ---- 慢目录 ----
+        slow_page = QWidget()
+        slow_layout = QVBoxLayout(slow_page)
+        slow_layout.setContentsMargins(0, 6, 0, 0)
+        slow_layout.setSpacing(6)
+        self.slow_label = QLabel("列目录超时的目录会被跳过（不计入大小），超过 2 秒的目录也会列在这里")
+        self.slow_label.setObjectName("statusLabel")
+        slow_layout.addWidget(self.slow_label)
+        self.slow_view = QTableView()
+        self.slow_view.setObjectName("tableView")
+        self.slow_view.setAlternatingRowColors(True)
+        self.slow_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.slow_view.verticalHeader().setVisible(False)
+        self.slow_model = QStandardItemModel(0, 3)
+        self.slow_model.setHorizontalHeaderLabels(["路径", "耗时", "状态"])
+        self.slow_view.setModel(self.slow_model)
+        self.slow_view.setColumnWidth(0, 600)
+        self.slow_view.setColumnWidth(1, 100)
+        self.slow_view.horizontalHeader().setStretchLastSection(True)
+        slow_layout.addWidget(self.slow_view)
+        self.result_tabs.addTab(slow_page, "🐌 慢目录")
+        
+        # ---- 扫描诊断 ----
+        diag_page = QWidget()
+        diag_layout = QVBoxLayout(diag_page)
+        diag_layout.setContentsMargins(0, 6, 0, 0)
+        diag_layout.setSpacing(6)
+        
+        diag_bar = QHBoxLayout()
+        self.diag_label = QLabel("扫描完成或停止后显示各阶段耗时、系统调用次数、错误和最慢的目录")
+        self.diag_label.setObjectName("statusLabel")
+        diag_bar.addWidget(self.diag_label, 1)
+        settings = QSettings()
+        self.profile_checkbox = QCheckBox("cProfile")
+        self.profile_checkbox.setToolTip("下次扫描时用 cProfile 分析扫描线程（扫描会变慢）")
+        self.profile_checkbox.setChecked(settings.value("diagnostics/profile", False, type=bool))
+        self.profile_checkbox.toggled.connect(lambda checked: QSettings().setValue("diagnostics/profile", checked))
+        diag_bar.addWidget(self.profile_checkbox)
+        self.tracemalloc_checkbox = QCheckBox("tracemalloc")
+        self.tracemalloc_checkbox.setToolTip("下次扫描时用 tracemalloc 统计内存分配（扫描会明显变慢）")
+        self.tracemalloc_checkbox.setChecked(settings.value("diagnostics/tracemalloc", False, type=bool))
+        self.tracemalloc_checkbox.toggled.connect(
+            lambda checked: QSettings().setValue("diagnostics/tracemalloc", checked))
+        diag_bar.addWidget(self.tracemalloc_checkbox)
+        self.diag_export_button = QPushButton("💾 导出 JSON")
+        self.diag_export_button.setFixedWidth(110)
+        self.diag_export_button.setEnabled(False)
+        self.diag_export_button.clicked.connect(self.export_diagnostics)
+        diag_bar.addWidget(self.diag_export_button)
+        diag_layout.addLayout(diag_bar)
+        
+        diag_splitter = QSplitter(Qt.Vertical)
+        self.diag_view = QTreeView()
+        self.diag_view.setObjectName("tableView")
+        self.diag_view.setAlternatingRowColors(True)
+        self.diag_model = QStandardItemModel(0, 3)
+        self.diag_model.setHorizontalHeaderLabels(["项目", "数值", "说明"])
+        self.diag_view.setModel(self.diag_model)
+        self.diag_view.setColumnWidth(0, 420)
+        self.diag_view.setColumnWidth(1, 120)
+        diag_splitter.addWidget(self.diag_view)
+        self.diag_text = QPlainTextEdit()
+        self.diag_text.setReadOnly(True)
+        self.diag_text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        mono = QFont("Consolas")
+        mono.setStyleHint(QFont.Monospace)
+        self.diag_text.setFont(mono)
+        diag_splitter.addWidget(self.diag_text)
+        diag_splitter.setStretchFactor(0, 3)
+        diag_splitter.setStretchFactor(1, 2)
+        diag_layout.addWidget(diag_splitter)
+        self.result_tabs.addTab(diag_page, "🩺 诊断")
         
         # 添加到分割器
         main_splitter.addWidget(left_widget)
@@ -503,6 +6416,10 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
         
         # ========== 底部状态栏 ==========
         self.statusBar().showMessage("就绪")
+        # 右侧常驻显示扫描速率和限速情况
+        self.throttle_label = QLabel("")
+        self.throttle_label.setObjectName("throttleLabel")
+        self.statusBar().addPermanentWidget(self.throttle_label)
         
         # 连接信号
         self.disk_combo.currentIndexChanged.connect(self.on_disk_changed)
@@ -583,6 +6500,12 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
             QPushButton#scanButton:hover {
                 background-color: #2196F3;
             }
+            QPushButton#pauseButton {
+                background-color: #F57C00;
+            }
+            QPushButton#pauseButton:hover {
+                background-color: #FF9800;
+            }
             QPushButton#stopButton {
                 background-color: #D32F2F;
             }
@@ -628,6 +6551,32 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
                 border: 1px solid #333333;
                 font-weight: bold;
             }
+            QTabWidget#resultTabs::pane {
+                border: none;
+            }
+            QTabWidget#resultTabs QTabBar::tab {
+                background-color: #1E1E1E;
+                color: #B0B0B0;
+                border: 1px solid #333333;
+                border-bottom: none;
+                padding: 6px 14px;
+                font-weight: bold;
+            }
+            QTabWidget#resultTabs QTabBar::tab:selected {
+                color: #BB86FC;
+                background-color: #2D2D2D;
+            }
+            QLineEdit#searchEdit {
+                background-color: #2D2D2D;
+                color: #E0E0E0;
+                border: 1px solid #444444;
+                border-radius: 4px;
+                padding: 5px 8px;
+                selection-background-color: #BB86FC;
+            }
+            QLineEdit#searchEdit:focus {
+                border: 1px solid #BB86FC;
+            }
             QProgressBar#progressBar {
                 background-color: #2D2D2D;
                 border: 1px solid #444444;
@@ -653,119 +6602,127 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
             }
             QMenu::separator {
                 height: 1px;
-                background-color: #444444;
-                margin: 5px 10px;
-            }
-        """)
-        
-    def load_disks(self):
-        """加载可用磁盘"""
-        self.disk_combo.clear()
-        
-        disks = []
-        for part in psutil.disk_partitions():
-            try:
-                if os.name == 'nt':  # Windows
-                    if 'cdrom' in part.opts or not part.mountpoint:
-                        continue
-                    
-                    # 获取磁盘信息
-                    usage = psutil.disk_usage(part.mountpoint)
-                    free_gb = usage.free / (1024**3)
-                    total_gb = usage.total / (1024**3)
-                    
-                    # 格式化显示
-                    if 'fixed' in part.opts:
-                        icon = "💾"
-                    elif 'removable' in part.opts:
-                        icon = "💿"
-                    else:
-                        icon = "📀"
-                        
-                    display_text = f"{icon} {part.mountpoint} ({free_gb:.1f}GB 可用 / {total_gb:.1f}GB)"
-                    
-                    disks.append({
-                        'path': part.mountpoint,
-                        'display': display_text,
-                        'usage': usage
-                    })
-            except Exception as e:
-                print(f"加载磁盘 {part.mountpoint} 出错: {e}")
-                continue
-        
-        # 按磁盘路径排序
-        disks.sort(key=lambda x: x['path'])
-        
-        for disk in disks:
-            self.disk_combo.addItem(disk['display'], disk['path'])
+                background-color: #444444;
+                margin: 5px 10px;
+            }
+        """)
         
-        if disks:
-            # 默认选择C盘
-            c_drive_index = self.disk_combo.findData("C:\\")
-            if c_drive_index >= 0:
-                self.disk_combo.setCurrentIndex(c_drive_index)
-            else:
-                self.disk_combo.setCurrentIndex(0)
+    def load_disks(self, preferred=None):
+        """在后台加载可用磁盘：先读分区表，再并行查询各分区的用量，结果陆续加入列表，
+        超时未响应的分区标为无响应；preferred 为加载后优先选中的磁盘（默认 C 盘或 /）"""
+        self._disk_generation += 1
+        generation = self._disk_generation
+        self.disk_combo.clear()
+        self.disk_combo.setPlaceholderText("⏳ 检测中...")
+        self.disk_usage = {}
+        self._disks_pending = None
+        self._default_disk = preferred if isinstance(preferred, str) else None
+        self._choose_default_disk = True
+        self.background.call(lambda partitions, error: self._on_partitions_listed(generation, partitions, error),
+                             list_disk_partitions)
+    
+    def _on_partitions_listed(self, generation, partitions, error):
+        if generation != self._disk_generation:
+            return
+        if error is not None:
+            print(f"加载磁盘列表出错: {error}")
+            partitions = []
+        self._disks_pending = len(partitions)
+        if not partitions:
+            self._disks_loaded()
+        for mountpoint, icon in partitions:
+            self.background.call(
+                lambda usage, error, mountpoint=mountpoint, icon=icon:
+                    self._on_disk_usage(generation, mountpoint, icon, usage, error),
+                psutil.disk_usage, mountpoint)
+    
+    def _on_disk_usage(self, generation, mountpoint, icon, usage, error):
+        """一个分区的用量查询完成（或超时）：按挂载点顺序插入磁盘列表"""
+        if generation != self._disk_generation:
+            return
+        self._disks_pending -= 1
+        if isinstance(error, TimeoutError):
+            # 挂起的网络路径等仍列出，选中后树形视图和扫描同样受超时保护
+            self.disk_usage[mountpoint] = None
+            display_text = f"⚠️ {mountpoint} (无响应)"
+        elif error is not None:
+            print(f"加载磁盘 {mountpoint} 出错: {error}")
+            display_text = None
+        else:
+            self.disk_usage[mountpoint] = usage
+            display_text = (f"{icon} {mountpoint} ({usage.free / (1024**3):.1f}GB 可用 / "
+                            f"{usage.total / (1024**3):.1f}GB)")
+        if display_text is not None:
+            combo = self.disk_combo
+            index = 0
+            while index < combo.count() and combo.itemData(index) < mountpoint:
+                index += 1
+            # 插入时不触发选择变化，默认磁盘到齐后再选中并加载
+            combo.blockSignals(True)
+            combo.insertItem(index, display_text, mountpoint)
+            if self._choose_default_disk:
+                combo.setCurrentIndex(-1)
+            combo.blockSignals(False)
+            defaults = (self._default_disk,) if self._default_disk else ("C:\\", "/")
+            if self._choose_default_disk and mountpoint in defaults:
+                self._select_disk(index)
+        if self._disks_pending == 0:
+            self._disks_loaded()
+    
+    def _disks_loaded(self):
+        """所有分区都已响应或超时"""
+        disks = [path for path, usage in self.disk_usage.items() if usage is not None]
+        # 多块磁盘时可一次并行扫描全部（不含无响应的分区）
+        if len(disks) > 1:
+            used = sum(self.disk_usage[path].used for path in disks)
+            self.disk_combo.blockSignals(True)
+            self.disk_combo.addItem(f"🗂️ 全部磁盘（{len(disks)} 个，共用 {used / (1024**3):.1f}GB，并行扫描）",
+                                    sorted(disks))
+            if self._choose_default_disk:
+                self.disk_combo.setCurrentIndex(-1)
+            self.disk_combo.blockSignals(False)
+        if self._choose_default_disk and self.disk_combo.count() > 0:
+            self._select_disk(0)
+        self.disk_combo.setPlaceholderText("")
+        self.disks_loaded.emit(self.disk_combo.count())
+    
+    def _select_disk(self, index):
+        """选中磁盘并加载其树形视图（setCurrentIndex 在索引不变时不发出信号，因此直接调用）"""
+        self.disk_combo.blockSignals(True)
+        self.disk_combo.setCurrentIndex(index)
+        self.disk_combo.blockSignals(False)
+        self.on_disk_changed(index)
     
     def on_disk_changed(self, index):
         """磁盘选择变化"""
         if index >= 0:
+            self._choose_default_disk = False
             disk_path = self.disk_combo.itemData(index)
-            if disk_path:
+            if isinstance(disk_path, (list, tuple)):
+                # 全部磁盘：树形视图不显示内容，扫描时使用磁盘列表
+                self.tree_model.clear()
+            elif disk_path:
                 self.load_disk_tree(disk_path)
+                self.load_latest_scan(disk_path)
     
     def load_disk_tree(self, disk_path):
-        """加载磁盘树形结构"""
+        """加载磁盘树形结构（用量取自磁盘列表，一级文件夹在后台列出）"""
         self.tree_model.clear()
         
-        if not os.path.exists(disk_path):
-            QMessageBox.warning(self, "警告", f"磁盘路径不存在: {disk_path}")
-            return
-        
         # 添加磁盘根节点
-        usage = psutil.disk_usage(disk_path)
-        used_percent = (usage.used / usage.total) * 100 if usage.total > 0 else 0
-        
-        disk_text = f"💾 {disk_path} - 已用 {used_percent:.1f}% ({self._format_size(usage.used)} / {self._format_size(usage.total)})"
+        usage = self.disk_usage.get(disk_path)
+        if usage is not None:
+            used_percent = (usage.used / usage.total) * 100 if usage.total > 0 else 0
+            disk_text = (f"💾 {disk_path} - 已用 {used_percent:.1f}% "
+                         f"({format_size(usage.used)} / {format_size(usage.total)})")
+        else:
+            disk_text = f"💾 {disk_path}"
         
         disk_item = QStandardItem(disk_text)
         disk_item.setData(disk_path, Qt.UserRole)
         disk_item.setEditable(False)
-        
-        # 添加一级子文件夹（延迟加载）
-        try:
-            for entry in os.scandir(disk_path):
-                if entry.is_dir() and not entry.name.startswith('$') and not entry.name.startswith('.'):
-                    try:
-                        # 检查是否有子文件夹
-                        has_children = False
-                        for _ in os.scandir(entry.path):
-                            pass
-                        has_children = True
-                        
-                        folder_item = QStandardItem(f"📁 {entry.name}")
-                        folder_item.setData(entry.path, Qt.UserRole)
-                        folder_item.setEditable(False)
-                        
-                        # 如果有子文件夹，添加占位符
-                        if has_children:
-                            placeholder = QStandardItem("...")
-                            placeholder.setEditable(False)
-                            folder_item.appendRow(placeholder)
-                        
-                        disk_item.appendRow(folder_item)
-                    except (PermissionError, OSError):
-                        continue
-                    except StopIteration:
-                        # 没有子文件夹
-                        folder_item = QStandardItem(f"📁 {entry.name}")
-                        folder_item.setData(entry.path, Qt.UserRole)
-                        folder_item.setEditable(False)
-                        disk_item.appendRow(folder_item)
-        except (PermissionError, OSError) as e:
-            print(f"加载磁盘 {disk_path} 的子文件夹出错: {e}")
-        
         self.tree_model.appendRow(disk_item)
+        self.load_subfolders(disk_item)
         self.tree_view.expand(disk_item.index())
     
     def on_tree_item_expanded(self, index):
@@ -779,39 +6736,41 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
                 item.removeRow(0)
                 self.load_subfolders(item)
     
-    def load_subfolders(self, parent_item):
-        """加载子文件夹"""
+    def load_subfolders(self, parent_item, expand_all=False):
+        """在后台列出子文件夹，期间显示“加载中”；expand_all 为 True 时加载后继续展开所有子文件夹"""
         path = parent_item.data(Qt.UserRole)
-        
-        try:
-            for entry in os.scandir(path):
-                if entry.is_dir() and not entry.name.startswith('$') and not entry.name.startswith('.'):
-                    try:
-                        # 检查是否有子文件夹
-                        has_children = False
-                        try:
-                            next(os.scandir(entry.path))
-                            has_children = True
-                        except StopIteration:
-                            has_children = False
-                        except:
-                            has_children = True
-                        
-                        folder_item = QStandardItem(f"📁 {entry.name}")
-                        folder_item.setData(entry.path, Qt.UserRole)
-                        folder_item.setEditable(False)
-                        
-                        # 如果有子文件夹，添加占位符
-                        if has_children:
-                            placeholder = QStandardItem("...")
-                            placeholder.setEditable(False)
-                            folder_item.appendRow(placeholder)
-                        
-                        parent_item.appendRow(folder_item)
-                    except (PermissionError, OSError):
-                        continue
-        except (PermissionError, OSError):
-            pass
+        loading = QStandardItem("⏳ 加载中...")
+        loading.setEditable(False)
+        loading.setEnabled(False)
+        parent_item.appendRow(loading)
+        parent = QPersistentModelIndex(parent_item.index())
+        self.background.call(
+            lambda folders, error: self._on_subfolders_listed(parent, folders, error, expand_all),
+            list_subfolders, path)
+    
+    def _on_subfolders_listed(self, parent, folders, error, expand_all):
+        if not parent.isValid():
+            return      # 树形视图已重新加载
+        parent_item = self.tree_model.itemFromIndex(QModelIndex(parent))
+        parent_item.removeRow(0)
+        if error is not None:
+            if isinstance(error, TimeoutError):
+                timeout_item = QStandardItem(f"⚠️ 无响应（{error}）")
+                timeout_item.setEditable(False)
+                timeout_item.setEnabled(False)
+                parent_item.appendRow(timeout_item)
+            return
+        for name, path in folders:
+            folder_item = QStandardItem(f"📁 {name}")
+            folder_item.setData(path, Qt.UserRole)
+            folder_item.setEditable(False)
+            # 是否有子文件夹要到展开时才知道，先放占位符
+            placeholder = QStandardItem("...")
+            placeholder.setEditable(False)
+            folder_item.appendRow(placeholder)
+            parent_item.appendRow(folder_item)
+            if expand_all:
+                self.expand_tree_item(folder_item.index())
     
     def start_scan(self):
         """开始扫描"""
@@ -829,94 +6788,988 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
                 QMessageBox.warning(self, "警告", "请先选择磁盘或文件夹")
                 return
         
-        if not scan_path or not os.path.exists(scan_path):
+        # “全部磁盘”项的数据是根目录列表，按物理磁盘并行扫描
+        roots = None
+        if isinstance(scan_path, (list, tuple)):
+            roots = [root for root in scan_path if os.path.exists(root)]
+            scan_path = " + ".join(roots)
+            if not roots:
+                QMessageBox.warning(self, "警告", "选择的路径不存在")
+                return
+        elif not scan_path or not os.path.exists(scan_path):
             QMessageBox.warning(self, "警告", "选择的路径不存在")
             return
         
+        # 获取扫描方式
+        scan_files = self.scan_files_checkbox.isChecked()
+        scan_folders = self.scan_folders_checkbox.isChecked()
+        
+        budget = self.mode_combo.currentData()
+        if budget and roots is not None:
+            QMessageBox.warning(self, "警告", "估算模式一次只能扫描一个路径，请选择单个磁盘或切换为精确扫描")
+            return
+        use_service = self.service_checkbox.isChecked()
+        if use_service and (budget or roots is not None):
+            QMessageBox.warning(self, "警告", "后台服务只做单个路径的精确扫描，请选择单个磁盘并切换为精确扫描，"
+                                            "或取消“🛰️ 后台服务”")
+            return
+        if use_service and not self.connect_service(launch=True):
+            QMessageBox.warning(self, "警告", "后台扫描服务尚未就绪（见状态栏），请稍后再开始扫描")
+            return
+        
+        # 同一路径、同一扫描方式有未完成的扫描时询问是否继续
+        # （估算和多磁盘扫描不保存断点；后台服务自己保存断点并自动继续）
+        checkpoint = ScanCheckpoint(scan_path, scan_files, scan_folders) if roots is None and not use_service else None
+        resume = False
+        if not budget and checkpoint is not None and checkpoint.exists():
+            summary = checkpoint.summary()
+            if summary is None:
+                checkpoint.clear()
+            else:
+                saved_at, count, last_path = summary
+                stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(saved_at))
+                reply = QMessageBox.question(
+                    self, "继续扫描",
+                    f"发现 {stamp} 中断的扫描：\n\n📁 {scan_path}\n📈 已扫描 {count:,} 项\n📍 停在 {last_path}\n\n"
+                    f"是否从断点继续？选择“否”将重新扫描。",
+                    QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.Yes)
+                if reply == QMessageBox.Cancel:
+                    return
+                resume = reply == QMessageBox.Yes
+        
         self.current_scan_path = scan_path
+        if use_service:
+            message = "🛰️ 正在后台服务中扫描..."
+        elif budget:
+            message = f"⏱️ 正在估算（{self.mode_combo.currentText()[2:]}）..."
+        else:
+            message = "🔄 正在从断点继续扫描..." if resume else "🔄 正在扫描..."
+        self._prepare_scan_view(message, estimate=bool(budget))
+        
+        if use_service:
+            # 扫描在服务进程中进行，代理对象转发进度，完成后映射服务保存的快照
+            self.scanner_thread = ServiceScanProxy(self.service_client)
+            self._connect_scanner()
+            self.scanner_thread.start_scan(scan_path, scan_files, scan_folders, self.priority_combo.currentData())
+            return
         
+        # 创建并启动扫描线程；单个目录的超时可在 QSettings 的 scan/dir_timeout 项修改
+        dir_timeout = float(QSettings().value("scan/dir_timeout", 10.0))
+        if roots is not None:
+            self.scanner_thread = MultiRootScanner(roots, scan_files, scan_folders, load_file_categories(),
+                                                   self.priority_combo.currentData(), dir_timeout,
+                                                   FakeSlowLister.from_environment())
+        elif budget:
+            self.scanner_thread = EstimateScanner(scan_path, budget, load_file_categories(),
+                                                  self.priority_combo.currentData(), dir_timeout)
+            fake_lister = FakeSlowLister.from_environment(self.scanner_thread.lister)
+            if fake_lister is not None:
+                self.scanner_thread.lister = fake_lister
+            self.scanner_thread.estimate_updated.connect(self.estimate_updated)
+        else:
+            self.scanner_thread = FolderSizeScanner(scan_path, scan_files, scan_folders,
+                                                    load_file_categories(), checkpoint, resume,
+                                                    self.priority_combo.currentData(), dir_timeout,
+                                                    FakeSlowLister.from_environment())
+        self.scanner_thread.profile = self.profile_checkbox.isChecked()
+        self.scanner_thread.trace_memory = self.tracemalloc_checkbox.isChecked()
+        self._connect_scanner()
+        self.scanner_thread.start()
+    
+    def _prepare_scan_view(self, message, estimate=False):
+        """开始或附加到扫描前：切换按钮状态并清空上一次的结果"""
         # 禁用扫描按钮，启用停止按钮
         self.scan_button.setEnabled(False)
         self.stop_button.setEnabled(True)
+        self.pause_button.setEnabled(True)
+        self.pause_button.setText("⏸️ 暂停")
         self.export_button.setEnabled(False)
-        self.statusBar().showMessage("🔄 正在扫描...")
+        self.exact_button.setVisible(estimate)
+        self.exact_button.setEnabled(True)
+        self._exact_after_stop = False
+        self.statusBar().showMessage(message)
         self.progress_bar.setValue(0)
         
         # 清空表格
-        self.table_model.set_items([])
-        
-        # 获取扫描方式
-        scan_files = self.scan_files_checkbox.isChecked()
-        scan_folders = self.scan_folders_checkbox.isChecked()
-        
-        # 创建并启动扫描线程
-        self.scanner_thread = FolderSizeScanner(scan_path, scan_files, scan_folders)
+        self.table_model.set_store(ScanResultStore())
+        self.search_index = None
+        self.search_mask = None
+        self.expression_mask = None
+        self.breakdown = None
+        self.update_breakdown_view()
+        self.show_cleanup(None)
+        self.show_comparison(None)
+        self.treemap_view.set_store(None)
+        self.save_snapshot_button.setEnabled(False)
+        self.slow_model.removeRows(0, self.slow_model.rowCount())
+        self.show_diagnostics(None)
+    
+    def _connect_scanner(self):
+        """连接扫描线程（或服务扫描代理）的信号"""
         self.scanner_thread.progress.connect(self.update_progress)
+        self.scanner_thread.slow_directory.connect(self.add_slow_directory)
+        self.scanner_thread.stopped.connect(self.scan_stopped)
+        self.scanner_thread.throttle_status.connect(self.throttle_label.setText)
+        self.throttle_label.setText("")
         self.scanner_thread.finished.connect(self.scan_finished)
         self.scanner_thread.error.connect(self.scan_error)
-        self.scanner_thread.start()
+        self.scanner_thread.diagnostics.connect(self.show_diagnostics)
+    
+    def on_service_toggled(self, checked):
+        QSettings().setValue("service/enabled", checked)
+        if checked:
+            self.connect_service(launch=True)
+    
+    def connect_service(self, launch=False):
+        """连接后台扫描服务，返回是否已连接；launch 为 True 且服务未运行时启动服务进程并在后台重试连接"""
+        if self.service_client.connect_to_service(timeout_ms=200):
+            return True
+        if launch and not self._service_retries:
+            try:
+                self._launch_service()
+            except OSError as e:
+                self.statusBar().showMessage(f"❌ 无法启动后台扫描服务: {e}")
+                return False
+            self._service_retries = 20
+            self.statusBar().showMessage("🛰️ 正在启动后台扫描服务...")
+            QTimer.singleShot(300, self._retry_service)
+        return False
+    
+    def _retry_service(self):
+        self._service_retries -= 1
+        if self.service_client.connect_to_service(timeout_ms=200):
+            self._service_retries = 0
+            self.statusBar().showMessage("🛰️ 已连接后台扫描服务")
+        elif self._service_retries > 0:
+            QTimer.singleShot(300, self._retry_service)
+        else:
+            self.statusBar().showMessage("❌ 后台扫描服务未能启动")
+    
+    @staticmethod
+    def _launch_service():
+        """启动独立于本窗口的后台扫描服务进程"""
+        args = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, os.path.abspath(__file__)]
+        kwargs = {'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+        if os.name == 'nt':
+            kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
+        subprocess.Popen(args + ['--daemon'], **kwargs)
+    
+    def attach_service_scan(self):
+        """列出后台服务中的扫描，选择后附加"""
+        if self.scanner_thread and self.scanner_thread.isRunning():
+            QMessageBox.warning(self, "警告", "请先停止当前扫描")
+            return
+        if not self.connect_service():
+            QMessageBox.warning(self, "警告", "后台扫描服务未运行（勾选“🛰️ 后台服务”可自动启动）")
+            return
+        self.service_client.call('scan.list', None, self._choose_service_scan,
+                                 lambda message: self.statusBar().showMessage(f"❌ {message}"))
+    
+    def _choose_service_scan(self, scans):
+        states = {'running': '🔄 扫描中', 'saving': '💾 保存中', 'finished': '✅ 已完成'}
+        scans = [scan for scan in scans if scan['state'] in states]
+        if not scans:
+            QMessageBox.information(self, "附加扫描", "后台服务中没有进行中或已完成的扫描")
+            return
+        labels = []
+        for scan in scans:
+            stamp = time.strftime('%m-%d %H:%M', time.localtime(scan['started']))
+            if scan['state'] == 'finished':
+                detail = f"{scan['count']:,} 项，{format_size(scan['total_size'])}"
+            else:
+                detail = f"已扫描 {scan['count']:,} 项" + (f"，{scan['percent']}%" if scan['percent'] >= 0 else "")
+            labels.append(f"#{scan['scan_id']} {states[scan['state']]} {scan['path']}（{stamp} 开始，{detail}）")
+        label, ok = QInputDialog.getItem(self, "附加扫描", "后台服务中的扫描：", labels, 0, False)
+        if not ok or (self.scanner_thread and self.scanner_thread.isRunning()):
+            return
+        scan = scans[labels.index(label)]
+        self.current_scan_path = scan['path']
+        self._prepare_scan_view(f"📡 已附加到后台扫描 #{scan['scan_id']}...")
+        self.scanner_thread = ServiceScanProxy(self.service_client)
+        self._connect_scanner()
+        self.scanner_thread.attach(scan['scan_id'])
+    
+    def start_exact_scan(self):
+        """估算不够用时改为精确扫描同一路径；估算仍在进行时先停止，停止后再开始"""
+        self.mode_combo.setCurrentIndex(self.mode_combo.findData(0))
+        self.exact_button.setEnabled(False)
+        if self.scanner_thread and self.scanner_thread.isRunning():
+            self._exact_after_stop = True
+            self.stop_scan()
+        else:
+            self.start_scan()
+    
+    def estimate_updated(self, results):
+        """估算扫描逐步细化的中间结果"""
+        self.search_index = None    # 搜索时按需重建
+        self.table_model.set_store(results)
+        self.treemap_view.set_store(results)
+        if self.search_edit.text().strip():
+            self.apply_search()
+        if self.filter_edit.text().strip():
+            self.apply_filter_expression()
+    
+    def toggle_pause(self):
+        """暂停/继续扫描；暂停时扫描线程会保存断点"""
+        scanner = self.scanner_thread
+        if not scanner or not scanner.isRunning():
+            return
+        if scanner.is_paused():
+            scanner.resume_scan()
+            self.pause_button.setText("⏸️ 暂停")
+            self.statusBar().showMessage("🔄 继续扫描...")
+        else:
+            scanner.pause()
+            self.pause_button.setText("▶️ 继续")
+            self.statusBar().showMessage("⏸️ 扫描已暂停，进度已保存")
+    
+    def add_slow_directory(self, path, seconds, skipped):
+        """扫描中发现慢目录或超时跳过的目录"""
+        status = QStandardItem("⏱️ 超时跳过" if skipped else "🐌 缓慢")
+        if skipped:
+            status.setForeground(QBrush(QColor(255, 140, 0)))
+        self.slow_model.appendRow([QStandardItem(path), QStandardItem(f"{seconds:.1f} 秒"), status])
+        skipped_count = sum(1 for r in range(self.slow_model.rowCount())
+                            if self.slow_model.item(r, 2).text().endswith("跳过"))
+        self.slow_label.setText(f"慢目录 {self.slow_model.rowCount()} 个，其中 {skipped_count} 个超时跳过（不计入大小）")
+    
+    def show_diagnostics(self, stats):
+        """显示扫描诊断数据（扫描线程退出时发出；None 清空）"""
+        self.scan_stats = stats
+        self.update_diagnostics_view()
+    
+    def update_diagnostics_view(self):
+        """按阶段耗时、调用次数、错误类型和最慢目录分组显示诊断数据"""
+        model = self.diag_model
+        model.removeRows(0, model.rowCount())
+        stats = self.scan_stats
+        self.diag_export_button.setEnabled(stats is not None)
+        if stats is None:
+            self.diag_label.setText("扫描完成或停止后显示各阶段耗时、系统调用次数、错误和最慢的目录")
+            self.diag_text.setPlainText("")
+            return
+        data = stats.to_dict()
+        phases = data['phases']
+        counters = data['counters']
+        total = phases.get('total') or 0.0
+        
+        def group(title, note=""):
+            item = QStandardItem(title)
+            font = QFont()
+            font.setBold(True)
+            item.setFont(font)
+            model.appendRow([item, QStandardItem(""), QStandardItem(note)])
+            return item
+        
+        phase_group = group("⏱️ 阶段耗时", "列目录 I/O 在多个线程中并行，累计值可超过总耗时")
+        for key, label in ScanStats.PHASES.items():
+            seconds = phases.get(key, 0.0)
+            if key != 'total' and not seconds:
+                continue
+            share = f"{seconds * 100 / total:.1f}%" if total and key != 'total' else ""
+            phase_group.appendRow([QStandardItem(label), QStandardItem(f"{seconds:.3f} 秒"), QStandardItem(share)])
+        
+        counter_group = group("🔢 调用次数")
+        for key, label in ScanStats.COUNTERS.items():
+            value = counters.get(key, 0)
+            rate = f"{value / total:,.0f} 次/秒" if total and key in ('directories', 'scandir', 'stat', 'entries') else ""
+            counter_group.appendRow([QStandardItem(label), QStandardItem(f"{value:,}"), QStandardItem(rate)])
+        
+        lister_group = group("🧭 列目录方式", "自动选择时每个设备首次扫描校准一次（QSettings 的 scan/lister 可指定）")
+        for root, item in data['listers'].items():
+            name, timings = item['name'], item['timings']
+            label = LISTING_BACKENDS[name][0] if name in LISTING_BACKENDS else name
+            root_item = QStandardItem(root)
+            for other, seconds in sorted(timings.items(), key=lambda pair: pair[1]):
+                root_item.appendRow([QStandardItem(other), QStandardItem(f"{seconds * 1e6:.2f} µs/项"),
+                                     QStandardItem("✅ 已选用" if other == name else "")])
+            lister_group.appendRow([root_item, QStandardItem(name),
+                                    QStandardItem(label if timings else f"{label}（未校准）")])
+        
+        error_total = sum(record['count'] for record in data['errors'].values())
+        error_group = group("❌ 错误", "无法读取而被跳过的目录和目录项，按类型统计")
+        for key, record in sorted(data['errors'].items(), key=lambda item: -item[1]['count']):
+            item = QStandardItem(key)
+            for path, message in record['samples']:
+                item.appendRow([QStandardItem(path), QStandardItem(""), QStandardItem(message)])
+            error_group.appendRow([item, QStandardItem(f"{record['count']:,}"), QStandardItem("")])
+        
+        slow_group = group("🐌 最慢的目录", "列目录线程中的实际执行耗时")
+        for item in data['slowest']:
+            slow_group.appendRow([QStandardItem(item['path']), QStandardItem(f"{item['seconds']:.3f} 秒"),
+                                  QStandardItem("")])
+        
+        for row in range(model.rowCount()):
+            self.diag_view.expand(model.index(row, 0))
+        directories = counters.get('directories', 0)
+        self.diag_label.setText(
+            f"总耗时 {total:.2f} 秒 · 列出 {directories:,} 个目录"
+            + (f"（{directories / total:,.0f} 个/秒）" if total else "")
+            + f" · stat {counters.get('stat', 0):,} 次 · 错误 {error_total:,} 个"
+            + f" · 超时 {counters.get('timeouts', 0):,} 个")
+        reports = [text for text in (data['profile'], data['memory']) if text]
+        self.diag_text.setPlainText("\n\n".join(reports) if reports else
+                                    "勾选上方的 cProfile 或 tracemalloc 后重新扫描，可在这里查看扫描线程的分析报告")
+    
+    def export_diagnostics(self):
+        """将诊断数据导出为 JSON 文件"""
+        if self.scan_stats is None:
+            return
+        from PySide6.QtWidgets import QFileDialog
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出诊断数据", "扫描诊断.json", "JSON Files (*.json)")
+        if not file_path:
+            return
+        data = {'path': self.current_scan_path, 'exported_at': time.time()}
+        data.update(self.scan_stats.to_dict())
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            QMessageBox.critical(self, "导出失败", f"无法写入文件: {e}")
+            return
+        self.statusBar().showMessage(f"✅ 诊断数据已导出到 {file_path}")
     
-    def update_progress(self, current_path, current, total):
+    def update_progress(self, current_path, current, percent):
         """更新进度"""
+        started = time.perf_counter()
         folder_name = os.path.basename(current_path)
-        progress = int(current * 100 / total) if total > 0 else 0
-        self.progress_bar.setValue(progress)
-        self.statusBar().showMessage(f"🔍 完成进度 {progress}% ({current}/{total}) 正在扫描: {folder_name}...")
+        if percent < 0:
+            # 总量未知时进度条显示为忙碌状态
+            self.progress_bar.setRange(0, 0)
+            self.statusBar().showMessage(f"🔍 已扫描 {current} 个项目，正在扫描: {folder_name}...")
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(percent)
+            self.statusBar().showMessage(f"🔍 完成进度 {percent}%（已扫描 {current} 个项目）正在扫描: {folder_name}...")
+        stats = getattr(self.scanner_thread, 'stats', None)     # 服务扫描的诊断数据在完成后才有
+        if stats is not None:
+            stats.add_time('gui_progress', time.perf_counter() - started)
+            stats.count('gui_progress_calls')
     
     def scan_finished(self, results):
         """扫描完成"""
+        started = time.perf_counter()
         # 恢复按钮状态
         self.scan_button.setEnabled(True)
         self.stop_button.setEnabled(False)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setText("⏸️ 暂停")
         self.export_button.setEnabled(True)
         # 统计文件和文件夹数量
-        folder_count = sum(1 for r in results if r['type'] == 'folder')
-        file_count = sum(1 for r in results if r['type'] == 'file')
+        types = bytes(results.types)     # 附加到服务扫描时为映射快照上的 memoryview
+        folder_count = types.count(TYPE_FOLDER)
+        file_count = types.count(TYPE_FILE)
         
+        self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(100)
         status_msg = f"✅ 扫描完成，共 {len(results)} 个项目（{folder_count} 个文件夹，{file_count} 个文件）"
+        skipped = sum(1 for _, _, timed_out in self.scanner_thread.slow_dirs if timed_out)
+        if skipped:
+            status_msg += f"，{skipped} 个目录超时被跳过（见“🐌 慢目录”）"
         self.statusBar().showMessage(status_msg)
         
         # 将结果设置到表格模型
-        self.table_model.set_items(results)
-        self.table_proxy.sort(4, Qt.DescendingOrder)  # 按大小列（第5列，索引4）排序
+        self.search_index = self.scanner_thread.search_index
+        self.breakdown = self.scanner_thread.breakdown
+        self.update_breakdown_view()
+        self.show_cleanup(self.scanner_thread.cleanup)
+        comparison = getattr(self.scanner_thread, 'comparison', None)
+        self.show_comparison(comparison)
+        self.treemap_view.set_store(results)
+        # 估算值不保存为快照，也不写入增长趋势；后台服务的扫描由服务写入趋势
+        estimated = results.estimate_errors is not None
+        self.save_snapshot_button.setEnabled(len(results) > 0 and not estimated)
+        if not estimated and not isinstance(self.scanner_thread, ServiceScanProxy):
+            self.record_trends(results)
+        # 结果已按大小排好序，模型沿用当前表头的排序状态，无需再次排序
+        self.table_model.set_store(results)
+        if self.search_edit.text().strip():
+            self.apply_search()
+        if self.filter_edit.text().strip():
+            self.apply_filter_expression()
+        stats = getattr(self.scanner_thread, 'stats', None)
+        if stats is not None:
+            stats.add_time('gui_finish', time.perf_counter() - started)
+            if stats is self.scan_stats:
+                self.update_diagnostics_view()
         
         # 显示统计信息
-        if results:
-            total_size = sum(r['size'] for r in results)
-            largest = results[0]['display_size'] if results else "0 B"
-            largest_name = results[0]['name'] if results else ""
+        if len(results):
+            total_size = results.total_size
+            largest = results.display_sizes[0]
+            largest_name = results.names[0]
+            
+            if estimated:
+                estimated_rows = sum(1 for error in results.estimate_errors if error)
+                self.statusBar().showMessage(
+                    f"⏱️ 估算完成：{len(results)} 个文件夹中 {estimated_rows} 个为估算值（斜体），"
+                    f"点击“🎯 精确扫描”可得到精确结果")
+                QMessageBox.information(
+                    self, "估算完成",
+                    f"📊 估算完成！\n\n📁 扫描路径: {self.current_scan_path}\n"
+                    f"💾 总大小: {results.display_sizes[0]}\n"
+                    f"📈 已列出 {len(results)} 个文件夹，{estimated_rows} 个的大小含抽样推算部分\n\n"
+                    f"±号后为约 95% 置信区间的半宽（近似值）。")
+                return
             
             msg = f"📊 扫描完成！\n\n"
             msg += f"📁 扫描路径: {self.current_scan_path}\n"
             msg += f"📈 文件夹数量: {len(results)}\n"
-            msg += f"💾 总大小: {self._format_size(total_size)}\n"
+            msg += f"💾 总大小: {format_size(total_size)}\n"
             msg += f"🏆 最大文件夹: {largest_name} ({largest})"
             
+            if comparison is not None:
+                self.result_tabs.setCurrentIndex(self.compare_tab_index)
+                QMessageBox.information(self, "比较完成", "⚖️ 文件夹比较完成！\n\n" + self.compare_label.text().strip())
+                return
+            
+            if results.root_ids is not None:
+                # 多磁盘扫描：各根目录的大小、所在物理磁盘和耗时
+                scanner = self.scanner_thread
+                devices = {root: device for device, roots in scanner.groups for root in roots}
+                totals = {}
+                for row in results.top_rows():
+                    root = results.root_name(row)
+                    totals[root] = totals.get(root, 0) + results.sizes[row]
+                msg += f"\n\n🗂️ 各根目录（{len(scanner.groups)} 块磁盘并行）:\n"
+                for root in results.roots:
+                    msg += (f"  {root}: {format_size(totals.get(root, 0))}"
+                            f"（{devices.get(root, '?')}，{scanner.durations.get(root, 0):.1f} 秒）\n")
+                msg += f"  合计: {format_size(sum(totals.values()))}"
+                for root, message in scanner.errors:
+                    msg += f"\n❌ {root}: {message}"
+            
             QMessageBox.information(self, "扫描完成", msg)
     
+    def on_cold_bucket_changed(self, index):
+        """切换冷数据阈值"""
+        if index >= 0:
+            self.table_model.set_cold_bucket(index)
+    
+    def on_size_units_changed(self, index):
+        """切换大小显示单位并刷新各视图（显示文本都是按需生成的，无需重建结果）"""
+        if index < 0:
+            return
+        system, _, unit = self.unit_combo.itemData(index).partition(':')
+        format_size.configure(system, unit or None)
+        settings = QSettings()
+        settings.setValue("display/size_system", system)
+        settings.setValue("display/size_unit", unit)
+        for model in (self.table_model, self.diff_model, self.compare_model, self.trend_model):
+            rows = model.rowCount()
+            if rows:
+                model.dataChanged.emit(model.index(0, 0), model.index(rows - 1, model.columnCount() - 1))
+        self.update_breakdown_view()
+        self.show_cleanup(self.cleanup)
+    
+    def on_treemap_root_changed(self, row):
+        """树状图放大/缩小后更新路径显示"""
+        store = self.treemap_view.store
+        self.treemap_up_button.setEnabled(row != self.treemap_view.top_root)
+        if store is None:
+            self.treemap_path_label.setText("")
+        elif row >= 0:
+            self.treemap_path_label.setText(f"  {store.paths[row]}（{store.display_sizes[row]}）  左键放大，右键返回")
+        else:
+            self.treemap_path_label.setText(f"  {self.current_scan_path}  左键放大，右键返回")
+    
+    def on_treemap_layout_done(self, tile_count, layout_ms, paint_ms):
+        self.treemap_stats_label.setText(f"{tile_count} 块 · 布局 {layout_ms:.0f} ms · 绘制 {paint_ms:.0f} ms")
+    
+    def load_snapshot_list(self, select_file=None):
+        """在后台读取快照列表（每个快照读一次文件头），不拖慢启动"""
+        self.background.call(lambda snapshots, error: self._show_snapshot_list(
+            snapshots if error is None else [], select_file), list_snapshots)
+    
+    def _show_snapshot_list(self, snapshots, select_file=None):
+        """刷新快照下拉框；select_file 为新保存的快照时把它选为“新”快照"""
+        for combo in (self.old_snapshot_combo, self.new_snapshot_combo):
+            combo.clear()
+            for header in snapshots:
+                stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(header['scan_time']))
+                combo.addItem(f"{header['name']}（{stamp} · {format_size(header['total_size'])}）",
+                              header['file'])
+        if len(snapshots) >= 2:
+            self.new_snapshot_combo.setCurrentIndex(0)
+            # 默认与同一扫描路径的上一个快照比较
+            newest = snapshots[0]
+            for i, header in enumerate(snapshots[1:], 1):
+                if header['root'] == newest['root']:
+                    self.old_snapshot_combo.setCurrentIndex(i)
+                    break
+            else:
+                self.old_snapshot_combo.setCurrentIndex(1)
+        if select_file:
+            index = self.new_snapshot_combo.findData(select_file)
+            if index >= 0:
+                self.new_snapshot_combo.setCurrentIndex(index)
+        self.diff_button.setEnabled(len(snapshots) >= 2)
+        self.open_snapshot_button.setEnabled(len(snapshots) > 0)
+    
+    def save_snapshot(self):
+        """把当前扫描结果保存为命名快照"""
+        store = self.table_model.store
+        if not len(store) or self.snapshot_thread is not None:
+            return
+        default_name = f"{os.path.basename(self.current_scan_path.rstrip(os.sep)) or self.current_scan_path} " \
+                       f"{time.strftime('%Y-%m-%d %H%M', time.localtime(store.scan_time))}"
+        name, ok = QInputDialog.getText(self, "保存快照", "快照名称：", text=default_name)
+        if not ok or not name.strip():
+            return
+        if os.path.exists(snapshot_file(name.strip())):
+            reply = QMessageBox.question(self, "保存快照", f"快照“{name.strip()}”已存在，是否覆盖？",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        
+        self.save_snapshot_button.setEnabled(False)
+        self.statusBar().showMessage("📸 正在保存快照...")
+        self.snapshot_thread = SnapshotSaveWorker(store, self.current_scan_path, name.strip())
+        self.snapshot_thread.finished.connect(self.snapshot_saved)
+        self.snapshot_thread.error.connect(self.snapshot_error)
+        self.snapshot_thread.start()
+    
+    def snapshot_saved(self, file_path):
+        self.snapshot_thread = None
+        self.save_snapshot_button.setEnabled(True)
+        self.statusBar().showMessage(f"📸 快照已保存: {file_path}")
+        self.load_snapshot_list(select_file=file_path)
+    
+    def snapshot_error(self, error_msg):
+        self.snapshot_thread = None
+        self.diff_button.setEnabled(self.old_snapshot_combo.count() >= 2)
+        self.save_snapshot_button.setEnabled(len(self.table_model.store) > 0)
+        self.statusBar().showMessage(f"❌ {error_msg}")
+        QMessageBox.critical(self, "快照错误", error_msg)
+    
+    def open_snapshot(self):
+        """用 mmap 打开“新”快照并显示在结果表格中"""
+        file_path = self.new_snapshot_combo.currentData()
+        if not file_path or (self.scanner_thread and self.scanner_thread.isRunning()):
+            return
+        start = time.perf_counter()
+        try:
+            store = MappedScanResultStore(file_path)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.critical(self, "快照错误", f"无法打开快照: {e}")
+            return
+        
+        self._show_results(store, store.root)
+        self.save_snapshot_button.setEnabled(False)
+        self.result_tabs.setCurrentIndex(0)
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(store.scan_time))
+        self.statusBar().showMessage(
+            f"📂 已打开快照“{store.name}”（{store.root} · {stamp}），共 {len(store):,} 项（{elapsed_ms:.0f} ms）")
+    
+    def import_ncdu(self):
+        """在后台导入 ncdu 导出文件并显示在结果表格中（勾选“文件”时包含文件）"""
+        if (self.scanner_thread and self.scanner_thread.isRunning()) or self.ncdu_thread is not None:
+            return
+        from PySide6.QtWidgets import QFileDialog
+        file_path, _ = QFileDialog.getOpenFileName(self, "导入 ncdu 导出文件", "",
+                                                   "ncdu JSON (*.json *.json.gz *.gz);;All Files (*)")
+        if not file_path:
+            return
+        self.import_ncdu_button.setEnabled(False)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.statusBar().showMessage(f"📥 正在导入 {file_path}...")
+        self._ncdu_started = time.perf_counter()
+        self.ncdu_thread = NcduImportWorker(file_path, self.scan_files_checkbox.isChecked(), load_file_categories())
+        self.ncdu_thread.progress.connect(self.progress_bar.setValue)
+        self.ncdu_thread.finished.connect(self.ncdu_imported)
+        self.ncdu_thread.error.connect(self.ncdu_error)
+        self.ncdu_thread.start()
+    
+    def ncdu_imported(self, result):
+        self.ncdu_thread = None
+        self.import_ncdu_button.setEnabled(True)
+        self.progress_bar.setValue(100)
+        store = result['store']
+        self._show_results(store, result['root'], result['breakdown'])
+        self.save_snapshot_button.setEnabled(len(store) > 0)
+        self.result_tabs.setCurrentIndex(0)
+        
+        stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(store.scan_time))
+        self.statusBar().showMessage(
+            f"📥 已导入 ncdu 导出文件（{result['root']} · {stamp}），共 {len(store):,} 项"
+            f"（{time.perf_counter() - self._ncdu_started:.1f} 秒）")
+    
+    def export_ncdu(self):
+        """把当前的完整扫描结果导出为 ncdu JSON 格式"""
+        store = self.table_model.store
+        if not len(store):
+            QMessageBox.warning(self, "导出失败", "没有可导出的数据，请先执行扫描")
+            return
+        if self.ncdu_thread is not None:
+            return
+        from PySide6.QtWidgets import QFileDialog
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出 ncdu JSON", "扫描结果.ncdu.json", "JSON Files (*.json)")
+        if not file_path:
+            return
+        self.statusBar().showMessage("📤 正在导出 ncdu JSON...")
+        self.ncdu_thread = NcduExportWorker(store, file_path)
+        self.ncdu_thread.finished.connect(self.ncdu_exported)
+        self.ncdu_thread.error.connect(self.ncdu_error)
+        self.ncdu_thread.start()
+    
+    def ncdu_exported(self, file_path):
+        self.ncdu_thread = None
+        self.statusBar().showMessage(f"📤 已导出 ncdu JSON: {file_path}")
+    
+    def ncdu_error(self, error_msg):
+        self.ncdu_thread = None
+        self.import_ncdu_button.setEnabled(True)
+        self.statusBar().showMessage(f"❌ {error_msg}")
+        QMessageBox.critical(self, "ncdu 导入导出", error_msg)
+    
+    def _show_results(self, store, root, breakdown=None, cleanup=None):
+        """显示已有的扫描结果（快照或服务的最近一次扫描）"""
+        self.current_scan_path = root
+        self.search_index = None        # 首次搜索时再建立索引
+        self.search_mask = None
+        self.expression_mask = None
+        self.breakdown = breakdown
+        self.update_breakdown_view()
+        self.show_cleanup(cleanup)
+        self.slow_model.removeRows(0, self.slow_model.rowCount())
+        self.show_diagnostics(None)
+        self.treemap_view.set_store(store)
+        self.table_model.set_store(store)
+        if self.search_edit.text().strip():
+            self.apply_search()
+        if self.filter_edit.text().strip():
+            self.apply_filter_expression()
+        self.export_button.setEnabled(True)
+    
+    def load_latest_scan(self, path):
+        """直接映射后台服务（含定时扫描）对 path 最近一次完成的扫描结果，不需要服务正在运行"""
+        if self.scanner_thread and self.scanner_thread.isRunning():
+            return
+        info = latest_service_scan(path)
+        if info is None:
+            return
+        try:
+            store = MappedScanResultStore(info['snapshot'])
+        except (OSError, ValueError, KeyError) as e:
+            self.statusBar().showMessage(f"❌ 无法打开后台扫描结果: {e}")
+            return
+        breakdown = None
+        if info.get('breakdown') is not None:
+            breakdown = TypeBreakdown(load_file_categories())
+            breakdown.extensions = info['breakdown']
+        cleanup = None
+        if info.get('cleanup') is not None:
+            cleanup = CleanupCandidates.from_list(info['cleanup'])
+        self._show_results(store, info['path'], breakdown, cleanup)
+        self.save_snapshot_button.setEnabled(len(store) > 0)
+        for path, seconds, skipped in info.get('slow_dirs') or ():
+            self.add_slow_directory(path, seconds, skipped)
+        if info.get('diagnostics'):
+            self.show_diagnostics(ScanStats.from_dict(info['diagnostics']))
+        
+        stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(store.scan_time))
+        hours = (time.time() - (info.get('finished_at') or store.scan_time)) / 3600
+        age = f"{hours * 60:.0f} 分钟前" if hours < 1 else f"{hours:.1f} 小时前" if hours < 48 else f"{hours / 24:.0f} 天前"
+        source = "定时扫描" if info.get('scheduled') else "后台扫描"
+        self.statusBar().showMessage(
+            f"📂 已载入{source}结果（{info['path']} · {stamp} 开始，{age}完成），共 {len(store):,} 项；"
+            f"点击“🔍 开始扫描”可重新扫描")
+    
+    def toggle_scheduled_scan(self, path):
+        """加入或移出定时扫描，并让后台服务立即检查"""
+        enabled = not ScanSchedule().contains(path)
+        ScanSchedule.set_scheduled(path, enabled)
+        if not enabled:
+            self.statusBar().showMessage(f"⏰ 已取消定时扫描: {path}")
+            return
+        schedule = ScanSchedule()
+        self.statusBar().showMessage(
+            f"⏰ 已加入定时扫描: {path}（每 {schedule.interval / 3600:g} 小时，系统空闲时每 "
+            f"{schedule.idle_interval / 3600:g} 小时，{SCAN_PRIORITIES[schedule.priority][0]}）")
+        if self.connect_service(launch=True):
+            self.service_client.call('schedule.check')
+    
+    def compare_snapshots(self):
+        """在后台比较两个快照"""
+        old_file = self.old_snapshot_combo.currentData()
+        new_file = self.new_snapshot_combo.currentData()
+        if not old_file or not new_file or self.snapshot_thread is not None:
+            return
+        if old_file == new_file:
+            QMessageBox.warning(self, "警告", "请选择两个不同的快照！")
+            return
+        
+        self.diff_button.setEnabled(False)
+        self.diff_model.set_entries([])
+        self.diff_label.setText("  正在比较...")
+        self.snapshot_thread = SnapshotDiffWorker(old_file, new_file)
+        self.snapshot_thread.progress.connect(
+            lambda count: self.diff_label.setText(f"  正在比较... 已发现 {count:,} 处变化"))
+        self.snapshot_thread.finished.connect(self.snapshot_diff_finished)
+        self.snapshot_thread.error.connect(self.snapshot_error)
+        self.snapshot_thread.start()
+    
+    def snapshot_diff_finished(self, diff):
+        self.snapshot_thread = None
+        self.diff_button.setEnabled(True)
+        self.diff_view.horizontalHeader().setSortIndicator(5, Qt.DescendingOrder)
+        self.diff_model.set_entries(diff['entries'])
+        
+        counts, deltas = diff['counts'], diff['deltas']
+        total = sum(deltas.values())
+        parts = [f"{SnapshotDiffModel.CHANGE_NAMES[key]} {counts[key]:,} 项（{'+' if deltas[key] >= 0 else '-'}{format_size(abs(deltas[key]))}）"
+                 for key in ('added', 'removed', 'grown', 'shrunk')]
+        summary = f"  净变化 {'+' if total >= 0 else '-'}{format_size(abs(total))} · " + " · ".join(parts)
+        if sum(counts.values()) > len(diff['entries']):
+            summary += f" · 仅显示变化最大的 {len(diff['entries']):,} 项"
+        self.diff_label.setText(summary)
+    
+    def compare_folders(self):
+        """选择两个或更多文件夹，同时扫描后按相对路径比较"""
+        if not self.scan_button.isEnabled():
+            QMessageBox.warning(self, "警告", "请等待当前扫描结束")
+            return
+        settings = QSettings()
+        saved = settings.value("compare/roots", [])
+        if isinstance(saved, str):      # 只保存了一项时 QSettings 返回字符串
+            saved = [saved]
+        if not saved:
+            current_index = self.tree_view.currentIndex()
+            if current_index.isValid():
+                saved = [self.tree_model.itemFromIndex(current_index).data(Qt.UserRole)]
+        text, ok = QInputDialog.getMultiLineText(
+            self, "文件夹比较", "要比较的文件夹（每行一个，至少两个；第一个为基准）：", "\n".join(saved))
+        if not ok:
+            return
+        roots = [line.strip() for line in text.splitlines() if line.strip()]
+        missing = [root for root in roots if not os.path.isdir(root)]
+        if missing:
+            QMessageBox.warning(self, "警告", "以下文件夹不存在：\n" + "\n".join(missing))
+            return
+        if len(roots) < 2:
+            QMessageBox.warning(self, "警告", "请至少输入两个文件夹")
+            return
+        settings.setValue("compare/roots", roots)
+        
+        self.current_scan_path = " ⇄ ".join(roots)
+        self._prepare_scan_view(f"⚖️ 正在扫描并比较 {len(roots)} 个文件夹...")
+        self.compare_label.setText("  正在扫描...")
+        dir_timeout = float(settings.value("scan/dir_timeout", 10.0))
+        self.scanner_thread = FolderCompareScanner(roots, self.scan_files_checkbox.isChecked(),
+                                                   self.scan_folders_checkbox.isChecked(), load_file_categories(),
+                                                   self.priority_combo.currentData(), dir_timeout,
+                                                   FakeSlowLister.from_environment())
+        self.scanner_thread.profile = self.profile_checkbox.isChecked()
+        self.scanner_thread.trace_memory = self.tracemalloc_checkbox.isChecked()
+        self._connect_scanner()
+        self.scanner_thread.start()
+    
+    def show_comparison(self, comparison):
+        """刷新文件夹比较面板；comparison 为 None 时清空"""
+        self.compare_model.set_comparison(comparison)
+        self.compare_view.horizontalHeader().setSortIndicator(self.compare_model.columnCount() - 1,
+                                                             Qt.DescendingOrder)
+        for column in range(3, self.compare_model.columnCount()):
+            self.compare_view.setColumnWidth(column, 110)
+        if comparison is None:
+            self.compare_label.setText("")
+            return
+        parts = [f"#{i} {format_size(total)}（缺 {missing:,} 项 {format_size(missing_bytes)}）"
+                 for i, (total, missing, missing_bytes)
+                 in enumerate(zip(comparison['totals'], comparison['missing'], comparison['missing_bytes']), 1)]
+        summary = (f"  相同 {comparison['same']:,} 项 · 大小不同 {comparison['differs']:,} 项 · "
+                   + " · ".join(parts))
+        if comparison['count'] > len(comparison['entries']):
+            summary += f" · 仅显示差值最大的 {len(comparison['entries']):,} 项"
+        self.compare_label.setText(summary)
+    
+    def record_trends(self, results):
+        """把本次扫描的文件夹大小写入趋势库（深度由 QSettings 的 trend/depth 设置）"""
+        if not len(results) or (self.trend_thread is not None and self.trend_thread.isRunning()):
+            return
+        depth = QSettings().value("trend/depth", 3, type=int)
+        self.trend_thread = TrendRecordWorker(results, self.current_scan_path, depth)
+        self.trend_thread.finished.connect(lambda written: self.refresh_trends())
+        self.trend_thread.error.connect(lambda msg: self.statusBar().showMessage(f"❌ {msg}"))
+        self.trend_thread.start()
+    
+    def refresh_trends(self):
+        """刷新增长最快的文件夹排名和迷你折线图"""
+        root = self.current_scan_path
+        if not root:
+            return
+        window_days = self.trend_window_combo.currentData()
+        try:
+            trends = TrendStore()
+            try:
+                times = trends.scan_times(root)
+                growth = trends.growth(root, window_days)
+                recent = times[-30:]
+                rows = [row + (trends.series(row[0], recent),) for row in growth]
+            finally:
+                trends.close()
+        except (OSError, sqlite3.Error) as e:
+            self.trend_label.setText(f"  ❌ 读取增长趋势失败: {e}")
+            return
+        self.trend_model.set_rows(rows)
+        
+        summary = f"  {root} · 共 {len(times)} 次扫描记录"
+        # 用扫描根文件夹的增长速度估算磁盘写满时间
+        root_key = os.path.normcase(root)
+        root_rows = [row for row in rows if os.path.normcase(row[1]) == root_key]
+        if root_rows and len(times) >= 2:
+            rate = root_rows[0][4]
+            summary += f" · 整体每天 {'+' if rate >= 0 else '-'}{format_size(abs(int(rate)))}"
+            try:
+                free = psutil.disk_usage(root).free
+            except OSError:
+                free = 0
+            if rate > 0 and free:
+                summary += f" · 按此速度约 {free / rate:,.0f} 天后写满（剩余 {format_size(free)}）"
+        self.trend_label.setText(summary)
+    
+    def update_breakdown_view(self):
+        """刷新类型分布面板"""
+        if self.breakdown is None:
+            self.breakdown_model.set_rows([], "类别")
+            self.breakdown_label.setText("")
+            return
+        
+        if self.breakdown_combo.currentData() == "extension":
+            rows, header = self.breakdown.by_extension(), "扩展名"
+        else:
+            rows, header = self.breakdown.by_category(), "类别"
+        self.breakdown_model.set_rows(
+            [(name, count, size, format_size(size)) for name, count, size in rows], header)
+        
+        file_count = sum(r[1] for r in rows)
+        total_size = sum(r[2] for r in rows)
+        self.breakdown_label.setText(
+            f"  {self.current_scan_path} · {file_count:,} 个文件 · {format_size(total_size)}")
+    
+    def show_cleanup(self, cleanup):
+        """刷新清理建议面板；cleanup 为 None 表示没有检测结果（如打开的快照）"""
+        self.cleanup = cleanup
+        if cleanup is None:
+            self.cleanup_model.set_rows([])
+            self.cleanup_label.setText("")
+            return
+        self.cleanup_model.set_rows(cleanup.recommendations())
+        categories = cleanup.by_category()
+        if not categories:
+            self.cleanup_label.setText("  未发现已知的可清理内容（估算扫描不检测清理候选）")
+            return
+        total = sum(r[2] for r in categories)
+        summary = " · ".join(f"{category} {format_size(size)}" for category, _, size in categories)
+        self.cleanup_label.setText(f"  共可回收约 {format_size(total)}：{summary}（双击打开所在位置）")
+    
+    def open_cleanup_candidate(self, index):
+        """打开清理候选所在的文件夹"""
+        if index.isValid():
+            path = self.cleanup_model.rows[index.row()][1]
+            if os.path.exists(path):
+                self._open_explorer(path)
+    
+    def on_search_text_changed(self, text):
+        """搜索文本变化，延迟执行以合并连续输入"""
+        self.search_timer.start()
+    
+    def apply_search(self):
+        """使用搜索索引过滤表格"""
+        text = self.search_edit.text().strip()
+        if self.search_index is None:
+            # 打开的快照没有预先建立索引，首次搜索时建立
+            if not text or not len(self.table_model.store):
+                return
+            self.statusBar().showMessage("🔎 正在建立搜索索引...")
+            QApplication.processEvents()
+            self.search_index = SearchIndex(self.table_model.store)
+        
+        if not text:
+            self.search_mask = None
+            self._update_table_filter()
+            return
+        
+        start = time.perf_counter()
+        rows = self.search_index.search(text)
+        self.search_mask = rows_to_mask(rows, len(self.table_model.store))
+        self._update_table_filter()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.statusBar().showMessage(f"🔎 找到 {len(rows)} 个匹配项，显示 {self.table_model.rowCount()} 项（{elapsed_ms:.1f} ms）")
+    
+    def on_filter_text_changed(self, text):
+        """过滤表达式被清空时立即取消过滤"""
+        if not text.strip() and self.expression_mask is not None:
+            self.apply_filter_expression()
+    
+    def apply_filter_expression(self):
+        """编译过滤表达式并对整个结果求值"""
+        text = self.filter_edit.text().strip()
+        try:
+            expression = FilterExpression(text)
+        except FilterSyntaxError as e:
+            self.statusBar().showMessage(f"❌ 过滤表达式错误: {e}")
+            return
+        
+        store = self.table_model.store
+        start = time.perf_counter()
+        self.expression_mask = expression.evaluate(store) if expression and len(store) else None
+        self._update_table_filter()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self.expression_mask is not None:
+            self.statusBar().showMessage(f"⚗️ 过滤后显示 {self.table_model.rowCount()} / {len(store)} 项（{elapsed_ms:.1f} ms）")
+    
+    def _update_table_filter(self):
+        """合并搜索与过滤表达式的掩码并应用到表格"""
+        self.table_model.set_filter_mask(mask_and(self.search_mask, self.expression_mask))
+    
     def scan_error(self, error_msg):
         """扫描错误"""
         QMessageBox.critical(self, "扫描错误", f"❌ 扫描过程中发生错误:\n{error_msg}")
         self.scan_button.setEnabled(True)
         self.stop_button.setEnabled(False)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setText("⏸️ 暂停")
         self.export_button.setEnabled(False)  # 扫描错误时禁用导出按钮
+        self.progress_bar.setRange(0, 100)
         self.statusBar().showMessage("❌ 扫描失败")
     
     def stop_scan(self):
-        """停止扫描"""
+        """停止扫描：只发出取消请求，不在界面线程中等待，扫描线程退出后由 scan_stopped 恢复界面"""
         if self.scanner_thread and self.scanner_thread.isRunning():
             self.scanner_thread.cancel()
-        self.scanner_thread.wait()
+            self.stop_button.setEnabled(False)
+            self.pause_button.setEnabled(False)
+            self.statusBar().showMessage("⏹️ 正在停止扫描并保存进度...")
+            return
+        self.scan_stopped()
+    
+    def scan_stopped(self):
+        """扫描线程已响应取消"""
+        if self._exact_after_stop:
+            self._exact_after_stop = False
+            self.start_scan()
+            return
         self.scan_button.setEnabled(True)
         self.stop_button.setEnabled(False)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setText("⏸️ 暂停")
         self.export_button.setEnabled(False)  # 扫描停止时禁用导出按钮
-        self.statusBar().showMessage("⏹️ 扫描已停止")
+        self.progress_bar.setRange(0, 100)
+        self.statusBar().showMessage("⏹️ 扫描已停止，进度已保存，下次扫描同一路径时可从断点继续")
     
     def export_to_excel(self):
         """将扫描结果导出到Excel文件"""
         # 检查是否有扫描结果
-        if not self.table_model.items:
+        # 导出表格当前显示的行（已应用搜索/过滤和排序）
+        store = self.table_model.store
+        rows = [self.table_model.row_id(r) for r in range(self.table_model.rowCount())]
+        if not rows:
             QMessageBox.warning(self, "导出失败", "没有可导出的数据，请先执行扫描")
             return
         
@@ -953,13 +7806,14 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
                     cell.alignment = Alignment(horizontal='center', vertical='center')
                 
                 # 填充数据
-                for row, item in enumerate(self.table_model.items, 2):
+                for row, i in enumerate(rows, 2):
+                    size = store.sizes[i]
                     ws.cell(row=row, column=1, value=row-1)
-                    ws.cell(row=row, column=2, value=item['name'])
-                    ws.cell(row=row, column=3, value='文件夹' if item['type'] == 'folder' else '文件')
-                    ws.cell(row=row, column=4, value=item['path'])
-                    ws.cell(row=row, column=5, value=item['display_size'])
-                    ws.cell(row=row, column=6, value=item['size'] / (1024**3) if item['size'] > 0 else 0)
+                    ws.cell(row=row, column=2, value=store.names[i])
+                    ws.cell(row=row, column=3, value=store.type_name(i))
+                    ws.cell(row=row, column=4, value=store.paths[i])
+                    ws.cell(row=row, column=5, value=store.display_sizes[i])
+                    ws.cell(row=row, column=6, value=size / (1024**3) if size > 0 else 0)
                 
                 # 调整列宽
                 for col in range(1, len(headers) + 1):
@@ -980,13 +7834,14 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
                 worksheet.write_row(0, 0, headers, header_format)
                 
                 # 填充数据
-                for row, item in enumerate(self.table_model.items, 1):
+                for row, i in enumerate(rows, 1):
+                    size = store.sizes[i]
                     worksheet.write(row, 0, row)
-                    worksheet.write(row, 1, item['name'])
-                    worksheet.write(row, 2, '文件夹' if item['type'] == 'folder' else '文件')
-                    worksheet.write(row, 3, item['path'])
-                    worksheet.write(row, 4, item['display_size'])
-                    worksheet.write(row, 5, item['size'] / (1024**3) if item['size'] > 0 else 0)
+                    worksheet.write(row, 1, store.names[i])
+                    worksheet.write(row, 2, store.type_name(i))
+                    worksheet.write(row, 3, store.paths[i])
+                    worksheet.write(row, 4, store.display_sizes[i])
+                    worksheet.write(row, 5, size / (1024**3) if size > 0 else 0)
                 
                 # 调整列宽
                 worksheet.set_column('A:A', 8)
@@ -1023,106 +7878,102 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
     
     def open_folder_from_table(self, index):
         """从表格打开文件夹"""
-        source_index = self.table_proxy.mapToSource(index)
-        if source_index.isValid():
-            folder = self.table_model.items[source_index.row()]
-            path = folder.get('path', '')
+        if index.isValid():
+            path = self.table_model.store.paths[self.table_model.row_id(index.row())]
             if path and os.path.exists(path):
                 self._open_explorer(path)
     
     def delete_selected_items(self):
-        """删除选中的文件或文件夹到回收站"""
+        """把选中的文件或文件夹移到回收站（在后台线程中进行，可取消）"""
         # 获取选中的行
         selected_rows = self.table_view.selectionModel().selectedRows()
         if not selected_rows:
             return
+        if self.delete_thread is not None and self.delete_thread.isRunning():
+            QMessageBox.warning(self, "警告", "上一次删除还在进行中")
+            return
+        
+        # 已选中祖先文件夹的项目会随祖先一起删除，不再单独处理
+        store = self.table_model.store
+        rows = {self.table_model.row_id(index.row()) for index in selected_rows if index.isValid()}
+        items = []
+        total_size = 0
+        for row in sorted(rows):
+            parent = store.parents[row]
+            while parent >= 0 and parent not in rows:
+                parent = store.parents[parent]
+            if parent < 0:
+                items.append((row, store.paths[row], store.names[row]))
+                total_size += store.sizes[row]
         
         # 确认删除操作
         confirm = QMessageBox.question(self, "确认删除", 
-                                      f"确定要将选中的 {len(selected_rows)} 个项目删除到回收站吗？\n\n注意：文件夹将被彻底删除，文件将被删除到回收站。",
+                                      f"确定要将选中的 {len(items)} 个项目（{format_size(total_size)}）移到回收站吗？",
                                       QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if confirm != QMessageBox.Yes:
             return
         
-        # 准备Windows API函数
-        try:
-            # Windows API常量
-            FO_DELETE = 3
-            FOF_ALLOWUNDO = 0x40  # 删除到回收站
-            FOF_NOCONFIRMATION = 0x10  # 不显示确认对话框
-            FOF_SILENT = 0x4  # 不显示进度对话框
-            
-            # 定义结构体
-            class SHFILEOPSTRUCT(ctypes.Structure):
-                _fields_ = [
-                    ("hwnd", wintypes.HWND),
-                    ("wFunc", wintypes.UINT),
-                    ("pFrom", ctypes.c_wchar_p),
-                    ("pTo", ctypes.c_wchar_p),
-                    ("fFlags", wintypes.WORD),
-                    ("fAnyOperationsAborted", wintypes.BOOL),
-                    ("hNameMappings", ctypes.c_void_p),
-                    ("lpszProgressTitle", ctypes.c_wchar_p)
-                ]
-            
-            # 获取函数
-            shfileop = ctypes.windll.shell32.SHFileOperationW
-            shfileop.argtypes = [ctypes.POINTER(SHFILEOPSTRUCT)]
-            shfileop.restype = wintypes.INT
-            
-            # 处理选中的项目
-            success_count = 0
-            failed_count = 0
-            failed_items = []
-            
-            for index in selected_rows:
-                source_index = self.table_proxy.mapToSource(index)
-                if source_index.isValid():
-                    item = self.table_model.items[source_index.row()]
-                    path = item.get('path', '')
-                    
-                    if not path or not os.path.exists(path):
-                        failed_count += 1
-                        failed_items.append(item.get('name', ''))
-                        continue
-                    
-                    try:
-                        # 构建SHFILEOPSTRUCT
-                        file_op = SHFILEOPSTRUCT()
-                        file_op.hwnd = None
-                        file_op.wFunc = FO_DELETE
-                        file_op.pFrom = path + '\0'  # 路径必须以双空字符结尾
-                        file_op.pTo = None
-                        file_op.fFlags = FOF_ALLOWUNDO | FOF_NOCONFIRMATION | FOF_SILENT
-                        file_op.fAnyOperationsAborted = False
-                        file_op.hNameMappings = None
-                        file_op.lpszProgressTitle = None
-                        
-                        # 调用API
-                        result = shfileop(ctypes.byref(file_op))
-                        if result == 0 and not file_op.fAnyOperationsAborted:
-                            success_count += 1
-                        else:
-                            failed_count += 1
-                            failed_items.append(item.get('name', ''))
-                    except Exception as e:
-                        failed_count += 1
-                        failed_items.append(item.get('name', ''))
-            
-            # 显示删除结果
-            msg = f"删除完成！\n\n"
-            msg += f"成功删除: {success_count} 个项目\n"
-            if failed_count > 0:
-                msg += f"删除失败: {failed_count} 个项目\n"
-                if len(failed_items) <= 10:
-                    msg += f"失败项目: {', '.join(failed_items)}"
-                else:
-                    msg += f"失败项目: {', '.join(failed_items[:10])}... 等{failed_count}个"
-            
-            QMessageBox.information(self, "删除结果", msg)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "删除失败", f"删除过程中发生错误:\n{str(e)}")
+        self.delete_progress = QProgressDialog("🗑️ 正在移到回收站...", "取消", 0, len(items), self)
+        self.delete_progress.setWindowTitle("删除")
+        self.delete_progress.setWindowModality(Qt.WindowModal)
+        self.delete_progress.setMinimumDuration(300)
+        self.delete_progress.setValue(0)
+        
+        self.delete_store = store      # 删除期间表格可能换成新的扫描结果
+        self.delete_thread = DeleteWorker(items)
+        self.delete_thread.progress.connect(lambda done, total: self.delete_progress.setValue(done))
+        self.delete_progress.canceled.connect(self.delete_thread.cancel)
+        self.delete_thread.finished.connect(self.delete_finished)
+        self.delete_thread.start()
+    
+    def delete_finished(self, result):
+        """删除结束：从结果中去掉已删除的项目并更新各祖先文件夹的大小"""
+        self.delete_progress.reset()
+        deleted = result['deleted']
+        failed = result['failed']
+        store = self.delete_store
+        self.delete_store = None
+        freed = sum(store.sizes[row] for row in deleted)
+        
+        if deleted and store is not self.table_model.store:
+            self.statusBar().showMessage("🗑️ 已删除，扫描结果已更换，不再更新")
+        elif deleted:
+            if isinstance(store, MappedScanResultStore):
+                # 打开的快照是只读的，不随删除更新
+                self.statusBar().showMessage("🗑️ 已删除，当前显示的是快照，重新扫描后才会更新")
+            else:
+                if self.breakdown is not None:
+                    for row in deleted:
+                        if store.types[row] == TYPE_FILE:
+                            self.breakdown.add(store.names[row], -store.sizes[row], -1)
+                    self.update_breakdown_view()
+                if self.cleanup is not None:
+                    self.cleanup.discard([store.paths[row] for row in deleted])
+                    self.show_cleanup(self.cleanup)
+                store.remove_rows(deleted)
+                # 行号已变化，搜索索引和过滤掩码需要重建
+                self.search_index = None
+                self.search_mask = None
+                self.expression_mask = None
+                self.table_model.set_store(store)
+                self.treemap_view.set_store(store)
+                if self.search_edit.text().strip():
+                    self.apply_search()
+                if self.filter_edit.text().strip():
+                    self.apply_filter_expression()
+        
+        # 显示删除结果
+        msg = "删除已取消！\n\n" if result['cancelled'] else "删除完成！\n\n"
+        msg += f"成功删除: {len(deleted)} 个项目（{format_size(freed)}）\n"
+        if failed:
+            msg += f"删除失败: {len(failed)} 个项目\n"
+            failed_items = [f"{name}（{reason}）" if name else reason for name, reason in failed]
+            if len(failed_items) <= 10:
+                msg += f"失败项目: {', '.join(failed_items)}"
+            else:
+                msg += f"失败项目: {', '.join(failed_items[:10])}... 等{len(failed)}个"
+        
+        QMessageBox.information(self, "删除结果", msg)
     
     def _open_explorer(self, path):
         """使用系统资源管理器打开文件夹"""
@@ -1152,6 +8003,14 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
             scan_action.triggered.connect(self.start_scan)
             menu.addAction(scan_action)
             
+            path = self.tree_model.itemFromIndex(index).data(Qt.UserRole)
+            if path:
+                scheduled = ScanSchedule().contains(path)
+                schedule_action = QAction("⏰ 取消定时扫描" if scheduled else "⏰ 加入定时扫描", self)
+                schedule_action.setToolTip("由后台扫描服务定期重新扫描，打开程序时直接显示最近的结果")
+                schedule_action.triggered.connect(lambda: self.toggle_scheduled_scan(path))
+                menu.addAction(schedule_action)
+            
             menu.addSeparator()
             
             refresh_action = QAction("🔄 刷新", self)
@@ -1201,10 +8060,8 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
     
     def copy_path_from_table(self, index):
         """复制路径到剪贴板"""
-        source_index = self.table_proxy.mapToSource(index)
-        if source_index.isValid():
-            item = self.table_model.items[source_index.row()]
-            path = item.get('path', '')
+        if index.isValid():
+            path = self.table_model.store.paths[self.table_model.row_id(index.row())]
             if path:
                 clipboard = QApplication.clipboard()
                 clipboard.setText(path)
@@ -1212,10 +8069,8 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
     
     def copy_size_from_table(self, index):
         """复制大小到剪贴板"""
-        source_index = self.table_proxy.mapToSource(index)
-        if source_index.isValid():
-            item = self.table_model.items[source_index.row()]
-            size = item.get('display_size', '')
+        if index.isValid():
+            size = self.table_model.store.display_sizes[self.table_model.row_id(index.row())]
             if size:
                 clipboard = QApplication.clipboard()
                 clipboard.setText(size)
@@ -1237,12 +8092,14 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
         """展开树节点的所有子文件夹"""
         item = self.tree_model.itemFromIndex(index)
         
-        # 先加载子文件夹
+        # 尚未加载的子文件夹在后台列出，列出后再继续展开
         if item.rowCount() == 1:
             child = item.child(0)
             if child and child.text() == "...":
                 item.removeRow(0)
-                self.load_subfolders(item)
+                self.load_subfolders(item, expand_all=True)
+                self.tree_view.expand(index)
+                return
         
         # 展开当前节点
         self.tree_view.expand(index)
@@ -1255,10 +8112,8 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
     
     def locate_in_tree(self, index):
         """在树形图中定位文件夹"""
-        source_index = self.table_proxy.mapToSource(index)
-        if source_index.isValid():
-            folder = self.table_model.folders[source_index.row()]
-            path = folder.get('path', '')
+        if index.isValid():
+            path = self.table_model.store.paths[self.table_model.row_id(index.row())]
             
             # 在树形图中查找并选中该路径
             self.select_path_in_tree(path)
@@ -1297,42 +8152,31 @@ class DarkDiskSpaceAnalyzer(QMainWindow):
         return False
     
     def refresh_disks(self):
-        """刷新磁盘列表"""
-        self.load_disks()
-        if self.disk_combo.count() > 0:
-            self.on_disk_changed(self.disk_combo.currentIndex())
-    
-    def _format_size(self, size_bytes):
-        """格式化文件大小显示"""
-        if size_bytes == 0:
-            return "0 B"
-        
-        size_names = ("B", "KB", "MB", "GB", "TB")
-        i = 0
-        while size_bytes >= 1024 and i < len(size_names) - 1:
-            size_bytes /= 1024.0
-            i += 1
-        
-        if i == 0:
-            return f"{int(size_bytes)} B"
-        elif i == 1:
-            return f"{size_bytes:.1f} KB"
-        elif i == 2:
-            return f"{size_bytes:.1f} MB"
-        elif i == 3:
-            return f"{size_bytes:.2f} GB"
-        else:
-            return f"{size_bytes:.2f} TB"
+        """刷新磁盘列表，加载后仍选中当前磁盘"""
+        self.load_disks(self.disk_combo.currentData())
     
     def closeEvent(self, event):
         """窗口关闭事件"""
-        if self.scanner_thread and self.scanner_thread.isRunning():
+        if isinstance(self.scanner_thread, ServiceScanProxy):
+            self.scanner_thread.detach()    # 扫描在服务进程中继续，之后可再附加
+        elif self.scanner_thread and self.scanner_thread.isRunning():
+            # 扫描线程在几十毫秒内响应取消；卡在网络路径上的是列目录守护线程，不必等待
             self.scanner_thread.cancel()
-            self.scanner_thread.wait()
+            self.scanner_thread.wait(5000)
+        if self.trend_thread is not None and self.trend_thread.isRunning():
+            self.trend_thread.wait()
+        if self.delete_thread is not None and self.delete_thread.isRunning():
+            self.delete_thread.cancel()
+            self.delete_thread.wait()
+        if self.snapshot_thread is not None and self.snapshot_thread.isRunning():
+            if isinstance(self.snapshot_thread, SnapshotDiffWorker):
+                self.snapshot_thread.cancel()
+            self.snapshot_thread.wait()
         event.accept()
 
-def main():
-    app = QApplication(sys.argv)
+def create_application(argv):
+    """创建 QApplication：Fusion 风格和深色调色板"""
+    app = QApplication(argv)
     app.setStyle(QStyleFactory.create('Fusion'))
     
     # 设置深色调色板
@@ -1354,6 +8198,92 @@ def main():
     # 设置应用程序信息
     app.setApplicationName("磁盘空间分析工具")
     app.setOrganizationName("DiskAnalyzer")
+    return app
+
+def bench_startup(budget=1.0):
+    """启动时间基准（python Find.py --bench-startup[=秒]）
+
+    从开始导入本模块计时（不含解释器本身的启动），给出导入完成、主窗口构建完成、首次进入事件循环
+    （窗口可以操作）和磁盘列表加载完成的时间；窗口可以操作的时间超过 budget 秒时返回 1，用于防止启动变慢。
+    """
+    started = _IMPORT_STARTED
+    marks = {'导入模块': time.perf_counter() - started}
+    app = create_application(sys.argv)
+    window = DarkDiskSpaceAnalyzer()
+    marks['构建主窗口'] = time.perf_counter() - started
+    window.show()
+    disk_count = []
+    QTimer.singleShot(0, lambda: marks.setdefault('进入事件循环', time.perf_counter() - started))
+    window.disks_loaded.connect(lambda count: (marks.setdefault('加载磁盘列表', time.perf_counter() - started),
+                                               disk_count.append(count)))
+    deadline = time.monotonic() + 60
+    while not disk_count and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.002)
+    for name, seconds in marks.items():
+        print(f"{name:　<8}{seconds * 1000:8.0f} ms")
+    if disk_count:
+        print(f"磁盘列表项: {disk_count[0]}")
+    else:
+        print("磁盘列表 60 秒内未加载完成")
+    interactive = marks.get('进入事件循环', float('inf'))
+    if interactive > budget:
+        print(f"❌ 启动耗时 {interactive:.2f} 秒，超过预算 {budget:g} 秒")
+        return 1
+    print(f"✅ 启动耗时 {interactive:.2f} 秒（预算 {budget:g} 秒）")
+    return 0
+
+def bench_backends(root=None, max_dirs=2000, max_entries=200000):
+    """列目录方式基准（python Find.py --bench-backends[=路径]）
+
+    在 root（默认为用户主目录）下取一批目录：先检查各方式列出的子目录、文件、大小和时间完全一致，
+    再比较各方式每个目录项的耗时，并给出自动选择（校准）的结果。结果不一致时返回 1。
+    """
+    root = root or os.path.expanduser('~')
+    sample, entries = lister_sample(root, max_dirs, max_entries)
+    names = available_listers()
+    print(f"{root}: {len(sample):,} 个目录，{entries:,} 个目录项；可用方式: {', '.join(names)}")
+    mismatches = 0
+    for path in sample:
+        listings = {}
+        for name in names:
+            try:
+                subdirs, files, count = LISTING_BACKENDS[name][1](path)
+                listings[name] = (sorted(subdirs), sorted(files), count)
+            except OSError as e:
+                listings[name] = type(e).__name__
+        reference = listings[names[0]]
+        for name in names[1:]:
+            if listings[name] != reference:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"❌ {name} 与 {names[0]} 的结果不同: {path}")
+    
+    timings = time_listers(sample, entries, rounds=5)
+    baseline = timings.get('scandir')
+    for name, seconds in sorted(timings.items(), key=lambda pair: pair[1]):
+        relative = f"{baseline / seconds:5.2f}x" if baseline else ""
+        print(f"{name:<10}{seconds * 1e6:8.2f} µs/项  {relative}  {LISTING_BACKENDS[name][0]}")
+    calibrated = calibrate_listers(root)
+    if calibrated:
+        print(f"自动选择: {pick_lister(calibrated)}")
+    else:
+        print(f"自动选择: scandir（目录项少于 {LISTER_CALIBRATION_MIN_ENTRIES}，不校准）")
+    if mismatches:
+        print(f"❌ {mismatches} 个目录的结果不一致")
+        return 1
+    print("✅ 各方式的结果一致")
+    return 0
+
+def main():
+    if '--daemon' in sys.argv[1:]:
+        sys.exit(run_scan_service(shared='--shared' in sys.argv[1:]))
+    for arg in sys.argv[1:]:
+        if arg.startswith('--bench-startup'):
+            sys.exit(bench_startup(float(arg.partition('=')[2] or 1.0)))
+        if arg.startswith('--bench-backends'):
+            sys.exit(bench_backends(arg.partition('=')[2] or None))
+    app = create_application(sys.argv)
     
     window = DarkDiskSpaceAnalyzer()
     window.show()